@@ -1,23 +1,28 @@
 #!/usr/bin/env python
 
 import os
-import subprocess
 import sys
-import commands
 from optparse import OptionParser
 import logging
 import unittest
 import tempfile
 import shutil
 import ignition
-from ignition.django import DjangoCreator
-from ignition.flask import FlaskCreator
+import ignition.templates
 import ignition.common
-
-PROJECT_TEMPLATES = [
-    'django',
-    'flask',
-]
+import ignition.sizing
+import ignition.manifest
+import ignition.hosting
+import ignition.benchmark
+import ignition.tuning
+import ignition.stats
+import ignition.logs
+import ignition.concurrency
+import ignition.startup
+import ignition.memory
+import ignition.scaling
+import ignition.tls
+import ignition.profiling
 
 # logging vars
 LOG_LEVEL=logging.DEBUG
@@ -35,32 +40,298 @@ console.setFormatter(formatter)
 console.setLevel(LOG_LEVEL)
 logging.getLogger('').addHandler(console)
 
+def get_creator(template):
+    """
+    Returns the creator class for a template (or None if unknown)
+
+    Template modules are only imported when selected (see ignition.templates)
+
+    """
+    return ignition.templates.load_creator(template)
+
+def get_creator_options(opts):
+    """
+    Returns the creator keyword arguments shared by every project
+
+    """
+    return {
+        'root_dir': opts.root_dir,
+        'user': opts.user,
+        'force': opts.force,
+        'shared_hosting': opts.shared_hosting,
+        'profile': opts.profile,
+        'concurrency': opts.concurrency,
+        'preload': opts.preload,
+        'preload_modules': opts.preload_modules,
+        'gc_freeze': opts.gc_freeze,
+        'wheelhouse': opts.wheelhouse,
+        'offline': opts.offline,
+        'base_env': opts.base_env,
+        'base_env_dir': opts.base_env_dir,
+        'harakiri': opts.harakiri,
+        'uwsgi_sockets': opts.uwsgi_sockets,
+        'uwsgi_instances': opts.uwsgi_instances,
+        'uwsgi_bind': opts.uwsgi_bind,
+        'backends': opts.backends,
+        'cache': opts.cache,
+        'cache_size': opts.cache_size,
+        'cache_inactive': opts.cache_inactive,
+        'cache_routes': [tuple(x.rsplit(':', 1)) for x in opts.cache_routes],
+        'memory_budget': ignition.tuning.parse_size(opts.memory_budget) if opts.memory_budget else None,
+        'measure_memory': opts.measure_memory,
+        'scaling': opts.scaling,
+        'tls': opts.tls,
+        'tls_port': opts.tls_port,
+        'tls_cert': opts.tls_cert,
+        'tls_key': opts.tls_key,
+        'production': opts.production,
+        'django_cache': opts.django_cache,
+        'timings': opts.timings,
+        'profile_rate': opts.profile_rate,
+        'profile_threshold': opts.profile_threshold,
+    }
+
 def main(opts=None):
     if not opts:
         logging.error('You must specify options to main')
-    root_dir = opts.root_dir
     project_name = opts.project_name.strip().lower()
     modules = opts.modules
-    user = opts.user
     port = opts.port
-    force = opts.force
     # select template
     template = opts.template.lower()
     # try to load the template based upon the user input template
-    try:
-        f = globals()['{0}Creator'.format(template.capitalize())]
-        prj = f(project_name=project_name, root_dir=root_dir, \
-            modules=modules, user=user, port=port, force=force, \
-            shared_hosting=opts.shared_hosting)
-    except:
+    f = get_creator(template)
+    if not f:
         logging.error('Unknown template: {0}'.format(template))
         print('\nAvailable templates: \n')
-        print(''.join([' ' + x + '\n' for x in PROJECT_TEMPLATES]))
+        print(''.join([' ' + x + '\n' for x in ignition.templates.list_templates()]))
+        sys.exit(1)
+    prj = f(project_name=project_name, modules=modules, port=port, \
+        **get_creator_options(opts))
+    if not prj.create():
+        logging.error('Unable to create project {0}'.format(project_name))
         sys.exit(1)
-    prj.create()
     logging.info('Project {0} created'.format(project_name))
     sys.exit(0)
 
+def create_from_manifest(opts):
+    """
+    Creates all projects listed in a manifest
+
+    """
+    try:
+        projects = ignition.manifest.load_manifest(opts.manifest)
+    except (IOError, ValueError) as e:
+        logging.error('Unable to load manifest: {0}'.format(e))
+        sys.exit(1)
+    results = ignition.manifest.provision(projects, get_creator, workers=opts.workers, \
+        **get_creator_options(opts))
+    print('\n' + ignition.manifest.format_summary(results))
+    if [r for r in results if not r['ok']]:
+        sys.exit(1)
+    sys.exit(0)
+
+def benchmark(opts):
+    """
+    Benchmarks a generated project and saves the results
+
+    """
+    project_name = opts.project_name.strip().lower()
+    try:
+        levels = [int(x) for x in opts.benchmark_concurrency.split(',') if x.strip()]
+    except ValueError:
+        logging.error('Invalid concurrency levels: {0}'.format(opts.benchmark_concurrency))
+        sys.exit(1)
+    try:
+        report = ignition.benchmark.benchmark_project(opts.root_dir, project_name, \
+            mode=opts.benchmark_mode, levels=levels, duration=opts.benchmark_duration, \
+            path=opts.benchmark_path)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Benchmark failed: {0}'.format(e))
+        sys.exit(1)
+    output = opts.benchmark_output or os.path.join(opts.root_dir, 'var', \
+        '{0}_benchmark_{1}.json'.format(project_name, report['time'].replace(':', '')))
+    ignition.benchmark.save_report(report, output)
+    print('\n' + ignition.benchmark.format_results(report['results']))
+    if report.get('tls'):
+        print('\n' + ignition.tls.format_reuse(report['tls']))
+    logging.info('Benchmark results saved to {0}'.format(output))
+    sys.exit(0)
+
+def tune(opts):
+    """
+    Searches uWSGI settings for a generated project and applies the best
+
+    """
+    project_name = opts.project_name.strip().lower()
+    try:
+        budget = ignition.tuning.parse_size(opts.memory_budget) if opts.memory_budget else None
+    except ValueError:
+        logging.error('Invalid memory budget: {0}'.format(opts.memory_budget))
+        sys.exit(1)
+    try:
+        report = ignition.tuning.tune(opts.root_dir, project_name, concurrency=opts.tune_concurrency, \
+            duration=opts.benchmark_duration, path=opts.benchmark_path, memory_budget=budget, \
+            max_p99=opts.max_p99)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Tuning failed: {0}'.format(e))
+        sys.exit(1)
+    output = opts.benchmark_output or os.path.join(opts.root_dir, 'var', \
+        '{0}_tuning_{1}.json'.format(project_name, report['time'].replace(':', '')))
+    ignition.benchmark.save_report(report, output)
+    print('\n' + ignition.tuning.format_trials(report))
+    if not report['best']:
+        logging.error('No settings were within the memory and latency limits')
+        sys.exit(1)
+    ignition.tuning.apply_tuning(opts.root_dir, project_name, report['best']['overrides'])
+    logging.info('Applied {0} (results saved to {1})'.format(', '.join(['{0}={1}'.format(k, v) \
+        for k, v in sorted(report['best']['overrides'].items())]), output))
+    sys.exit(0)
+
+def show_stats(opts):
+    """
+    Polls the uWSGI and Nginx stats of a project
+
+    """
+    project_name = opts.stats_project.strip().lower()
+
+    def show(snapshot, previous):
+        for e in snapshot['errors']:
+            logging.warn(e)
+        if opts.prometheus_file:
+            # write then rename so collectors never read a partial file
+            tmp = opts.prometheus_file + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(ignition.stats.format_prometheus(snapshot))
+            os.rename(tmp, opts.prometheus_file)
+        if opts.prometheus:
+            print(ignition.stats.format_prometheus(snapshot))
+        else:
+            print(ignition.stats.format_summary(ignition.stats.summarize(snapshot, previous)) + '\n')
+    try:
+        ignition.stats.poll(opts.root_dir, project_name, show, interval=opts.stats_interval, \
+            count=opts.stats_count)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+def analyze_logs(opts, paths):
+    """
+    Reports route latencies and status codes from access logs
+
+    """
+    if not paths:
+        paths = ignition.logs.find_logs(opts.root_dir, opts.project_name.strip().lower())
+    if not paths:
+        logging.error('No access logs found')
+        sys.exit(1)
+    result = ignition.logs.analyze_logs(paths, processes=opts.log_processes)
+    print(ignition.logs.format_report(result, top=opts.top))
+    sys.exit(0)
+
+def measure_startup(opts):
+    """
+    Compares project startup with lazy loading and preloading
+
+    """
+    project_name = opts.project_name.strip().lower()
+    try:
+        results = ignition.startup.compare_startup(opts.root_dir, project_name, path=opts.benchmark_path)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Unable to measure startup: {0}'.format(e))
+        sys.exit(1)
+    print('\n' + ignition.startup.format_comparison(results))
+    if opts.benchmark_output:
+        ignition.benchmark.save_report(results, opts.benchmark_output)
+    sys.exit(0)
+
+def measure_memory(opts):
+    """
+    Measures the worker memory of a generated project and applies the
+    recycling and scaling limits derived from it
+
+    """
+    project_name = opts.project_name.strip().lower()
+    try:
+        measurement = ignition.memory.measure(opts.root_dir, project_name, \
+            duration=opts.benchmark_duration, path=opts.benchmark_path)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Unable to measure memory usage: {0}'.format(e))
+        sys.exit(1)
+    ignition.memory.save_measurement(opts.root_dir, project_name, measurement)
+    instances = len(ignition.common.get_uwsgi_configs(opts.root_dir, project_name))
+    budget = ignition.tuning.parse_size(opts.memory_budget) if opts.memory_budget else None
+    host = ignition.sizing.calculate_sizing(opts.profile)
+    if not budget:
+        budget = int(host['memory'] * ignition.tuning.DEFAULT_MEMORY_SHARE)
+    limits = ignition.memory.get_limits(max(1, host['processes'] // instances), measurement, \
+        budget // instances)
+    ignition.memory.apply_limits(opts.root_dir, project_name, limits)
+    print('\n' + ignition.memory.format_measurement(measurement, limits))
+    logging.info('Applied limits (measurement saved to {0})'.format(\
+        ignition.memory.get_measurement_file(opts.root_dir, project_name)))
+    sys.exit(0)
+
+def verify_scaling(opts):
+    """
+    Runs a load ramp against a project and shows how its workers scale
+
+    """
+    project_name = opts.project_name.strip().lower()
+    try:
+        report = ignition.scaling.verify(opts.root_dir, project_name, duration=opts.benchmark_duration, \
+            path=opts.benchmark_path)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Unable to verify scaling: {0}'.format(e))
+        sys.exit(1)
+    print('\n' + ignition.scaling.format_ramp(report))
+    if opts.benchmark_output:
+        ignition.benchmark.save_report(report, opts.benchmark_output)
+    sys.exit(0 if report['scaled_up'] and report['scaled_down'] else 1)
+
+def show_profiles(opts):
+    """
+    Aggregates the request profiles of a project into a collapsed stack
+    file (for flamegraph.pl or speedscope)
+
+    """
+    project_name = opts.profiles_project.strip().lower()
+    profile_dir = ignition.profiling.get_profile_dir(opts.root_dir, project_name)
+    if not os.path.isdir(profile_dir):
+        logging.error('No profiles found for {0} (in {1})'.format(project_name, profile_dir))
+        sys.exit(1)
+    result = ignition.profiling.aggregate(profile_dir, opts.profiles_path)
+    output = opts.profiles_output or ignition.profiling.get_collapsed_file(opts.root_dir, project_name)
+    ignition.profiling.write_collapsed(result['stacks'], output)
+    print('\n' + ignition.profiling.format_summary(result, opts.top))
+    logging.info('Collapsed stacks written to {0}'.format(output))
+    sys.exit(0 if result['profiles'] else 1)
+
+def smoke_benchmark(opts):
+    """
+    Benchmarks a Django project with its stock and production settings
+
+    """
+    import ignition.django
+    project_name = opts.project_name.strip().lower()
+    try:
+        levels = [int(x) for x in opts.benchmark_concurrency.split(',') if x.strip()]
+    except ValueError:
+        logging.error('Invalid concurrency levels: {0}'.format(opts.benchmark_concurrency))
+        sys.exit(1)
+    # the stock project has no page at / once DEBUG is off
+    path = opts.benchmark_path if opts.benchmark_path != '/' else ignition.django.SMOKE_PATH
+    try:
+        results = ignition.django.smoke_benchmark(opts.root_dir, project_name, levels, \
+            opts.benchmark_duration, path)
+    except (ignition.benchmark.BenchmarkError, IOError) as e:
+        logging.error('Smoke benchmark failed: {0}'.format(e))
+        sys.exit(1)
+    print('\n' + ignition.django.format_smoke_benchmark(results))
+    if opts.benchmark_output:
+        ignition.benchmark.save_report(results, opts.benchmark_output)
+    sys.exit(0)
+
 
 if __name__ == '__main__':
     op = OptionParser()
@@ -69,20 +340,144 @@ if __name__ == '__main__':
     op.add_option('-m', '--modules', dest='modules', help='Comma separated list of Virtualenv packages')
     op.add_option('-u', '--user', dest='user', help='User account to run Django application under')
     op.add_option('-p', '--port', dest='port', default=80, help='Port for webserver to listen on')
+    op.add_option('--tls', dest='tls', action='store_true', default=False, \
+        help='Serve HTTPS (HTTP/2, session cache and tickets) and redirect --port to it')
+    op.add_option('--tls-port', dest='tls_port', type='int', default=ignition.tls.DEFAULT_PORT, \
+        help='Port for HTTPS (default: {0})'.format(ignition.tls.DEFAULT_PORT))
+    op.add_option('--tls-cert', dest='tls_cert', \
+        help='TLS certificate (chain) file (default: a self-signed certificate for local testing)')
+    op.add_option('--tls-key', dest='tls_key', help='TLS private key file (default: the certificate file)')
     op.add_option('--shared-hosting', dest='shared_hosting', action='store_true', default=False,\
         help='Create a shared hosted Nginx config (allow multiple apps on a single port)')
+    op.add_option('--profile', dest='profile', type='choice', choices=ignition.sizing.PROFILES, \
+        default=ignition.sizing.DEFAULT_PROFILE, help='Worker sizing profile ({0}) - default: {1}'.format(\
+        ', '.join(ignition.sizing.PROFILES), ignition.sizing.DEFAULT_PROFILE))
+    op.add_option('--concurrency', dest='concurrency', type='choice', choices=ignition.concurrency.MODELS, \
+        help='uWSGI concurrency model ({0}; asyncio needs a Python 3 virtualenv) - default: processes and '\
+        'threads from --profile'.format(\
+        ', '.join(ignition.concurrency.MODELS)))
+    op.add_option('--preload', dest='preload', action='store_true', default=False, \
+        help='Load the app and heavy imports in the uWSGI master before forking and precompile bytecode')
+    op.add_option('--preload-module', dest='preload_modules', action='append', default=[], \
+        help='Add a module to preload (can be repeated)')
+    op.add_option('--gc-freeze', dest='gc_freeze', action='store_true', default=False, \
+        help='Freeze the garbage collector after preloading so workers keep sharing memory (Python 3.7+)')
+    op.add_option('--measure-startup', dest='measure_startup', action='store_true', default=False, \
+        help='Compare cold start time and per-worker unique memory with lazy loading and preloading')
+    op.add_option('--scaling', dest='scaling', type='choice', choices=ignition.scaling.PROFILES, \
+        help='Adaptive uWSGI process scaling algorithm ({0}) - default: spare with uWSGI defaults'.format(\
+        ', '.join(ignition.scaling.PROFILES)))
+    op.add_option('--verify-scaling', dest='verify_scaling', action='store_true', default=False, \
+        help='Run a load ramp (--benchmark-duration seconds per step) and show the workers scaling up and down')
+    op.add_option('--production', dest='production', action='store_true', default=False, \
+        help='Django: write production settings (no DEBUG, persistent connections, cached templates) '\
+        'and serve static files from Nginx')
+    op.add_option('--django-cache', dest='django_cache', type='choice', choices=['locmem', 'file'], \
+        default='locmem', help='Django cache backend with --production: locmem or file (default: locmem)')
+    op.add_option('--smoke-benchmark', dest='smoke_benchmark', action='store_true', default=False, \
+        help='Compare requests/sec of a Django project with its stock and production settings')
+    op.add_option('--measure-memory', dest='measure_memory', action='store_true', default=False, \
+        help='Measure worker memory with a local warm-up run and derive recycling limits (with -t after ' \
+        'creating the project, without -t for an existing project)')
+    op.add_option('--wheelhouse', dest='wheelhouse', help='Directory to cache built wheels in (default: <root_dir>/wheelhouse)')
+    op.add_option('--offline', dest='offline', action='store_true', default=False, \
+        help='Install modules only from the wheelhouse (no downloads)')
+    op.add_option('--base-env', dest='base_env', action='store_true', default=False, \
+        help='Clone the virtualenv from a base environment shared by projects with the same template and modules')
+    op.add_option('--base-env-dir', dest='base_env_dir', help='Directory for base environments (default: <root_dir>/ve/.base)')
+    op.add_option('--manifest', dest='manifest', help='Create all projects listed in a JSON, YAML or INI manifest')
+    op.add_option('--workers', dest='workers', type='int', default=ignition.manifest.DEFAULT_WORKERS, \
+        help='Number of projects to create concurrently from a manifest (default: {0})'.format(\
+        ignition.manifest.DEFAULT_WORKERS))
+    op.add_option('--update-frontend', dest='update_frontend', action='store_true', default=False, \
+        help='Regenerate the shared hosting front end for all projects in the root directory and reload it')
+    op.add_option('--harakiri', dest='harakiri', type='int', default=300, \
+        help='Seconds before uWSGI kills a request (Nginx upstream timeouts match it) - default: 300')
+    op.add_option('--uwsgi-sockets', dest='uwsgi_sockets', type='int', default=1, \
+        help='Number of unix sockets the uWSGI instance listens on (Nginx balances across them)')
+    op.add_option('--uwsgi-instances', dest='uwsgi_instances', type='int', default=1, \
+        help='Number of uWSGI instances (masters) for the project; Nginx balances across them')
+    op.add_option('--uwsgi-bind', dest='uwsgi_bind', help='Bind uWSGI to a TCP address (host:port) instead of unix sockets')
+    op.add_option('--backend', dest='backends', action='append', default=[], \
+        help='Add a remote uWSGI backend (host:port or host:port:weight) to the Nginx upstream (can be repeated)')
+    op.add_option('--cache', dest='cache', action='store_true', default=False, \
+        help='Cache responses in Nginx (responses with cache headers, plus any --cache-route)')
+    op.add_option('--cache-size', dest='cache_size', default='1g', help='Maximum size of the response cache (default: 1g)')
+    op.add_option('--cache-inactive', dest='cache_inactive', default='60m', \
+        help='Remove cached responses not requested within this time (default: 60m)')
+    op.add_option('--cache-route', dest='cache_routes', action='append', default=[], \
+        help='Cache a route for a TTL (format is <path>:<ttl> - i.e. --cache-route /news:5m); can be repeated')
     op.add_option('-v', '--version', dest='show_version', action='store_true', default=False, help='Show version and exit')
     op.add_option('-t', '--template', dest='template', help='Project template (run --list-templates for available templates)')
     op.add_option('--list-templates', dest='list_templates', action='store_true', default=False, help='List available templates')
+    op.add_option('--profile-rate', dest='profile_rate', type='float', \
+        help='Profile this fraction of requests (i.e. 0.01) into var/profiles/<project>')
+    op.add_option('--profile-threshold', dest='profile_threshold', type='float', \
+        help='Profile requests slower than this (ms)')
+    op.add_option('--profiles', dest='profiles_project', \
+        help='Aggregate the request profiles of a project into a collapsed stack file')
+    op.add_option('--profiles-output', dest='profiles_output', \
+        help='Collapsed stack file to write (default: var/profiles/<project>.collapsed)')
+    op.add_option('--profiles-path', dest='profiles_path', help='Only aggregate requests for paths starting with this')
+    op.add_option('--timings', dest='timings', action='store_true', default=False, \
+        help='Write the provisioning step timings to log/<project>_timings.json')
     op.add_option('--force', dest='force', action='store_true', default=False, help='Force creation (overwrites existing)')
     op.add_option('--add-static-dir', dest='add_static_dir', help='Add a static directory to nging config (format is '\
         '--add-static-dir <full_path_to_dir>:<alias> - i.e. --add-static-dir /srv/www/app/static:/static')
+    op.add_option('--brotli-static', dest='brotli_static', action='store_true', default=False, \
+        help='Serve pre-compressed brotli files from static directories (requires the ngx_brotli module)')
+    op.add_option('--rebuild-static', dest='rebuild_static', action='store_true', default=False, \
+        help='Re-compress and fingerprint changed files in the project static directories')
+    op.add_option('--benchmark', dest='benchmark', action='store_true', default=False, \
+        help='Start a generated project locally and load test it')
+    op.add_option('--benchmark-mode', dest='benchmark_mode', type='choice', choices=ignition.benchmark.MODES, \
+        default='uwsgi', help='Benchmark uWSGI alone over HTTP (uwsgi) or the full stack through Nginx (stack) - default: uwsgi')
+    op.add_option('--benchmark-concurrency', dest='benchmark_concurrency', \
+        default=','.join([str(x) for x in ignition.benchmark.DEFAULT_LEVELS]), \
+        help='Comma separated list of concurrency levels (default: {0})'.format(\
+        ','.join([str(x) for x in ignition.benchmark.DEFAULT_LEVELS])))
+    op.add_option('--benchmark-duration', dest='benchmark_duration', type='int', \
+        default=ignition.benchmark.DEFAULT_DURATION, help='Seconds to run each concurrency level (default: {0})'.format(\
+        ignition.benchmark.DEFAULT_DURATION))
+    op.add_option('--benchmark-path', dest='benchmark_path', default='/', help='URL path to request (default: /)')
+    op.add_option('--benchmark-output', dest='benchmark_output', \
+        help='File to save the JSON results to (default: <root_dir>/var/<project>_benchmark_<time>.json)')
+    op.add_option('--tune', dest='tune', action='store_true', default=False, \
+        help='Load test a generated project with candidate uWSGI settings and apply the best')
+    op.add_option('--tune-concurrency', dest='tune_concurrency', type='int', \
+        default=ignition.tuning.DEFAULT_CONCURRENCY, help='Concurrent clients for each tuning run (default: {0})'.format(\
+        ignition.tuning.DEFAULT_CONCURRENCY))
+    op.add_option('--memory-budget', dest='memory_budget', \
+        help='Maximum memory for the uWSGI processes when tuning or sizing workers (i.e. 512M - ' \
+        'default: half of physical memory)')
+    op.add_option('--max-p99', dest='max_p99', type='float', help='Maximum p99 latency in ms when tuning')
+    op.add_option('--stats', dest='stats_project', help='Show live uWSGI worker and Nginx stats for a project')
+    op.add_option('--stats-interval', dest='stats_interval', type='float', default=ignition.stats.DEFAULT_INTERVAL, \
+        help='Seconds between stats samples (default: {0})'.format(ignition.stats.DEFAULT_INTERVAL))
+    op.add_option('--stats-count', dest='stats_count', type='int', default=0, \
+        help='Number of stats samples to take (default: run until interrupted)')
+    op.add_option('--prometheus', dest='prometheus', action='store_true', default=False, \
+        help='Print stats in the Prometheus text format')
+    op.add_option('--prometheus-file', dest='prometheus_file', \
+        help='Write stats in the Prometheus text format to a file (i.e. for the node exporter textfile collector)')
+    op.add_option('--analyze-logs', dest='analyze_logs', action='store_true', default=False, \
+        help='Report route latency percentiles and status codes from the project access logs '\
+        '(including rotated and gzipped logs) or from the log files given as arguments')
+    op.add_option('--log-processes', dest='log_processes', type='int', \
+        help='Number of processes used to analyze log files (default: one per core)')
+    op.add_option('--top', dest='top', type='int', default=10, help='Number of routes to list in reports (default: 10)')
 
     opts, args = op.parse_args()
 
+    # check cache routes (before any projects are created)
+    for route in opts.cache_routes:
+        if route.find(':') == -1:
+            logging.error('Invalid cache route: {0} (format is <path>:<ttl>)'.format(route))
+            sys.exit(1)
+
     # check for template list
     if opts.list_templates:
-        templates = PROJECT_TEMPLATES
+        templates = ignition.templates.list_templates()
         print('Available templates:')
         print(''.join([' ' + x + '\n' for x in templates]))
         sys.exit(0)
@@ -98,9 +493,112 @@ if __name__ == '__main__':
             logging.error('You must specify a root directory and project name to add a static directory')
             sys.exit(1)
         static_dir, alias = opts.add_static_dir.split(':')
-        ignition.common.add_static_dir(opts.root_dir, opts.project_name, static_dir, alias)
+        ignition.common.add_static_dir(opts.root_dir, opts.project_name, static_dir, alias, \
+            brotli_static=opts.brotli_static)
+        sys.exit(0)
+
+    # check for rebuild-static
+    if opts.rebuild_static:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to rebuild static files')
+            sys.exit(1)
+        if not ignition.common.rebuild_static(opts.root_dir, opts.project_name):
+            sys.exit(1)
         sys.exit(0)
 
+    # check for front end update
+    if opts.update_frontend:
+        if not opts.root_dir:
+            logging.error('You must specify a root directory to update the front end')
+            sys.exit(1)
+        if not ignition.hosting.update_frontend(opts.root_dir, opts.user, opts.profile):
+            logging.info('Front end is up to date')
+        sys.exit(0)
+
+    # check for benchmark
+    if opts.benchmark:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to run a benchmark')
+            sys.exit(1)
+        benchmark(opts)
+
+    # check for log analysis
+    if opts.analyze_logs:
+        if not args and (not opts.root_dir or not opts.project_name):
+            logging.error('You must specify log files or a root directory and project name to analyze logs')
+            sys.exit(1)
+        analyze_logs(opts, args)
+
+    # check for stats
+    if opts.stats_project:
+        if not opts.root_dir:
+            logging.error('You must specify a root directory to show stats')
+            sys.exit(1)
+        show_stats(opts)
+
+    # check for startup measurement
+    if opts.measure_startup:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to measure startup')
+            sys.exit(1)
+        measure_startup(opts)
+
+    # check for scaling verification
+    if opts.verify_scaling:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to verify scaling')
+            sys.exit(1)
+        verify_scaling(opts)
+
+    # check for profiles
+    if opts.profiles_project:
+        if not opts.root_dir:
+            logging.error('You must specify a root directory to aggregate profiles')
+            sys.exit(1)
+        show_profiles(opts)
+
+    # check for profile rate
+    if opts.profile_rate is not None and not 0 <= opts.profile_rate <= 1:
+        logging.error('Invalid profile rate: {0} (must be between 0 and 1)'.format(opts.profile_rate))
+        sys.exit(1)
+
+    # check for django smoke benchmark
+    if opts.smoke_benchmark:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to run a smoke benchmark')
+            sys.exit(1)
+        smoke_benchmark(opts)
+
+    # check for memory budget
+    if opts.memory_budget:
+        try:
+            ignition.tuning.parse_size(opts.memory_budget)
+        except ValueError:
+            logging.error('Invalid memory budget: {0}'.format(opts.memory_budget))
+            sys.exit(1)
+
+    # check for memory measurement (of an existing project)
+    if opts.measure_memory and not opts.template:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to measure memory usage')
+            sys.exit(1)
+        measure_memory(opts)
+
+    # check for tuning
+    if opts.tune:
+        if not opts.root_dir or not opts.project_name:
+            logging.error('You must specify a root directory and project name to tune a project')
+            sys.exit(1)
+        tune(opts)
+
+    # check for manifest
+    if opts.manifest:
+        if not opts.root_dir:
+            logging.error('You must specify a root directory to create projects from a manifest')
+            sys.exit(1)
+        print('\n:: Ignition ::\n')
+        create_from_manifest(opts)
+
     # check for errors
     if not opts.root_dir or not opts.project_name or not opts.template:
         op.print_help()
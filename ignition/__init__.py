@@ -15,19 +15,34 @@
 
 import os
 import logging
-import subprocess
 import shutil
-import commands
-from ignition.common import check_command
+import tempfile
+import hashlib
+import json
+import threading
+from ignition.common import check_command, run_command, get_lock, make_dirs, write_file
+from ignition import config
+from ignition import concurrency
+from ignition.config import Directive
 
 __author__ = 'Evan Hazlett <ejhazlett@gmail.com>'
 __version__ = '0.3'
 
+# seconds Nginx waits past harakiri so uWSGI kills (and logs) a slow
+# request before Nginx times out on it
+HARAKIRI_GRACE = 5
+
 class ProjectCreator(object):
-    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=[], **kwargs):
+    # modules the uWSGI master imports before forking (with preload)
+    PRELOAD_MODULES = []
+
+    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=None, **kwargs):
         '''
         Base creator for all projects
         '''
+        from ignition import sizing
+        from ignition import tuning
+        from ignition import tls
         if not project_name:
             print_error('You must specify a project name')
             return
@@ -40,6 +55,11 @@ class ProjectCreator(object):
         self._log_dir = os.path.join(self._root_dir, 'log')
         self._script_dir = os.path.join(self._root_dir, 'scripts')
         self._nginx_config = '{0}_nginx.conf'.format(os.path.join(self._conf_dir, self._project_name))
+        # input hashes of generated artifacts (see create)
+        self._state_file = '{0}_state.json'.format(os.path.join(self._conf_dir, self._project_name))
+        self._state = None
+        self._state_lock = threading.RLock()
+        self._timings = None
         self._modules = modules
         self._include_mimetypes = False
         if 'user' in kwargs:
@@ -54,6 +74,21 @@ class ProjectCreator(object):
             self._server_name = kwargs['server_name']
         else:
             self._server_name = None
+        if 'tls' in kwargs:
+            self._tls = kwargs['tls']
+        else:
+            self._tls = False
+        if 'tls_port' in kwargs and kwargs['tls_port']:
+            self._tls_port = int(kwargs['tls_port'])
+        else:
+            self._tls_port = tls.DEFAULT_PORT
+        if 'tls_cert' in kwargs and kwargs['tls_cert']:
+            self._tls_cert = kwargs['tls_cert']
+            self._tls_key = kwargs.get('tls_key') or kwargs['tls_cert']
+            self._tls_self_signed = False
+        else: # self-signed certificate for local testing
+            self._tls_cert, self._tls_key = tls.get_certificate_paths(self._root_dir, self._project_name)
+            self._tls_self_signed = True
         if 'force' in kwargs:
             self._force = kwargs['force']
         else:
@@ -62,6 +97,107 @@ class ProjectCreator(object):
             self._shared_hosting = kwargs['shared_hosting']
         else:
             self._shared_hosting = False
+        if 'wheelhouse' in kwargs and kwargs['wheelhouse']:
+            self._wheelhouse = kwargs['wheelhouse']
+        else: # default to a wheelhouse shared by all projects in the root
+            self._wheelhouse = os.path.join(self._root_dir, 'wheelhouse')
+        if 'offline' in kwargs:
+            self._offline = kwargs['offline']
+        else:
+            self._offline = False
+        if 'base_env' in kwargs:
+            self._base_env = kwargs['base_env']
+        else:
+            self._base_env = False
+        if 'base_env_dir' in kwargs and kwargs['base_env_dir']:
+            self._base_env_dir = kwargs['base_env_dir']
+        else: # default to base environments shared by all projects in the root
+            self._base_env_dir = os.path.join(self._ve_dir, '.base')
+        if 'harakiri' in kwargs and kwargs['harakiri']:
+            self._harakiri = int(kwargs['harakiri'])
+        else: # seconds before uwsgi kills a stuck request
+            self._harakiri = 300
+        if 'uwsgi_sockets' in kwargs and kwargs['uwsgi_sockets']:
+            self._uwsgi_sockets = int(kwargs['uwsgi_sockets'])
+        else:
+            self._uwsgi_sockets = 1
+        if 'uwsgi_instances' in kwargs and kwargs['uwsgi_instances']:
+            self._uwsgi_instances = int(kwargs['uwsgi_instances'])
+        else: # uwsgi masters behind the nginx upstream
+            self._uwsgi_instances = 1
+        if 'uwsgi_bind' in kwargs and kwargs['uwsgi_bind']:
+            self._uwsgi_bind = kwargs['uwsgi_bind']
+        else:
+            self._uwsgi_bind = None
+        if 'backends' in kwargs and kwargs['backends']:
+            self._backends = kwargs['backends']
+        else:
+            self._backends = []
+        if 'cache' in kwargs:
+            self._cache = kwargs['cache']
+        else:
+            self._cache = False
+        if 'cache_size' in kwargs and kwargs['cache_size']:
+            self._cache_size = kwargs['cache_size']
+        else: # max size of cached responses on disk
+            self._cache_size = '1g'
+        if 'cache_inactive' in kwargs and kwargs['cache_inactive']:
+            self._cache_inactive = kwargs['cache_inactive']
+        else: # drop entries not requested within this time
+            self._cache_inactive = '60m'
+        if 'cache_routes' in kwargs and kwargs['cache_routes']:
+            self._cache_routes = kwargs['cache_routes']
+        else: # list of (path, ttl) tuples
+            self._cache_routes = []
+        if 'concurrency' in kwargs and kwargs['concurrency']:
+            self._concurrency = kwargs['concurrency']
+        else: # threads come from the sizing profile
+            self._concurrency = None
+        if 'preload' in kwargs:
+            self._preload = kwargs['preload']
+        else:
+            self._preload = False
+        if 'preload_modules' in kwargs and kwargs['preload_modules']:
+            self._preload_modules = kwargs['preload_modules']
+        else: # extra modules to preload (besides PRELOAD_MODULES)
+            self._preload_modules = []
+        if 'gc_freeze' in kwargs:
+            self._gc_freeze = kwargs['gc_freeze']
+        else:
+            self._gc_freeze = False
+        if 'memory_budget' in kwargs and kwargs['memory_budget']:
+            self._memory_budget = int(kwargs['memory_budget'])
+        else: # bytes the workers of all instances may use
+            self._memory_budget = None
+        if 'measure_memory' in kwargs:
+            self._measure_memory = kwargs['measure_memory']
+        else:
+            self._measure_memory = False
+        if 'profile_rate' in kwargs and kwargs['profile_rate']:
+            self._profile_rate = float(kwargs['profile_rate'])
+        else: # no random sampling
+            self._profile_rate = 0.0
+        if 'profile_threshold' in kwargs and kwargs['profile_threshold']:
+            self._profile_threshold = float(kwargs['profile_threshold'])
+        else: # no latency threshold
+            self._profile_threshold = None
+        self._profiling = bool(self._profile_rate or self._profile_threshold)
+        if 'timings' in kwargs:
+            self._timings_report = kwargs['timings']
+        else: # timings are only logged
+            self._timings_report = False
+        if 'scaling' in kwargs and kwargs['scaling']:
+            self._scaling = kwargs['scaling']
+        else: # cheaper mode with the default (spare) algorithm
+            self._scaling = None
+        if 'profile' in kwargs and kwargs['profile']:
+            self._profile = kwargs['profile']
+        else:
+            self._profile = sizing.DEFAULT_PROFILE
+        # worker sizing for uwsgi and nginx
+        self._sizing = sizing.calculate_sizing(self._profile)
+        if not self._memory_budget:
+            self._memory_budget = int(self._sizing['memory'] * tuning.DEFAULT_MEMORY_SHARE)
         # check for extra modules
         if self._modules == None:
             self._modules = []
@@ -70,10 +206,19 @@ class ProjectCreator(object):
             mod_list = self._modules
             self._modules = []
             [self._modules.append(x) for x in mod_list.split(',')]
+        else:
+            # copy so the caller's list isn't changed below
+            self._modules = list(self._modules)
+        # modules for the concurrency model
+        for m in concurrency.get_modules(self._concurrency):
+            if m not in self._modules:
+                self._modules.append(m)
         # shortcut to python executable in ve
         self._py = self._ve_dir + os.sep + self._project_name + os.sep + \
         'bin' + os.sep + 'python'
         self.log = logging.getLogger('ProjectCreator')
+        if self._scaling == 'backlog' and not self._uwsgi_bind:
+            self.log.warn('The backlog scaling profile needs TCP sockets (see --uwsgi-bind)')
         # check directories
         self.check_directories()
 
@@ -112,24 +257,163 @@ class ProjectCreator(object):
     def get_app_dir(self):
         return self._app_dir
 
+    def get_sizing(self):
+        """
+        Returns the worker sizing used for the uWSGI and Nginx configs
+
+        """
+        return self._sizing
+
+    def get_instance_name(self, instance=0):
+        """
+        Returns the name used for the files of a uWSGI instance (the
+        project name for the first instance, <project>.<n> for the others)
+
+        """
+        if instance == 0:
+            return self._project_name
+        return '{0}.{1}'.format(self._project_name, instance)
+
+    def get_uwsgi_sockets(self, instance=0):
+        """
+        Returns the sockets a project uWSGI instance listens on
+
+        """
+        if self._uwsgi_bind:
+            # instances bind consecutive ports
+            host, port = self._uwsgi_bind.rsplit(':', 1)
+            return ['{0}:{1}'.format(host, int(port) + instance)]
+        name = self.get_instance_name(instance)
+        sockets = ['{0}.sock'.format(os.path.join(self._var_dir, name))]
+        for i in range(1, self._uwsgi_sockets):
+            sockets.append('{0}_{1}.sock'.format(os.path.join(self._var_dir, name), i))
+        return sockets
+
+    def get_backends(self):
+        """
+        Returns the remote backends as (address, weight) tuples
+
+        Backends are given as host:port or host:port:weight.
+
+        """
+        backends = []
+        for b in self._backends:
+            parts = b.split(':')
+            if len(parts) == 3:
+                backends.append(('{0}:{1}'.format(parts[0], parts[1]), int(parts[2])))
+            else:
+                backends.append((b, 1))
+        return backends
+
+    def get_upstream_servers(self, instance=None):
+        """
+        Returns the Nginx upstream servers for the project (local uWSGI
+        sockets followed by any remote backends)
+
+        :keyword instance: Only return the sockets of this local instance
+
+        """
+        servers = []
+        instances = range(self._uwsgi_instances) if instance is None else [instance]
+        for i in instances:
+            for sock in self.get_uwsgi_sockets(i):
+                if sock.startswith(os.sep):
+                    servers.append('unix:{0}'.format(sock))
+                else:
+                    servers.append(sock.replace('0.0.0.0:', '127.0.0.1:'))
+        if instance is None:
+            servers.extend([address for address, weight in self.get_backends()])
+        return servers
+
+    def get_upstream(self):
+        """
+        Returns the Nginx upstream block for the project
+
+        Requests go to the server with the fewest active connections
+        (adjusted by weight); a server that fails max_fails times is skipped
+        for fail_timeout.
+
+        """
+        upstream = Directive('upstream', ['{0}_uwsgi'.format(self._project_name)], [])
+        servers = []
+        for i in range(self._uwsgi_instances):
+            servers.extend([(x, 1) for x in self.get_upstream_servers(i)])
+        servers.extend(self.get_backends())
+        if len(servers) > 1:
+            upstream.add(Directive('least_conn', []))
+        for address, weight in servers:
+            args = [address]
+            if weight != 1:
+                args.append('weight={0}'.format(weight))
+            if len(servers) > 1:
+                args.extend(['max_fails=3', 'fail_timeout=10s'])
+            upstream.add(Directive('server', args))
+        return upstream
+
+    def get_state(self):
+        """
+        Returns the recorded hashes of the generated artifacts
+
+        """
+        with self._state_lock:
+            if self._state is None:
+                self._state = {}
+                if os.path.exists(self._state_file):
+                    try:
+                        with open(self._state_file, 'r') as f:
+                            self._state = json.load(f)
+                    except ValueError:
+                        self.log.warn('Ignoring invalid state file {0}'.format(self._state_file))
+            return self._state
+
+    def set_state(self, name, digest):
+        """
+        Records the hash of a generated artifact
+
+        """
+        # steps writing artifacts run concurrently (see create)
+        with self._state_lock:
+            state = self.get_state()
+            if state.get(name) != digest:
+                state[name] = digest
+                write_file(self._state_file, json.dumps(state, indent=1, sort_keys=True) + '\n')
+
+    def write_artifact(self, name, path, content, mode=None):
+        """
+        Writes a generated file unless it is unchanged since the last run
+
+        Returns True if the file was written
+
+        """
+        digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        if self.get_state().get(name) == digest and os.path.exists(path):
+            return False
+        written = write_file(path, content, mode)
+        self.set_state(name, digest)
+        if written:
+            self.log.debug('Wrote {0}'.format(path))
+        return written
+
+    def get_virtualenv_key(self):
+        """
+        Returns the hash of the inputs of the project virtualenv
+
+        """
+        h = hashlib.sha1()
+        h.update(self.__class__.__name__.encode('utf-8'))
+        for m in sorted(set(self._modules)):
+            h.update(b'\0' + m.encode('utf-8'))
+        return h.hexdigest()
+
     def check_directories(self):
         """
         Creates base directories for app, virtualenv, and nginx
 
         """
         self.log.debug('Checking directories')
-        if not os.path.exists(self._ve_dir):
-            os.makedirs(self._ve_dir)
-        if not os.path.exists(self._app_dir):
-            os.makedirs(self._app_dir)
-        if not os.path.exists(self._conf_dir):
-            os.makedirs(self._conf_dir)
-        if not os.path.exists(self._var_dir):
-            os.makedirs(self._var_dir)
-        if not os.path.exists(self._log_dir):
-            os.makedirs(self._log_dir)
-        if not os.path.exists(self._script_dir):
-            os.makedirs(self._script_dir)
+        for d in (self._ve_dir, self._app_dir, self._conf_dir, self._var_dir, \
+            self._log_dir, self._script_dir):
+            make_dirs(d)
 
         # copy uswgi_params for nginx
         uwsgi_params = '/etc/nginx/uwsgi_params'
@@ -149,26 +433,162 @@ class ProjectCreator(object):
     def create_virtualenv(self):
         """
         Creates the virtualenv for the project
-        
+
+        Returns True if the virtualenv is ready for use
+
         """
-        if check_command('virtualenv'):
-            ve_dir = os.path.join(self._ve_dir, self._project_name)
-            if os.path.exists(ve_dir):
-                if self._force:
-                    logging.warn('Removing existing virtualenv')
-                    shutil.rmtree(ve_dir)
-                else:
-                    logging.warn('Found existing virtualenv; not creating (use --force to overwrite)')
-                    return
+        from ignition import baseenv
+        if not check_command('virtualenv'):
+            return False
+        ve_dir = os.path.join(self._ve_dir, self._project_name)
+        key = self.get_virtualenv_key()
+        if os.path.exists(ve_dir):
+            if self._force:
+                logging.warn('Removing existing virtualenv')
+                shutil.rmtree(ve_dir)
+            elif self.get_state().get('virtualenv') == key:
+                self.log.debug('Virtualenv is up to date')
+                return True
+            else:
+                # only install the changed module set into the existing virtualenv
+                logging.info('Modules changed; updating existing virtualenv (use --force to recreate)')
+                if not self.install_modules():
+                    return False
+                self.set_state('virtualenv', key)
+                return True
+        if self._base_env:
+            base_dir = self.create_base_env()
+            if not base_dir:
+                return False
+            logging.info('Cloning virtualenv from base environment')
+            baseenv.clone_env(base_dir, ve_dir)
+        else:
             logging.info('Creating virtualenv')
-            p = subprocess.Popen('virtualenv --no-site-packages {0} > /dev/null'.format(ve_dir), shell=True)
-            os.waitpid(p.pid, 0)
-            # install modules
-            for m in self._modules:
-                self.log.info('Installing module {0}'.format(m))
-                p = subprocess.Popen('{0} install {1} > /dev/null'.format(os.path.join(self._ve_dir, \
-                self._project_name) + os.sep + 'bin' + os.sep + 'pip', m), shell=True)
-                os.waitpid(p.pid, 0)
+            ret, out = run_command(['virtualenv', '--no-site-packages', ve_dir])
+            if ret != 0:
+                self.log.error('Unable to create virtualenv:\n{0}'.format(out))
+                return False
+            if not self.install_modules():
+                return False
+        self.set_state('virtualenv', key)
+        return True
+
+    def check_python(self):
+        """
+        Checks that the virtualenv Python supports the concurrency model
+
+        Returns False (instead of generating a config uWSGI can't load) if
+        the model needs a newer Python
+
+        """
+        required = concurrency.get_min_python(self._concurrency)
+        if not required:
+            return True
+        ret, out = run_command([self._py, '-c', 'import sys; print("%d %d" % sys.version_info[:2])'])
+        try:
+            version = tuple([int(x) for x in out.split()])
+        except ValueError:
+            version = ()
+        if ret != 0 or len(version) != 2:
+            self.log.error('Unable to check the virtualenv Python version:\n{0}'.format(out))
+            return False
+        if version < required:
+            self.log.error('The {0} concurrency model needs Python {1}; the virtualenv has Python {2} '\
+                '(create it with a newer Python)'.format(self._concurrency, '.'.join(map(str, required)), \
+                '.'.join(map(str, version))))
+            return False
+        return True
+
+    def get_base_env_dir(self):
+        """
+        Returns the path to the base environment for the project template and modules
+
+        """
+        from ignition import baseenv
+        key = baseenv.get_base_env_key(self.__class__.__name__, self._modules)
+        return os.path.join(self._base_env_dir, key)
+
+    def create_base_env(self):
+        """
+        Creates the base environment shared by projects with the same
+        template and modules (if it doesn't already exist)
+
+        Returns the path to the base environment or None on failure
+
+        """
+        from ignition import baseenv
+        base_dir = self.get_base_env_dir()
+        # creators sharing a base environment wait for the first to build it
+        with get_lock(base_dir):
+            if os.path.exists(base_dir):
+                return base_dir
+            make_dirs(self._base_env_dir)
+            # build in a temporary dir and move it into place when complete so
+            # that other processes never clone a partial environment
+            build_dir = tempfile.mkdtemp(prefix='.build-', dir=self._base_env_dir)
+            self.log.info('Creating base environment {0}'.format(os.path.basename(base_dir)))
+            ret, out = run_command(['virtualenv', '--no-site-packages', build_dir])
+            if ret != 0:
+                self.log.error('Unable to create base environment:\n{0}'.format(out))
+                shutil.rmtree(build_dir)
+                return None
+            if not self.install_modules(build_dir):
+                shutil.rmtree(build_dir)
+                return None
+            baseenv.mark_base_env(build_dir)
+            try:
+                os.rename(build_dir, base_dir)
+            except OSError:
+                # another process finished the same base environment first
+                shutil.rmtree(build_dir)
+        return base_dir
+
+    def install_modules(self, ve_dir=None):
+        """
+        Installs the project modules into the virtualenv
+
+        All modules are resolved in a single pass and built into the
+        wheelhouse, then installed from it without touching the index.  In
+        offline mode only the wheelhouse is used.
+
+        :keyword ve_dir: Virtualenv to install into (default: the project virtualenv)
+
+        Returns True if all modules were installed
+
+        """
+        if not self._modules:
+            return True
+        if not ve_dir:
+            ve_dir = os.path.join(self._ve_dir, self._project_name)
+        pip = os.path.join(ve_dir, 'bin', 'pip')
+        make_dirs(self._wheelhouse)
+        if not self._offline:
+            # each pass builds into its own directory (reusing the shared
+            # wheels) so concurrent creators download in parallel; only
+            # publishing the finished wheels is serialized
+            build_dir = tempfile.mkdtemp(prefix='.build-', dir=self._wheelhouse)
+            try:
+                self.log.info('Building wheels for {0}'.format(', '.join(self._modules)))
+                ret, out = run_command([pip, 'wheel', '--wheel-dir', build_dir, \
+                    '--find-links', self._wheelhouse] + self._modules)
+                if ret != 0:
+                    self.log.error('Unable to build wheels:\n{0}'.format(out))
+                    return False
+                with get_lock(self._wheelhouse):
+                    for name in os.listdir(build_dir):
+                        if name.endswith('.whl') and not os.path.exists(os.path.join(self._wheelhouse, name)):
+                            os.rename(os.path.join(build_dir, name), os.path.join(self._wheelhouse, name))
+            finally:
+                shutil.rmtree(build_dir, ignore_errors=True)
+        self.log.info('Installing modules {0}'.format(', '.join(self._modules)))
+        ret, out = run_command([pip, 'install', '--no-index', '--find-links', \
+            self._wheelhouse] + self._modules)
+        if ret != 0:
+            self.log.error('Unable to install modules:\n{0}'.format(out))
+            if self._offline:
+                self.log.error('Offline mode only installs from {0}'.format(self._wheelhouse))
+            return False
+        return True
 
     def create_project(self):
         logging.error('Not yet implemented')
@@ -176,114 +596,581 @@ class ProjectCreator(object):
     def create_uwsgi_script(self):
         logging.error('Not yet implemented')
 
-    def create_nginx_config(self):
+    def get_uwsgi_config_file(self, instance=0):
         """
-        Creates the Nginx configuration for the project
+        Returns the path to the uWSGI ini config for a project instance
 
         """
-        cfg = '# nginx config for {0}\n'.format(self._project_name)
-        if not self._shared_hosting:
+        return os.path.join(self._conf_dir, '{0}_uwsgi.ini'.format(self.get_instance_name(instance)))
+
+    def get_uwsgi_pidfile(self, instance=0):
+        return os.path.join(self._var_dir, '{0}_uwsgi.pid'.format(self.get_instance_name(instance)))
+
+    def get_uwsgi_log(self, instance=0):
+        return os.path.join(self._log_dir, '{0}_uwsgi.log'.format(self.get_instance_name(instance)))
+
+    def get_uwsgi_instance_options(self, instance=0):
+        """
+        Returns the uWSGI options that differ between instances as a list
+        of (option, values)
+
+        """
+        from ignition import stats
+        return [
+            ('socket', self.get_uwsgi_sockets(instance)),
+            ('pidfile', [self.get_uwsgi_pidfile(instance)]),
+            ('daemonize', [self.get_uwsgi_log(instance)]),
+            ('stats', [stats.get_stats_socket(self._root_dir, self.get_instance_name(instance))]),
+            ('master-fifo', [self.get_master_fifo(instance)]),
+        ]
+
+    def get_uwsgi_config(self):
+        """
+        Returns the uWSGI settings shared by all templates (see
+        ignition.config.UwsgiConfig); creators add the application settings
+
+        """
+        from ignition import tuning
+        from ignition import memory
+        from ignition import scaling
+        cfg = config.UwsgiConfig()
+        # set user
+        if self._user:
+            cfg.add('uid', self._user)
+        # set VE dir
+        cfg.add('home', os.path.join(self._ve_dir, self._project_name))
+        # set process / thread limits
+        # instances share the processes and memory sized for the host
+        limits = self.get_memory_limits()
+        cfg.add('processes', limits['processes'])
+        if self._concurrency:
+            concurrency.add_uwsgi_options(cfg, self._concurrency, self._sizing)
+        elif self._sizing['threads'] > 1:
+            cfg.add('threads', self._sizing['threads'])
+        cfg.add('listen', self._sizing['listen'])
+        # sockets, pidfile, log, stats server (read by ignite.py --stats) and
+        # master fifo (graceful reload / stop from the manage scripts)
+        for option, values in self.get_uwsgi_instance_options():
+            for v in values:
+                cfg.add(option, v)
+        cfg.add('memory-report', True)
+        # misc
+        cfg.add('no-orphans', True)
+        cfg.add('vacuum', True)
+        cfg.add('master', True)
+        cfg.add('chmod-socket', 664)
+        cfg.add('harakiri', self._harakiri)
+        if self._preload:
+            # load the app in the master and fork (workers share it copy-on-write)
+            cfg.add('lazy-apps', False)
+            cfg.add('import', self.get_preload_file())
+        else:
+            # each worker loads the app so a chain reload picks up new code
+            cfg.add('lazy-apps', True)
+        # recycle workers on memory growth and age (see ignition.memory)
+        memory.add_uwsgi_options(cfg, limits)
+        if self._scaling:
+            scaling.add_uwsgi_options(cfg, self._scaling, limits)
+        cfg.add('post-buffering', 16777216)
+        # settings picked by ignite.py --tune
+        for k, v in sorted(tuning.load_tuning(self._root_dir, self._project_name).get('uwsgi', {}).items()):
+            cfg.set(k, v)
+        scaling.clamp_cheaper(cfg)
+        return cfg
+
+    def get_memory_limits(self):
+        """
+        Returns the uWSGI process, recycling and scaling settings of each
+        instance (from the measured memory usage, if any)
+
+        """
+        from ignition import memory
+        return memory.get_limits(max(1, self._sizing['processes'] // self._uwsgi_instances), \
+            memory.load_measurement(self._root_dir, self._project_name), \
+            self._memory_budget // self._uwsgi_instances)
+
+    def measure_memory(self):
+        """
+        Measures the worker memory of the project with a local warm-up run
+        and regenerates the uWSGI config with limits derived from it
+
+        Returns the measurement (None if uWSGI could not be measured)
+
+        """
+        from ignition import memory
+        from ignition import benchmark
+        try:
+            measurement = memory.measure(self._root_dir, self._project_name)
+        except (benchmark.BenchmarkError, IOError, OSError) as e:
+            self.log.warn('Unable to measure memory usage: {0}'.format(e))
+            return None
+        memory.save_measurement(self._root_dir, self._project_name, measurement)
+        self.create_uwsgi_script()
+        return measurement
+
+    def get_master_fifo(self, instance=0):
+        """
+        Returns the path to the uWSGI master fifo of a project instance
+
+        """
+        return os.path.join(self._var_dir, '{0}_uwsgi.fifo'.format(self.get_instance_name(instance)))
+
+    def get_preload_file(self):
+        """
+        Returns the path to the module the uWSGI master preloads
+
+        """
+        return os.path.join(self._conf_dir, '{0}_preload.py'.format(self._project_name))
+
+    def get_preload_modules(self):
+        """
+        Returns the modules to preload (heavy imports first, the app last)
+
+        """
+        modules = []
+        for m in self._preload_modules + self.PRELOAD_MODULES:
+            if m not in modules:
+                modules.append(m)
+        return modules
+
+    def compile_bytecode(self):
+        """
+        Precompiles the bytecode of the virtualenv and app so workers don't
+        compile on first import
+
+        """
+        from ignition import startup
+        return startup.compile_bytecode(self._py, [os.path.join(self._ve_dir, self._project_name, 'lib'), \
+            os.path.join(self._app_dir, self._project_name)])
+
+    def write_uwsgi_config(self, cfg):
+        """
+        Writes the uWSGI ini config and the script that launches it for
+        each instance
+
+        :keyword cfg: Config of the first instance (see get_uwsgi_config)
+
+        """
+        from ignition import startup
+        if self._preload:
+            self.write_artifact('preload', self.get_preload_file(), startup.get_preload_module(\
+                self._project_name, self.get_preload_modules(), self._gc_freeze))
+        if self._profiling:
+            self.install_profiler(cfg)
+        uwsgi = 'uwsgi'
+        if concurrency.uses_virtualenv_uwsgi(self._concurrency):
+            uwsgi = os.path.join(self._ve_dir, self._project_name, 'bin', 'uwsgi')
+        for i in range(self._uwsgi_instances):
+            if i > 0:
+                cfg = config.parse_uwsgi(cfg.serialize())
+                for option, values in self.get_uwsgi_instance_options(i):
+                    cfg.remove(option)
+                    for v in values:
+                        cfg.add(option, v)
+            suffix = '_{0}'.format(i) if i else ''
+            uwsgi_config = self.get_uwsgi_config_file(i)
+            self.write_artifact('uwsgi_config' + suffix, uwsgi_config, cfg.serialize())
+            uwsgi_file = os.path.join(self._conf_dir, '{0}.uwsgi'.format(self.get_instance_name(i)))
+            self.write_artifact('uwsgi_script' + suffix, uwsgi_file, '{0} --ini {1}\n'.format(\
+                uwsgi, uwsgi_config), 0754)
+
+    def get_profile_dir(self):
+        from ignition import profiling
+        return profiling.get_profile_dir(self._root_dir, self._project_name)
+
+    def install_profiler(self, cfg):
+        """
+        Copies the profiling middleware next to the app and wraps the app
+        of a uWSGI config with it (see ignition.profiler)
+
+        """
+        from ignition import profiling
+        if self._concurrency in ('gevent', 'asyncio'):
+            self.log.warn('Greenlets share a thread; profiles of concurrent requests will be mixed')
+        make_dirs(self.get_profile_dir())
+        module = os.path.join(self._app_dir, self._project_name, profiling.PROFILER_MODULE + '.py')
+        make_dirs(os.path.dirname(module))
+        self.write_artifact('profiler', module, profiling.get_profiler_source())
+        return profiling.add_uwsgi_options(cfg, self.get_profile_dir(), self._profile_rate, \
+            self._profile_threshold)
+
+    def get_uwsgi_location(self, path, cache_ttl=None):
+        """
+        Returns an Nginx location passing requests to the project uWSGI upstream
+
+        :keyword path: Location path
+        :keyword cache_ttl: Time to cache successful responses (i.e. 5m) when
+            caching is enabled; without a TTL only responses with explicit
+            cache headers (Cache-Control, Expires, X-Accel-Expires) are cached
+
+        """
+        loc = Directive('location', [path], [])
+        loc.add(Directive('uwsgi_pass', ['{0}_uwsgi'.format(self._project_name)]))
+        loc.add(Directive('include', ['uwsgi_params']))
+        # timeouts outlast uwsgi harakiri so nginx never gives up first
+        loc.add(Directive('uwsgi_connect_timeout', ['5s']))
+        loc.add(Directive('uwsgi_read_timeout', ['{0}s'.format(self._harakiri + HARAKIRI_GRACE)]))
+        loc.add(Directive('uwsgi_send_timeout', ['{0}s'.format(self._harakiri + HARAKIRI_GRACE)]))
+        loc.add(Directive('uwsgi_next_upstream', ['error']))
+        # buffers
+        loc.add(Directive('uwsgi_buffering', ['on']))
+        loc.add(Directive('uwsgi_buffer_size', ['16k']))
+        loc.add(Directive('uwsgi_buffers', [16, '16k']))
+        loc.add(Directive('uwsgi_busy_buffers_size', ['32k']))
+        if self._cache:
+            loc.add(Directive('uwsgi_cache', ['{0}_cache'.format(self._project_name)]))
+            loc.add(Directive('uwsgi_cache_key', ['$scheme$host$request_uri']))
+            if cache_ttl:
+                loc.add(Directive('uwsgi_cache_valid', [200, 301, 302, cache_ttl]))
+            loc.add(Directive('uwsgi_cache_lock', ['on']))
+            loc.add(Directive('uwsgi_cache_use_stale', ['error', 'timeout', 'updating', \
+                'http_500', 'http_503']))
+            # never cache authenticated or session requests
+            skip = ['$http_authorization', '$cookie_sessionid', '$cookie_session']
+            loc.add(Directive('uwsgi_cache_bypass', skip))
+            loc.add(Directive('uwsgi_no_cache', skip))
+            loc.add(Directive('add_header', ['X-Cache-Status', '$upstream_cache_status', 'always']))
+        return loc
+
+    def get_status_location(self):
+        """
+        Returns the Nginx location serving connection and request counters
+        (read by ignite.py --stats)
+
+        """
+        from ignition import stats
+        return Directive('location', ['=', stats.NGINX_STATUS_PATH], [
+            Directive('stub_status', []),
+            Directive('allow', ['127.0.0.1']),
+            Directive('deny', ['all']),
+            Directive('access_log', ['off']),
+        ])
+
+    def get_nginx_server(self):
+        """
+        Returns the Nginx server block for the project
+
+        """
+        from ignition import logs
+        from ignition import tls
+        server = Directive('server', children=[])
+        if self._tls:
+            # older nginx only accepts http2 as a listen parameter
+            server.add(Directive('listen', ['0.0.0.0:{0}'.format(self._tls_port), 'ssl', 'http2']))
+        else:
+            server.add(Directive('listen', ['0.0.0.0:{0}'.format(self._port)]))
+        if self._server_name:
+            server.add(Directive('server_name', [self._server_name]))
+        if self._tls:
+            for d in tls.get_server_directives(self._tls_cert, self._tls_key, \
+                tls.get_ticket_key_path(self._root_dir, self._project_name)):
+                server.add(d)
+        if self._shared_hosting:
+            # the log format is defined by the front end
+            server.add(Directive('access_log', ['{0}-access.log'.format(\
+                os.path.join(self._log_dir, self._project_name)), logs.LOG_FORMAT_NAME]))
+        # location section
+        server.add(self.get_uwsgi_location('/'))
+        # cacheable routes
+        if self._cache:
+            for path, ttl in self._cache_routes:
+                server.add(self.get_uwsgi_location(path, ttl))
+        if not self._tls:
+            server.add(self.get_status_location())
+        # error page templates
+        server.add(Directive('error_page', [500, 502, 503, 504, '/50x.html']))
+        server.add(Directive('location', ['=', '/50x.html'], [Directive('root', ['html'])]))
+        return server
+
+    def get_nginx_config_tree(self):
+        """
+        Returns the Nginx config for the project as a directive tree (see
+        ignition.config)
+
+        """
+        from ignition import logs
+        from ignition import tls
+        cfg = config.new_nginx_config([config.comment('nginx config for {0}'.format(\
+            self._project_name))])
+        if self._shared_hosting:
+            # server blocks are included in the http section of the front end
+            http = cfg
+        else:
             # user
             if self._user:
-                cfg += 'user {0};\n'.format(self._user)
+                cfg.add(Directive('user', [self._user]))
             # misc nginx config
-            cfg += 'worker_processes 1;\nerror_log {0}-errors.log;\n\
-pid {1}_    nginx.pid;\n\n'.format(os.path.join(self._log_dir, \
-                self._project_name), os.path.join(self._var_dir, self._project_name))
-            cfg += 'events {\n\tworker_connections 32;\n}\n\n'
+            cfg.add(Directive('worker_processes', [self._sizing['worker_processes']]))
+            cfg.add(Directive('worker_rlimit_nofile', [self._sizing['worker_rlimit_nofile']]))
+            cfg.add(Directive('error_log', ['{0}-errors.log'.format(\
+                os.path.join(self._log_dir, self._project_name))]))
+            cfg.add(Directive('pid', ['{0}_nginx.pid'.format(\
+                os.path.join(self._var_dir, self._project_name))]))
+            cfg.add(config.blank())
+            cfg.add(Directive('events', children=[Directive('worker_connections', \
+                [self._sizing['worker_connections']])]))
+            cfg.add(config.blank())
             # http section
-            cfg += 'http {\n'
+            http = cfg.add(Directive('http', children=[]))
             if self._include_mimetypes:
-                cfg += '\tinclude mime.types;\n'
-            cfg += '\tdefault_type application/octet-stream;\n'
-            cfg += '\tclient_max_body_size 1G;\n'
-            cfg += '\tproxy_max_temp_file_size 0;\n'
-            cfg += '\tproxy_buffering off;\n'
-            cfg += '\taccess_log {0}-access.log;\n'.format(os.path.join \
-                (self._log_dir, self._project_name))
-            cfg += '\tsendfile on;\n'
-            cfg += '\tkeepalive_timeout 65;\n'
-            # server section
-        cfg += '\tserver {\n'
-        cfg += '\t\tlisten 0.0.0.0:{0};\n'.format(self._port)
-        if self._server_name:
-            cfg += '\t\tserver_name {0};\n'.format(self._server_name)
-        # location section
-        cfg += '\t\tlocation / {\n'
-        cfg += '\t\t\tuwsgi_pass unix:///{0}.sock;\n'.format(\
-            os.path.join(self._var_dir, self._project_name))
-        cfg += '\t\t\tinclude uwsgi_params;\n'
-        cfg += '\t\t}\n\n'
-        # end location
-        # error page templates
-        cfg += '\t\terror_page 500 502 503 504 /50x.html;\n'
-        cfg += '\t\tlocation = /50x.html {\n'
-        cfg += '\t\t\troot html;\n'
-        # end error page section
-        cfg += '\t\t}\n'
-        # end server section
-        cfg += '\t}\n'
-        if not self._shared_hosting:
-            # end http section
-            cfg += '}\n'
+                http.add(Directive('include', ['mime.types']))
+            http.add(Directive('default_type', ['application/octet-stream']))
+            http.add(Directive('client_max_body_size', ['1G']))
+            http.add(Directive('proxy_max_temp_file_size', [0]))
+            http.add(Directive('proxy_buffering', ['off']))
+            http.add(logs.get_log_format())
+            http.add(Directive('access_log', ['{0}-access.log'.format(\
+                os.path.join(self._log_dir, self._project_name)), logs.LOG_FORMAT_NAME]))
+            http.add(Directive('sendfile', ['on']))
+            http.add(Directive('keepalive_timeout', [65]))
+            http.add(Directive('keepalive_requests', [1000]))
+            http.add(config.blank())
+        # response cache
+        if self._cache:
+            cache_dir = os.path.join(self._var_dir, 'cache', self._project_name)
+            http.add(Directive('uwsgi_cache_path', [cache_dir, 'levels=1:2', \
+                'keys_zone={0}_cache:10m'.format(self._project_name), \
+                'max_size={0}'.format(self._cache_size), \
+                'inactive={0}'.format(self._cache_inactive)]))
+            http.add(config.blank())
+        # upstream section (uwsgi sockets and backends)
+        http.add(self.get_upstream())
+        http.add(config.blank())
+        # server section
+        http.add(self.get_nginx_server())
+        if self._tls:
+            # plain HTTP redirects to HTTPS (status counters stay on HTTP)
+            http.add(config.blank())
+            http.add(tls.get_redirect_server(self._port, self._tls_port, self._server_name, \
+                [self.get_status_location()]))
+        return cfg
+
+    def create_tls_files(self):
+        """
+        Creates the session ticket key and, without a certificate, a
+        self-signed one for local testing
+
+        Returns False if the certificate could not be created
+
+        """
+        from ignition import tls
+        tls.create_ticket_key(tls.get_ticket_key_path(self._root_dir, self._project_name))
+        if not self._tls_self_signed or os.path.exists(self._tls_cert):
+            return True
+        self.log.warn('Creating a self-signed certificate for local testing: {0}'.format(self._tls_cert))
+        return tls.create_self_signed(self._tls_cert, self._tls_key, self._server_name or 'localhost')
 
+    def create_nginx_config(self):
+        """
+        Creates the Nginx configuration for the project
+
+        """
+        if self._cache:
+            make_dirs(os.path.join(self._var_dir, 'cache', self._project_name))
+        if self._tls:
+            self.create_tls_files()
+        cfg = self.get_nginx_config_tree()
+        # keep static directories added to the existing config
+        if os.path.exists(self._nginx_config):
+            try:
+                f = open(self._nginx_config, 'r')
+                current = config.find_server(config.parse_nginx(f.read()))
+                f.close()
+            except config.ConfigError as e:
+                self.log.warn('Unable to parse existing Nginx config: {0}'.format(e))
+                current = None
+            server = config.find_server(cfg)
+            for loc in current.find_all('location') if current else []:
+                if loc.args[:1] == ['^~'] and loc.find('alias') and \
+                    not server.find('location', loc.args):
+                    server.add(loc, after=server.find('location', ['/']))
         # create conf
-        f = open(self._nginx_config, 'w')
-        f.write(cfg)
-        f.close()
+        self.write_artifact('nginx', self._nginx_config, cfg.serialize())
+
+    def get_nginx_commands(self):
+        """
+        Returns the shell commands to start and gracefully reload Nginx
+
+        Reloads test the config first so a broken config never takes the
+        running server down.
+
+        """
+        from ignition import hosting
+        if self._shared_hosting:
+            # the shared front end serves every shared project
+            nginx_config = hosting.get_frontend_config(self._root_dir)
+            pidfile = hosting.get_frontend_pidfile(self._root_dir)
+        else:
+            nginx_config = self._nginx_config
+            pidfile = '{0}_nginx.pid'.format(os.path.join(self._var_dir, self._project_name))
+        running = '[ -e {0} ] && kill -0 `cat {0}` 2> /dev/null'.format(pidfile)
+        start = 'nginx -c {0}'.format(nginx_config)
+        reload = 'nginx -t -q -c {0} && nginx -c {0} -s reload'.format(nginx_config)
+        return (running, start, reload)
 
     def create_manage_scripts(self):
         """
-        Creates scripts to start and stop the application
+        Creates scripts to start, stop, reload and restart the application
+
+        Reloads and restarts go through the uWSGI master fifo so in-flight
+        requests are finished and the sockets stay open; start waits for
+        the sockets to accept connections instead of sleeping.
 
         """
+        from ignition import stats
+        from ignition import control
+        ctl_file = os.path.join(self._script_dir, 'ignitionctl.py')
+        with open(os.path.splitext(control.__file__)[0] + '.py', 'r') as f:
+            self.write_artifact('control_script', ctl_file, f.read(), 0754)
+        ctl = '{0} {1}'.format(self._py, ctl_file)
+        timeout = self._harakiri + 30
+        nginx_running, nginx_start, nginx_reload = self.get_nginx_commands()
+        nginx_ready = '{0} wait 127.0.0.1:{1} 30'.format(ctl, self._port)
+        # preloaded apps live in the master so every worker must be replaced at once
+        reload_command = control.GRACEFUL_RELOAD if self._preload else control.CHAIN_RELOAD
+        start_uwsgi = {}
+        stop_uwsgi = {}
+        reload_uwsgi = {}
+        restart_uwsgi = {}
+        for i in range(self._uwsgi_instances):
+            name = self.get_instance_name(i)
+            pidfile = self.get_uwsgi_pidfile(i)
+            fifo = self.get_master_fifo(i)
+            stats_socket = stats.get_stats_socket(self._root_dir, name)
+            running = '[ -e {0} ] && kill -0 `cat {0}` 2> /dev/null'.format(pidfile)
+            start_uwsgi[i] = 'sh {0}.uwsgi\n'.format(os.path.join(self._conf_dir, name))
+            start_uwsgi[i] += '{0} wait {1} 30 || {{ echo \'uWSGI did not start (see {2})\' ; exit 1 ; }}\n'.format(\
+                ctl, self.get_upstream_servers(i)[0], self.get_uwsgi_log(i))
+            # stop once in-flight requests are done
+            stop_uwsgi[i] = 'if [ -e {0} ]; then\n'.format(pidfile)
+            stop_uwsgi[i] += '    {0} stop {1} {2} {3} || kill -9 `cat {2}`\n'.format(ctl, fifo, pidfile, timeout)
+            stop_uwsgi[i] += '    rm -f {0}\n'.format(pidfile)
+            stop_uwsgi[i] += 'fi\n'
+            # instances are reloaded one after the other so the others keep serving
+            for scripts, command in ((reload_uwsgi, reload_command), (restart_uwsgi, control.GRACEFUL_RELOAD)):
+                scripts[i] = 'if {0} ; then\n'.format(running)
+                scripts[i] += '    {0} reload {1} {2} {3} {4} || {{ echo \'uWSGI reload did not complete (see {5})\' ; exit 1 ; }}\n'.format(\
+                    ctl, fifo, stats_socket, command, timeout, self.get_uwsgi_log(i))
+                scripts[i] += 'else\n'
+                scripts[i] += ''.join(['    ' + x + '\n' for x in start_uwsgi[i].splitlines()])
+                scripts[i] += 'fi\n'
+        instances = range(self._uwsgi_instances)
+
         # create start script
         start = '# start script for {0}\n\n'.format(self._project_name)
         # start uwsgi
         start += 'echo \'Starting uWSGI...\'\n'
-        start += 'sh {0}.uwsgi\n'.format(os.path.join(self._conf_dir, self._project_name))
-        start += 'sleep 1\n'
-        # start nginx
+        start += ''.join([start_uwsgi[i] for i in instances])
+        # start nginx (or reload the running shared front end to pick up the project)
         start += 'echo \'Starting Nginx...\'\n'
-        start += 'nginx -c {0}_nginx.conf\n'.format(os.path.join(self._conf_dir, self._project_name))
-        start += 'sleep 1\n'
+        start += 'if {0} ; then {1} ; else {2} ; fi\n'.format(nginx_running, nginx_reload, nginx_start)
+        start += '{0} || {{ echo \'Nginx did not start\' ; exit 1 ; }}\n'.format(nginx_ready)
         start += 'echo \'{0} started\'\n\n'.format(self._project_name)
 
         # stop script
         stop = '# stop script for {0}\n\n'.format(self._project_name)
-        # stop nginx
-        stop += 'if [ -e {0}_nginx.pid ]; then nginx -c {1}_nginx.conf -s stop ; fi\n'.format(os.path.join(self._var_dir, self._project_name), os.path.join(self._conf_dir, self._project_name))
-        # stop uwsgi
-        stop += 'if [ -e {0}_uwsgi.pid ]; then kill -9 `cat {0}_uwsgi.pid` ; rm {0}_uwsgi.pid 2>&1 > /dev/null ; fi\n'.format(os.path.join(self._var_dir, self._project_name))
+        # stop nginx (the shared front end keeps serving other projects)
+        if not self._shared_hosting:
+            stop += 'if {0} ; then nginx -c {1} -s quit ; fi\n'.format(nginx_running, self._nginx_config)
+        stop += ''.join([stop_uwsgi[i] for i in instances])
         stop += 'echo \'{0} stopped\'\n'.format(self._project_name)
 
+        # reload script (new code, no dropped requests)
+        reload = '# reload script for {0}\n\n'.format(self._project_name)
+        reload += 'echo \'Reloading uWSGI...\'\n'
+        reload += ''.join([reload_uwsgi[i] for i in instances])
+        reload += 'echo \'Reloading Nginx...\'\n'
+        reload += 'if {0} ; then {1} ; else {2} ; fi\n'.format(nginx_running, nginx_reload, nginx_start)
+        reload += 'echo \'{0} reloaded\'\n'.format(self._project_name)
+
+        # restart script (new uwsgi config too; sockets stay open)
+        restart = '# restart script for {0}\n\n'.format(self._project_name)
+        restart += 'echo \'Restarting uWSGI...\'\n'
+        restart += ''.join([restart_uwsgi[i] for i in instances])
+        restart += 'echo \'Reloading Nginx...\'\n'
+        restart += 'if {0} ; then {1} ; else {2} ; fi\n'.format(nginx_running, nginx_reload, nginx_start)
+        restart += 'echo \'{0} restarted\'\n'.format(self._project_name)
+
         # write scripts
-        start_file = '{0}_start.sh'.format(os.path.join(self._script_dir, self._project_name))
-        stop_file = '{0}_stop.sh'.format(os.path.join(self._script_dir, self._project_name))
-        f = open(start_file, 'w')
-        f.write(start)
-        f.close()
-        f = open(stop_file, 'w')
-        f.write(stop)
-        f.close()
-        # make executable
-        os.chmod(start_file, 0754)
-        os.chmod(stop_file, 0754)
+        for name, content in (('start', start), ('stop', stop), ('reload', reload), ('restart', restart)):
+            script_file = '{0}_{1}.sh'.format(os.path.join(self._script_dir, self._project_name), name)
+            self.write_artifact('{0}_script'.format(name), script_file, content, 0754)
 
-    def create(self):
+    def get_timings_file(self):
+        return os.path.join(self._log_dir, '{0}_timings.json'.format(self._project_name))
+
+    def get_timings(self):
         """
-        Creates the full project
+        Returns the step timings of the last create (see ignition.runner)
+
+        """
+        return self._timings
 
+    def create_app(self):
         """
+        Creates the virtualenv, the project and the uWSGI config (each step
+        needs the previous one)
+
+        """
+        t = self._timings
         # create virtualenv
-        self.create_virtualenv()
+        if not t.run('virtualenv', self.create_virtualenv):
+            logging.error('Unable to create virtualenv for {0}'.format(self._project_name))
+            return False
+        if not t.run('python', self.check_python):
+            return False
         # create project
-        self.create_project()
+        t.run('project', self.create_project)
+        if self._preload:
+            t.run('bytecode', self.compile_bytecode)
         # generate uwsgi script
-        self.create_uwsgi_script()
+        t.run('uwsgi_config', self.create_uwsgi_script)
+        if self._measure_memory:
+            t.run('measure_memory', self.measure_memory)
+        return True
+
+    def create_server_config(self):
+        """
+        Creates the Nginx config and management scripts (these don't need
+        the virtualenv)
+
+        """
+        from ignition import hosting
+        t = self._timings
         # generate nginx config
-        self.create_nginx_config()
+        t.run('nginx_config', self.create_nginx_config)
+        if self._shared_hosting:
+            # add the project to the shared front end
+            t.run('frontend', hosting.update_frontend, self._root_dir, self._user, self._profile)
         # generate management scripts
-        self.create_manage_scripts()
+        t.run('manage_scripts', self.create_manage_scripts)
+        return True
+
+    def create(self):
+        """
+        Creates the full project
+
+        Re-running on an existing project only rebuilds what changed: the
+        virtualenv is updated when the module set changes and generated
+        files are only written when their content changes (hashes are kept
+        in conf/<project>_state.json).
+
+        The Nginx config and scripts are generated while the virtualenv is
+        built; the time of each step is logged (and written to
+        log/<project>_timings.json with timings).
+
+        """
+        from ignition import runner
+        self._timings = runner.Timings(self._project_name)
+        try:
+            ok = all(self._timings.run_parallel([self.create_app, self.create_server_config]))
+        finally:
+            report = self._timings.report()
+            self.log.info('Provisioning timings:\n{0}'.format(runner.format_report(report)))
+            if self._timings_report:
+                runner.save_report(report, self.get_timings_file())
+        if not ok:
+            return False
         logging.info('** Make sure to set proper permissions for the webserver user account on the var and log directories in the project root')
+        return True
 
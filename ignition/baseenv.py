@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import errno
+import shutil
+import hashlib
+import logging
+
+# file in a base environment recording the path it was built at
+BASE_MARKER = '.ignition-base'
+
+# files outside of bin/ that may contain the absolute virtualenv path
+RELOCATE_EXTENSIONS = ('.pth', '.egg-link', '.cfg', '.txt')
+
+def get_base_env_key(template, modules):
+    """
+    Returns the key for a base environment
+
+    :keyword template: Template (creator) name
+    :keyword modules: List of modules installed in the environment
+
+    """
+    h = hashlib.sha1()
+    h.update(template.encode('utf-8'))
+    for m in sorted(set([x.strip() for x in modules])):
+        h.update(b'\0')
+        h.update(m.encode('utf-8'))
+    return '{0}-{1}'.format(template.lower(), h.hexdigest()[:16])
+
+def get_base_prefix(base_dir):
+    """
+    Returns the path a base environment was originally built at
+
+    """
+    marker = os.path.join(base_dir, BASE_MARKER)
+    if os.path.exists(marker):
+        with open(marker, 'r') as f:
+            return f.read().strip()
+    return base_dir
+
+def mark_base_env(base_dir):
+    """
+    Records the build path of a base environment (before it is moved into place)
+
+    """
+    with open(os.path.join(base_dir, BASE_MARKER), 'w') as f:
+        f.write(base_dir)
+
+def _needs_relocation(rel_path):
+    parts = rel_path.split(os.sep)
+    if parts[0] in ('bin', 'Scripts'):
+        return True
+    return rel_path.endswith(RELOCATE_EXTENSIONS)
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copy2(src, dst)
+        return False
+
+def clone_env(base_dir, ve_dir):
+    """
+    Clones a base environment to a project virtualenv
+
+    Files are hardlinked to the base environment (falling back to a copy
+    across filesystems).  Scripts and path files that reference the base
+    location are copied and rewritten to point at the new virtualenv.
+
+    :keyword base_dir: Path to the base environment
+    :keyword ve_dir: Path to the new virtualenv (must not exist)
+
+    Returns a dict with the number of linked, copied and relocated files
+
+    """
+    log = logging.getLogger('baseenv')
+    base_prefix = get_base_prefix(base_dir)
+    prefix = base_prefix.encode('utf-8')
+    new_prefix = ve_dir.encode('utf-8')
+    counts = {'linked': 0, 'copied': 0, 'relocated': 0}
+    for root, dirs, files in os.walk(base_dir):
+        rel_root = os.path.relpath(root, base_dir)
+        dst_root = ve_dir if rel_root == '.' else os.path.join(ve_dir, rel_root)
+        os.makedirs(dst_root)
+        names = list(files)
+        # symlinked dirs (e.g. local/lib -> lib) are recreated as links
+        for d in list(dirs):
+            if os.path.islink(os.path.join(root, d)):
+                dirs.remove(d)
+                names.append(d)
+        for name in names:
+            if rel_root == '.' and name == BASE_MARKER:
+                continue
+            src = os.path.join(root, name)
+            dst = os.path.join(dst_root, name)
+            rel_path = os.path.normpath(os.path.join(rel_root, name))
+            if os.path.islink(src):
+                target = os.readlink(src)
+                if target.startswith(base_prefix):
+                    target = ve_dir + target[len(base_prefix):]
+                os.symlink(target, dst)
+            elif _needs_relocation(rel_path):
+                with open(src, 'rb') as f:
+                    data = f.read()
+                if prefix in data:
+                    with open(dst, 'wb') as f:
+                        f.write(data.replace(prefix, new_prefix))
+                    shutil.copymode(src, dst)
+                    counts['relocated'] += 1
+                elif _link_or_copy(src, dst):
+                    counts['linked'] += 1
+                else:
+                    counts['copied'] += 1
+            elif _link_or_copy(src, dst):
+                counts['linked'] += 1
+            else:
+                counts['copied'] += 1
+    log.debug('Cloned {0} to {1}: {2}'.format(base_dir, ve_dir, counts))
+    return counts
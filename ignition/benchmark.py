@@ -0,0 +1,575 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import errno
+import select
+import signal
+import socket
+import logging
+try:
+    import ssl
+except ImportError:
+    ssl = None
+import threading
+import subprocess
+from ignition import tls
+from ignition.common import run_command, get_percentile_rank
+from ignition.config import parse_uwsgi, parse_nginx, find_server
+
+MODES = [
+    'uwsgi',
+    'stack',
+]
+DEFAULT_LEVELS = [1, 10, 50]
+DEFAULT_DURATION = 10
+# seconds to wait for a started server to accept connections
+START_TIMEOUT = 30
+
+_CONNECTING, _HANDSHAKE, _SENDING, _READING = range(4)
+
+class BenchmarkError(Exception):
+    pass
+
+class _Connection(object):
+    def __init__(self, address, context=None, server_name=None):
+        self.address = address
+        # TLS (https) connections resume the previous session when reconnecting
+        self.context = context
+        self.server_name = server_name
+        self.session = None
+        self.handshakes = 0
+        self.resumed = 0
+        self.sock = None
+        self.state = None
+        self.out = b''
+        self.buf = b''
+        self.start = None
+        self.requests = 0
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(0)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        err = self.sock.connect_ex(self.address)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            raise socket.error(err, os.strerror(err))
+        self.state = _CONNECTING
+        self.requests = 0
+
+    def start_tls(self):
+        kwargs = {'server_hostname': self.server_name, 'do_handshake_on_connect': False}
+        if self.session is not None:
+            kwargs['session'] = self.session
+        self.sock = self.context.wrap_socket(self.sock, **kwargs)
+        self.state = _HANDSHAKE
+
+    def handshake(self):
+        """
+        Continues the TLS handshake
+
+        Returns the poll events to wait for, or None once it completed
+
+        """
+        try:
+            self.sock.do_handshake()
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                return select.POLLIN
+            if e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                return select.POLLOUT
+            raise
+        self.handshakes += 1
+        if getattr(self.sock, 'session_reused', False):
+            self.resumed += 1
+        self.state = _SENDING
+        return None
+
+    def close(self):
+        if self.sock:
+            if self.context:
+                # TLSv1.3 tickets arrive after the handshake
+                self.session = getattr(self.sock, 'session', None) or self.session
+            self.sock.close()
+        self.sock = None
+
+def get_tls_context():
+    """
+    Returns a client TLS context for benchmarks (certificates are not
+    verified so self-signed test certificates work)
+
+    """
+    if ssl is None or not hasattr(ssl, 'SSLContext'):
+        raise BenchmarkError('https:// needs Python with ssl.SSLContext (2.7.9+)')
+    context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23))
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    if hasattr(context, 'set_alpn_protocols'):
+        # the load generator speaks HTTP/1.1
+        context.set_alpn_protocols(['http/1.1'])
+    return context
+
+def _parse_response(buf):
+    """
+    Parses a complete HTTP response from the buffer
+
+    Returns (status, keepalive, consumed bytes) or None if incomplete
+
+    """
+    end = buf.find(b'\r\n\r\n')
+    if end == -1:
+        return None
+    lines = buf[:end].decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ', 2)
+    status = int(parts[1])
+    headers = {}
+    for l in lines[1:]:
+        if ':' in l:
+            k, v = l.split(':', 1)
+            headers[k.strip().lower()] = v.strip().lower()
+    keepalive = parts[0] == 'HTTP/1.1' and headers.get('connection') != 'close'
+    body = end + 4
+    if headers.get('transfer-encoding') == 'chunked':
+        pos = body
+        while True:
+            line_end = buf.find(b'\r\n', pos)
+            if line_end == -1:
+                return None
+            size = int(buf[pos:line_end].split(b';')[0], 16)
+            pos = line_end + 2 + size + 2
+            if len(buf) < pos:
+                return None
+            if size == 0:
+                return (status, keepalive, pos)
+    if 'content-length' in headers:
+        total = body + int(headers['content-length'])
+        if len(buf) < total:
+            return None
+        return (status, keepalive, total)
+    if status in (204, 304) or 100 <= status < 200:
+        return (status, keepalive, body)
+    # body ends when the server closes the connection
+    return (status, False, None)
+
+def percentile(values, pct):
+    """
+    Returns the nearest rank percentile of a sorted list
+
+    """
+    if not values:
+        return 0.0
+    return values[get_percentile_rank(len(values), pct) - 1]
+
+def run_load(url, concurrency=10, duration=DEFAULT_DURATION, requests=None, timeout=10, \
+    keepalive=True):
+    """
+    Drives an HTTP server with concurrent keepalive clients
+
+    A single non-blocking event loop runs all clients so the load generator
+    itself uses one core.
+
+    :keyword url: URL to request (http:// or https://host:port/path)
+    :keyword concurrency: Number of concurrent connections
+    :keyword duration: Seconds to run for
+    :keyword requests: Stop after this many requests (instead of duration)
+    :keyword timeout: Seconds before a request counts as an error
+    :keyword keepalive: Reuse connections between requests
+
+    Returns a dict with throughput, latency percentiles (ms) and errors;
+    https runs also count TLS handshakes and resumed sessions ('tls')
+
+    """
+    scheme, _, rest = url.partition('://')
+    if scheme not in ('http', 'https'):
+        raise BenchmarkError('Only http:// and https:// URLs are supported: {0}'.format(url))
+    context = get_tls_context() if scheme == 'https' else None
+    hostport, _, path = rest.partition('/')
+    host, _, port = hostport.partition(':')
+    address = (socket.gethostbyname(host), int(port or (443 if context else 80)))
+    request = 'GET /{0} HTTP/1.1\r\nHost: {1}\r\nUser-Agent: ignition-benchmark\r\n'.format(\
+        path, hostport)
+    if not keepalive:
+        request += 'Connection: close\r\n'
+    request = (request + '\r\n').encode('latin-1')
+
+    latencies = []
+    statuses = {}
+    errors = {'connect': 0, 'timeout': 0, 'io': 0}
+    conns = dict()
+    poller = select.poll()
+
+    def start_request(c, now):
+        c.out = request
+        c.buf = b''
+        c.start = now
+        if c.state not in (_CONNECTING, _HANDSHAKE):
+            c.state = _SENDING
+        poller.modify(c.sock, select.POLLOUT)
+
+    def reopen(c, now):
+        if c.sock:
+            poller.unregister(c.sock)
+            del conns[c.sock.fileno()]
+            c.close()
+        try:
+            c.open()
+        except socket.error:
+            errors['connect'] += 1
+            return
+        conns[c.sock.fileno()] = c
+        poller.register(c.sock, select.POLLOUT)
+        start_request(c, now)
+
+    started = time.time()
+    deadline = started + duration if not requests else None
+    issued = 0
+    clients = [_Connection(address, context, host) for i in range(concurrency)]
+    for c in clients:
+        reopen(c, started)
+        issued += 1
+    done = 0
+    while conns:
+        now = time.time()
+        if deadline and now >= deadline:
+            break
+        if requests and done >= requests:
+            break
+        for fd, event in poller.poll(100):
+            c = conns.get(fd)
+            if not c:
+                continue
+            now = time.time()
+            try:
+                if c.state == _CONNECTING:
+                    err = c.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if err:
+                        errors['connect'] += 1
+                        reopen(c, now)
+                        continue
+                    c.state = _SENDING
+                    if c.context:
+                        c.start_tls()
+                if c.state == _HANDSHAKE:
+                    wait = c.handshake()
+                    poller.modify(c.sock, wait or select.POLLOUT)
+                    continue
+                if c.state == _SENDING and event & select.POLLOUT:
+                    sent = c.sock.send(c.out)
+                    c.out = c.out[sent:]
+                    if not c.out:
+                        c.state = _READING
+                        poller.modify(c.sock, select.POLLIN)
+                elif c.state == _READING and event & (select.POLLIN | select.POLLHUP | select.POLLERR):
+                    data = c.sock.recv(65536)
+                    c.buf += data
+                    # decrypted data already read from the socket doesn't wake poll
+                    while data and c.context and c.sock.pending():
+                        c.buf += c.sock.recv(65536)
+                    parsed = _parse_response(c.buf) if c.buf else None
+                    if parsed and (parsed[2] is not None or not data):
+                        status, server_keepalive, consumed = parsed
+                        latencies.append(now - c.start)
+                        statuses[status] = statuses.get(status, 0) + 1
+                        done += 1
+                        c.requests += 1
+                        if (requests and issued >= requests):
+                            poller.unregister(c.sock)
+                            del conns[fd]
+                            c.close()
+                            continue
+                        issued += 1
+                        if keepalive and server_keepalive and data:
+                            start_request(c, now)
+                        else:
+                            reopen(c, now)
+                    elif not data:
+                        # connection closed before a complete response
+                        errors['io'] += 1
+                        reopen(c, now)
+            except socket.error as e:
+                if ssl and isinstance(e, ssl.SSLError):
+                    if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                        continue
+                elif e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    continue
+                errors['io'] += 1
+                reopen(c, now)
+        # expire stuck requests
+        now = time.time()
+        for c in list(conns.values()):
+            if c.start and now - c.start > timeout:
+                errors['timeout'] += 1
+                reopen(c, now)
+    elapsed = time.time() - started
+    for c in list(conns.values()):
+        c.close()
+    latencies.sort()
+    tls = None
+    if context:
+        handshakes = sum([c.handshakes for c in clients])
+        tls = {
+            'handshakes': handshakes,
+            # None when this Python can't resume sessions (before 3.6)
+            'resumed': sum([c.resumed for c in clients]) if hasattr(ssl.SSLSocket, 'session_reused') else None,
+        }
+    total_errors = sum(errors.values()) + sum([v for k, v in statuses.items() if k >= 500])
+    count = len(latencies)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': count,
+        'duration': elapsed,
+        'rps': count / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / count * 1000 if count else 0.0,
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': latencies[-1] * 1000 if count else 0.0,
+        },
+        'status': dict([(str(k), v) for k, v in statuses.items()]),
+        'errors': errors,
+        'error_rate': float(total_errors) / (count + sum(errors.values())) \
+            if count or sum(errors.values()) else 0.0,
+        'tls': tls,
+    }
+
+def run_benchmark(url, levels=DEFAULT_LEVELS, duration=DEFAULT_DURATION):
+    """
+    Runs the load generator at each concurrency level
+
+    Returns a list of results (see run_load)
+
+    """
+    log = logging.getLogger('benchmark')
+    results = []
+    for level in levels:
+        log.info('Benchmarking {0} with {1} concurrent clients for {2}s'.format(url, level, duration))
+        results.append(run_load(url, concurrency=level, duration=duration))
+    return results
+
+def wait_for_port(host, port, timeout=START_TIMEOUT, process=None):
+    """
+    Waits until a TCP port accepts connections
+
+    Returns True if the port is ready
+
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            return False
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.settimeout(1)
+            s.connect((host, port))
+            return True
+        except socket.error:
+            time.sleep(0.1)
+        finally:
+            s.close()
+    return False
+
+def get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def find_uwsgi(root_dir, project_name):
+    """
+    Returns the uwsgi binary for a project (virtualenv first, then the path)
+
+    """
+    ve_uwsgi = os.path.join(root_dir, 've', project_name, 'bin', 'uwsgi')
+    if os.path.exists(ve_uwsgi):
+        return ve_uwsgi
+    return 'uwsgi'
+
+def get_uwsgi_bench_config(root_dir, project_name, port, overrides=None):
+    """
+    Returns the project uWSGI config serving HTTP on a local port in the
+    foreground (for benchmarks)
+
+    :keyword overrides: Dict of options to set (a list value sets a repeated option)
+
+    """
+    uwsgi_config = os.path.join(root_dir, 'conf', '{0}_uwsgi.ini'.format(project_name))
+    if not os.path.exists(uwsgi_config):
+        raise BenchmarkError('Unable to find uWSGI config: {0}'.format(uwsgi_config))
+    with open(uwsgi_config, 'r') as f:
+        cfg = parse_uwsgi(f.read())
+    for k in ('daemonize', 'socket', 'pidfile', 'uid', 'stats', 'master-fifo'):
+        cfg.remove(k)
+    cfg.set('http-socket', '127.0.0.1:{0}'.format(port))
+    cfg.set('pidfile', os.path.join(root_dir, 'var', '{0}_bench_uwsgi.pid'.format(project_name)))
+    for k, v in (overrides or {}).items():
+        cfg.remove(k)
+        if v is None:
+            continue
+        for value in (v if isinstance(v, list) else [v]):
+            cfg.add(k, value)
+    # cheaper mode needs more processes than its minimum (trials may lower them)
+    if cfg.get('cheaper') and int(cfg.get('cheaper')) >= int(cfg.get('processes', 1)):
+        for k in set([x for x in cfg.keys() if x.startswith('cheaper')]):
+            cfg.remove(k)
+    return cfg
+
+def start_uwsgi(root_dir, project_name, port, overrides=None):
+    """
+    Starts the project uWSGI instance serving HTTP on a local port
+
+    Returns the uWSGI process
+
+    """
+    cfg = get_uwsgi_bench_config(root_dir, project_name, port, overrides)
+    bench_config = os.path.join(root_dir, 'var', '{0}_bench_uwsgi.ini'.format(project_name))
+    with open(bench_config, 'w') as f:
+        f.write(cfg.serialize())
+    log_file = open(os.path.join(root_dir, 'log', '{0}_bench_uwsgi.log'.format(project_name)), 'a')
+    try:
+        p = subprocess.Popen([find_uwsgi(root_dir, project_name), '--ini', bench_config], \
+            stdout=log_file, stderr=subprocess.STDOUT)
+    except OSError as e:
+        raise BenchmarkError('Unable to start uWSGI: {0}'.format(e))
+    finally:
+        log_file.close()
+    if not wait_for_port('127.0.0.1', port, process=p):
+        stop_uwsgi(p)
+        raise BenchmarkError('uWSGI did not start (see log/{0}_bench_uwsgi.log)'.format(project_name))
+    return p
+
+def stop_uwsgi(process):
+    """
+    Stops a uWSGI instance started by start_uwsgi
+
+    """
+    if process.poll() is None:
+        # SIGINT shuts uWSGI down immediately
+        process.send_signal(signal.SIGINT)
+        deadline = time.time() + 10
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def _get_nginx_listen(root_dir, project_name):
+    nginx_config = os.path.join(root_dir, 'conf', '{0}_nginx.conf'.format(project_name))
+    with open(nginx_config, 'r') as f:
+        server = find_server(parse_nginx(f.read()))
+    return server.find('listen').args
+
+def get_nginx_port(root_dir, project_name):
+    """
+    Returns the port the project Nginx server listens on
+
+    """
+    return int(_get_nginx_listen(root_dir, project_name)[0].rsplit(':', 1)[-1])
+
+def get_nginx_url(root_dir, project_name, path='/'):
+    """
+    Returns the local URL of the project Nginx server (https with TLS)
+
+    """
+    listen = _get_nginx_listen(root_dir, project_name)
+    return '{0}://127.0.0.1:{1}{2}'.format('https' if 'ssl' in listen[1:] else 'http', \
+        listen[0].rsplit(':', 1)[-1], path)
+
+def check_tls_reuse(url, concurrency=max(DEFAULT_LEVELS), duration=DEFAULT_DURATION):
+    """
+    Checks TLS session resumption (tickets and the shared session cache)
+    while concurrent keepalive clients load the server
+
+    Returns the results of ignition.tls.check_session_reuse for both modes
+
+    """
+    hostport = url.split('://', 1)[1].split('/', 1)[0]
+    host, port = hostport.rsplit(':', 1)
+    load = threading.Thread(target=run_load, args=(url,), kwargs={'concurrency': concurrency, \
+        'duration': duration})
+    load.daemon = True
+    load.start()
+    try:
+        return [tls.check_session_reuse(host, port, tickets=True), \
+            tls.check_session_reuse(host, port, tickets=False)]
+    finally:
+        load.join()
+
+def benchmark_project(root_dir, project_name, mode='uwsgi', levels=DEFAULT_LEVELS, \
+    duration=DEFAULT_DURATION, path='/', overrides=None):
+    """
+    Starts a generated stack locally and benchmarks it
+
+    :keyword mode: 'uwsgi' serves the app from uWSGI alone over HTTP; 'stack'
+        uses the project start/stop scripts and benchmarks through Nginx
+    :keyword overrides: uWSGI options to override (uwsgi mode)
+
+    Returns a dict with the run settings and the results per level
+
+    """
+    if mode not in MODES:
+        raise BenchmarkError('Unknown benchmark mode: {0}'.format(mode))
+    report = {
+        'project': project_name,
+        'mode': mode,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration': duration,
+        'overrides': overrides or {},
+    }
+    if mode == 'uwsgi':
+        port = get_free_port()
+        report['uwsgi'] = dict([(k, v) for k, v in \
+            get_uwsgi_bench_config(root_dir, project_name, port, overrides)._items if k])
+        p = start_uwsgi(root_dir, project_name, port, overrides)
+        try:
+            report['results'] = run_benchmark('http://127.0.0.1:{0}{1}'.format(port, path), \
+                levels, duration)
+        finally:
+            stop_uwsgi(p)
+    else:
+        script_dir = os.path.join(root_dir, 'scripts')
+        port = get_nginx_port(root_dir, project_name)
+        url = get_nginx_url(root_dir, project_name, path)
+        ret, out = run_command(['sh', os.path.join(script_dir, '{0}_start.sh'.format(project_name))])
+        if ret != 0 or not wait_for_port('127.0.0.1', port):
+            raise BenchmarkError('Unable to start the stack:\n{0}'.format(out))
+        try:
+            report['results'] = run_benchmark(url, levels, duration)
+            if url.startswith('https://'):
+                report['tls'] = check_tls_reuse(url, max(levels), duration)
+        finally:
+            run_command(['sh', os.path.join(script_dir, '{0}_stop.sh'.format(project_name))])
+    return report
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+
+def format_results(results):
+    """
+    Formats benchmark results as a table
+
+    """
+    lines = ['{0:>6} {1:>9} {2:>10} {3:>9} {4:>9} {5:>9} {6:>7}'.format(\
+        'conc', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors')]
+    for r in results:
+        lines.append('{0:>6} {1:>9} {2:>10.1f} {3:>9.2f} {4:>9.2f} {5:>9.2f} {6:>6.2f}%'.format(\
+            r['concurrency'], r['requests'], r['rps'], r['latency_ms']['p50'], \
+            r['latency_ms']['p95'], r['latency_ms']['p99'], r['error_rate'] * 100))
+    return '\n'.join(lines)
@@ -14,46 +14,204 @@
 #   limitations under the License.
 
 import logging
-import commands
 import os
+import glob
+import errno
+import threading
+from ignition import static
+from ignition.runner import run_command, which
+from ignition.config import parse_nginx, find_server
+
+# named locks shared by creators running concurrently
+_locks = {}
+_locks_lock = threading.Lock()
 
 def check_command(command):
-    cmd = commands.getoutput('which {0}'.format(command))
-    if cmd == '':
+    if not which(command):
         logging.error('{0} not found on path'.format(command))
         return False
     else:
         return True
 
-def add_static_dir(root_dir=None, project_name=None, static_dir_path=None, alias=None):
+def get_lock(name):
+    """
+    Returns a process wide lock for the given name (i.e. a wheelhouse path)
+
+    """
+    with _locks_lock:
+        if name not in _locks:
+            _locks[name] = threading.Lock()
+        return _locks[name]
+
+def get_process_tree(pid):
+    """
+    Returns a process id and the ids of all its descendants (from /proc)
+
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join('/proc', entry, 'stat'), 'r') as f:
+                # the command name may contain spaces; fields follow the last ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids = [pid]
+    for p in pids:
+        pids.extend(children.get(p, []))
+    return pids
+
+def get_process_rss(pid, children=True):
+    """
+    Returns the resident memory (bytes) of a process (and its descendants)
+
+    """
+    total = 0
+    for p in get_process_tree(pid) if children else [pid]:
+        try:
+            with open('/proc/{0}/status'.format(p), 'r') as f:
+                for l in f:
+                    if l.startswith('VmRSS:'):
+                        total += int(l.split()[1]) * 1024
+                        break
+        except (IOError, OSError):
+            continue
+    return total
+
+def get_process_uss(pid):
+    """
+    Returns the unique memory (bytes) of a process: pages not shared with
+    any other process (i.e. not shared copy-on-write with a parent)
+
+    """
+    rollup = '/proc/{0}/smaps_rollup'.format(pid)
+    path = rollup if os.path.exists(rollup) else '/proc/{0}/smaps'.format(pid)
+    total = 0
+    try:
+        with open(path, 'r') as f:
+            for l in f:
+                if l.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total += int(l.split()[1]) * 1024
+    except (IOError, OSError):
+        return 0
+    return total
+
+def get_percentile_rank(count, pct):
+    """
+    Returns the nearest rank (1 to count) of a whole number percentile
+
+    """
+    # integer arithmetic: float ranks round some percentiles up a rank
+    # (7 / 100.0 * 100 is 7.000000000000001)
+    return max(1, min(count, (int(pct) * count + 99) // 100))
+
+def get_uwsgi_configs(root_dir, project_name):
+    """
+    Returns the uWSGI ini configs of every instance of a project
+    (<project>_uwsgi.ini, <project>.<n>_uwsgi.ini)
+
+    """
+    conf_dir = os.path.join(root_dir, 'conf')
+    return [os.path.join(conf_dir, '{0}_uwsgi.ini'.format(project_name))] + \
+        sorted(glob.glob(os.path.join(conf_dir, '{0}.[0-9]*_uwsgi.ini'.format(project_name))))
+
+def make_dirs(path):
+    """
+    Creates a directory (and parents) if it doesn't already exist
+
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+def write_file(path, content, mode=None):
+    """
+    Writes content to a file unless the file already has the same content
+
+    :keyword path: Path to the file
+    :keyword content: File content
+    :keyword mode: File mode to set when written (i.e. 0754)
+
+    Returns True if the file was written
+
+    """
+    if os.path.exists(path):
+        f = open(path, 'r')
+        current = f.read()
+        f.close()
+        if current == content:
+            return False
+    f = open(path, 'w')
+    f.write(content)
+    f.close()
+    if mode is not None:
+        os.chmod(path, mode)
+    return True
+
+def add_static_dir(root_dir=None, project_name=None, static_dir_path=None, alias=None, \
+    precompress=True, brotli_static=False):
+    """
+    Adds a tuned static directory location to a project Nginx config
+
+    :keyword root_dir: Base directory where projects are stored
+    :keyword project_name: Name of project
+    :keyword static_dir_path: Path to the static directory
+    :keyword alias: URL path for the directory (i.e. /static)
+    :keyword precompress: Compress and fingerprint the files (see static.build_static)
+    :keyword brotli_static: Serve pre-compressed .br files (requires ngx_brotli)
+
+    """
     log = logging.getLogger('common')
     conf_file = os.path.join(root_dir, 'conf' + os.sep + '{0}_nginx.conf'.format(project_name))
     if not os.path.exists(conf_file):
         log.error('Unable to find config file: {0}.  Please check root directory and project name'.format(conf_file))
         return
     log.info('Creating static directory alias')
+    if precompress and os.path.isdir(static_dir_path):
+        counts = static.build_static(static_dir_path)
+        log.info('Processed {0} static files'.format(counts['processed']))
     f = open(conf_file, 'r')
-    cfg = f.readlines()
+    cfg = parse_nginx(f.read())
     f.close()
-    new_cfg = ''
-    location_found = False
-    alias_added = False
-    for l in cfg:
-        if l.find('location') > -1:
-            location_found = True
-            new_cfg += l
-        elif location_found and l.find('}') > -1 and not alias_added:
-            # end of location found ; add alias
-            new_cfg += l
-            alias = '\t\tlocation {0} {{\n'.format(alias)
-            alias += '\t\t\talias {0};\n'.format(static_dir_path)
-            alias += '\t\t}\n'
-            new_cfg += alias
-            location_found = False
-            alias_added = True
-        else:
-            new_cfg += l
+    server = find_server(cfg)
+    if not server:
+        log.error('Unable to find a server section in {0}'.format(conf_file))
+        return
+    location = static.get_static_location(static_dir_path, alias, brotli_static)
+    existing = server.find('location', location.args)
+    if existing:
+        server.replace(existing, location)
+    else:
+        # add after the application location
+        locations = server.find_all('location')
+        server.add(location, after=locations[0] if locations else None)
     f = open(conf_file, 'w')
-    f.write(new_cfg)
+    f.write(cfg.serialize())
     f.close()
 
+def rebuild_static(root_dir=None, project_name=None):
+    """
+    Reprocesses changed files in every static directory of a project
+
+    """
+    log = logging.getLogger('common')
+    conf_file = os.path.join(root_dir, 'conf' + os.sep + '{0}_nginx.conf'.format(project_name))
+    if not os.path.exists(conf_file):
+        log.error('Unable to find config file: {0}.  Please check root directory and project name'.format(conf_file))
+        return False
+    f = open(conf_file, 'r')
+    static_dirs = static.find_static_dirs(f.read())
+    f.close()
+    for static_dir in static_dirs:
+        if not os.path.isdir(static_dir):
+            log.warn('Static directory {0} not found'.format(static_dir))
+            continue
+        counts = static.build_static(static_dir)
+        log.info('{0}: {1} processed, {2} unchanged, {3} removed'.format(static_dir, \
+            counts['processed'], counts['unchanged'], counts['removed']))
+    return True
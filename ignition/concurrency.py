@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+MODELS = [
+    'prefork',
+    'threaded',
+    'gevent',
+    'asyncio',
+]
+
+# modules installed into the virtualenv for each model; loop engines need
+# a uWSGI built against the virtualenv (with its gevent/greenlet plugins)
+MODEL_MODULES = {
+    'prefork': [],
+    'threaded': [],
+    'gevent': ['uwsgi', 'gevent'],
+    'asyncio': ['uwsgi', 'greenlet'],
+}
+# minimum threads per process for the threaded model
+MIN_THREADS = 4
+# concurrent requests (greenlets) per process for the async models
+ASYNC_CORES = 100
+
+# notes written at the top of generated app stubs
+APP_NOTES = {
+    'prefork': [
+        'Each uWSGI process handles one request at a time.',
+    ],
+    'threaded': [
+        'Requests run concurrently in threads: keep request data on flask.g',
+        '(not in globals) and guard shared state with a threading.Lock.',
+    ],
+    'gevent': [
+        'Requests run in greenlets.  uWSGI monkey patches the standard library',
+        'before loading the app so sockets and sleeps yield to other requests;',
+        'avoid C extensions that block (use gevent aware database drivers).',
+    ],
+    'asyncio': [
+        'Requests run in greenlets on the uWSGI asyncio loop.  Any blocking',
+        'call (sockets, sleeps, database drivers) stalls every request in the',
+        'process; keep handlers non-blocking and wait on coroutines with',
+        'run_async (only under uWSGI).',
+    ],
+}
+# notes written at the top of the wsgi module of Django projects
+DJANGO_APP_NOTES = {
+    'prefork': [
+        'Each uWSGI process handles one request at a time.',
+    ],
+    'threaded': [
+        'Requests run concurrently in threads: keep request data on the request',
+        '(not in module globals); each thread has its own database connection.',
+    ],
+    'gevent': [
+        'Requests run in greenlets.  uWSGI monkey patches the standard library',
+        'before loading the app so sockets and sleeps yield to other requests;',
+        'use a gevent aware database driver (i.e. psycogreen for psycopg2).',
+        'Each greenlet opens its own database connection: keep CONN_MAX_AGE at 0.',
+    ],
+    'asyncio': [
+        'Requests run in greenlets on the uWSGI asyncio loop.  The Django ORM',
+        'and most database drivers block, stalling every request in the',
+        'process; keep handlers non-blocking.',
+    ],
+}
+# helper written into app stubs of the asyncio model: a request waits on a
+# coroutine by switching its greenlet back to the loop (the uWSGI asyncio
+# plugin runs the loop in the parent greenlet)
+ASYNCIO_HELPER = '''import asyncio
+import greenlet
+
+def run_async(coro):
+    """
+    Runs a coroutine on the uWSGI asyncio loop and returns its result; only
+    the calling request waits for it
+
+    """
+    current = greenlet.getcurrent()
+    task = asyncio.get_event_loop().create_task(coro)
+    task.add_done_callback(lambda t: current.switch())
+    current.parent.switch()
+    return task.result()
+'''
+# oldest Python each model runs on (the uWSGI asyncio plugin needs Python 3)
+MIN_PYTHON = {
+    'asyncio': (3, 4),
+}
+# models whose database connections are per greenlet (not reused)
+GREENLET_MODELS = ['gevent', 'asyncio']
+
+def get_modules(model):
+    """
+    Returns the modules a concurrency model needs in the virtualenv
+
+    """
+    return list(MODEL_MODULES.get(model) or [])
+
+def uses_virtualenv_uwsgi(model):
+    """
+    Returns True if the model runs the uWSGI installed in the virtualenv
+
+    """
+    return 'uwsgi' in get_modules(model)
+
+def add_uwsgi_options(cfg, model, sizing):
+    """
+    Adds the uWSGI options for a concurrency model
+
+    Every model gets offload threads so static files and large responses
+    (sendfile / wsgi.file_wrapper) are sent without holding a worker.
+
+    :keyword cfg: uWSGI config (see ignition.config.UwsgiConfig)
+    :keyword model: Concurrency model (see MODELS)
+    :keyword sizing: Worker sizing (see ignition.sizing.calculate_sizing)
+
+    """
+    if model not in MODELS:
+        raise ValueError('Unknown concurrency model: {0}'.format(model))
+    if model == 'threaded':
+        cfg.add('threads', max(MIN_THREADS, sizing['threads']))
+        cfg.add('enable-threads', True)
+        # serialize accept() between processes
+        cfg.add('thunder-lock', True)
+    elif model == 'gevent':
+        cfg.add('gevent', ASYNC_CORES)
+        cfg.add('gevent-early-monkey-patch', True)
+    elif model == 'asyncio':
+        cfg.add('asyncio', ASYNC_CORES)
+        cfg.add('greenlet', True)
+    cfg.add('offload-threads', max(1, sizing['cpus'] // 2))
+    return cfg
+
+def get_app_notes(model, framework='flask'):
+    """
+    Returns comment lines describing what is safe in an app for the model
+
+    :keyword framework: 'flask' or 'django'
+
+    """
+    notes = DJANGO_APP_NOTES if framework == 'django' else APP_NOTES
+    return ['# ' + x for x in notes.get(model) or []]
+
+def get_app_helper(model):
+    """
+    Returns source code the app stub needs for the model ('' if none)
+
+    """
+    return ASYNCIO_HELPER if model == 'asyncio' else ''
+
+def get_min_python(model):
+    """
+    Returns the oldest Python version (tuple) the model runs on (None if
+    any)
+
+    """
+    return MIN_PYTHON.get(model)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# special directive names for comments and blank lines
+COMMENT = '#'
+BLANK = ''
+
+class ConfigError(Exception):
+    pass
+
+class Directive(object):
+    def __init__(self, name, args=None, children=None):
+        """
+        Nginx config directive
+
+        :keyword name: Directive name (i.e. 'location')
+        :keyword args: List of arguments (i.e. ['/'])
+        :keyword children: List of child directives for blocks (None for
+            simple directives)
+
+        """
+        self.name = name
+        self.args = [str(x) for x in args or []]
+        self.children = children
+
+    def __repr__(self):
+        return '<Directive {0} {1}>'.format(self.name, ' '.join(self.args))
+
+    def is_block(self):
+        return self.children is not None
+
+    def _matches(self, name, args):
+        if self.name != name:
+            return False
+        return args is None or self.args == [str(x) for x in args]
+
+    def find(self, name, args=None):
+        """
+        Returns the first child directive with the name (and args)
+
+        """
+        for c in self.children or []:
+            if c._matches(name, args):
+                return c
+        return None
+
+    def find_all(self, name, args=None, recursive=False):
+        """
+        Returns all child directives with the name (and args)
+
+        :keyword recursive: Search nested blocks too
+
+        """
+        found = []
+        for c in self.children or []:
+            if c._matches(name, args):
+                found.append(c)
+            if recursive and c.is_block():
+                found.extend(c.find_all(name, args, recursive))
+        return found
+
+    def add(self, directive, after=None, before=None):
+        """
+        Adds a child directive (at the end or next to another child)
+
+        Returns the added directive
+
+        """
+        if self.children is None:
+            raise ConfigError('{0} is not a block'.format(self.name))
+        if after is not None:
+            self.children.insert(self.children.index(after) + 1, directive)
+        elif before is not None:
+            self.children.insert(self.children.index(before), directive)
+        else:
+            self.children.append(directive)
+        return directive
+
+    def remove(self, directive):
+        self.children.remove(directive)
+
+    def replace(self, old, new):
+        self.children[self.children.index(old)] = new
+        return new
+
+    def set(self, name, args):
+        """
+        Sets the arguments of a simple directive (adding it if missing)
+
+        Returns the directive
+
+        """
+        d = self.find(name)
+        if d:
+            d.args = [str(x) for x in args]
+            return d
+        return self.add(Directive(name, args))
+
+    def _serialize(self, lines, depth):
+        indent = '\t' * depth
+        if self.name == BLANK:
+            lines.append('')
+        elif self.name == COMMENT:
+            lines.append(indent + '#' + self.args[0])
+        elif self.children is None:
+            lines.append(indent + ' '.join([self.name] + self.args) + ';')
+        else:
+            lines.append(indent + ' '.join([self.name] + self.args + ['{']))
+            for c in self.children:
+                c._serialize(lines, depth + 1)
+            lines.append(indent + '}')
+
+    def serialize(self):
+        """
+        Returns the config text for the directive
+
+        """
+        lines = []
+        if self.name is None:
+            for c in self.children:
+                c._serialize(lines, 0)
+        else:
+            self._serialize(lines, 0)
+        return '\n'.join(lines) + '\n'
+
+def new_nginx_config(children=None):
+    """
+    Returns an empty (root) Nginx config
+
+    """
+    return Directive(None, children=children or [])
+
+def comment(text):
+    return Directive(COMMENT, [' ' + text])
+
+def blank():
+    return Directive(BLANK)
+
+def _tokenize(text):
+    """
+    Splits Nginx config text into (kind, value, line) tokens
+
+    """
+    i = 0
+    line = 1
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '\n':
+            line += 1
+            i += 1
+        elif c.isspace():
+            i += 1
+        elif c == '#':
+            end = text.find('\n', i)
+            if end == -1:
+                end = n
+            yield ('comment', text[i + 1:end], line)
+            i = end
+        elif c in '{};':
+            yield (c, c, line)
+            i += 1
+        else:
+            start = i
+            start_line = line
+            quote = None
+            while i < n:
+                c = text[i]
+                if quote:
+                    if c == '\\':
+                        i += 1
+                    elif c == quote:
+                        quote = None
+                    elif c == '\n':
+                        line += 1
+                elif c in '"\'':
+                    quote = c
+                elif c == '{' and text[i - 1] == '$':
+                    # ${var} variable syntax
+                    end = text.find('}', i)
+                    if end == -1:
+                        raise ConfigError('Unterminated variable on line {0}'.format(line))
+                    i = end
+                elif c.isspace() or c in '{};':
+                    break
+                i += 1
+            if quote:
+                raise ConfigError('Unterminated string on line {0}'.format(start_line))
+            yield ('word', text[start:i], start_line)
+
+def parse_nginx(text):
+    """
+    Parses Nginx config text into a directive tree
+
+    Comments and blank lines between directives are kept so that the
+    serialized config stays close to the original.
+
+    """
+    root = new_nginx_config()
+    stack = [root]
+    words = []
+    last_line = None
+    for kind, value, line in _tokenize(text):
+        parent = stack[-1]
+        if not words and kind in ('word', 'comment') and last_line is not None \
+            and line > last_line + 1 and parent.children:
+            parent.add(blank())
+        if kind == 'comment':
+            if words:
+                raise ConfigError('Comment inside directive on line {0}'.format(line))
+            parent.add(Directive(COMMENT, [value]))
+            last_line = line
+        elif kind == 'word':
+            words.append(value)
+        elif kind == ';':
+            if not words:
+                raise ConfigError('Unexpected ";" on line {0}'.format(line))
+            parent.add(Directive(words[0], words[1:]))
+            words = []
+            last_line = line
+        elif kind == '{':
+            if not words:
+                raise ConfigError('Unexpected "{{" on line {0}'.format(line))
+            stack.append(parent.add(Directive(words[0], words[1:], [])))
+            words = []
+            last_line = line
+        elif kind == '}':
+            if words or len(stack) == 1:
+                raise ConfigError('Unexpected "}}" on line {0}'.format(line))
+            stack.pop()
+            last_line = line
+    if words or len(stack) > 1:
+        raise ConfigError('Unexpected end of config')
+    return root
+
+def find_server(cfg):
+    """
+    Returns the first server block in an Nginx config (standalone or shared)
+
+    """
+    servers = [x for x in cfg.find_all('server', recursive=True) if x.is_block()]
+    if servers:
+        return servers[0]
+    return None
+
+class UwsgiConfig(object):
+    def __init__(self, section='uwsgi'):
+        """
+        uWSGI ini config
+
+        Options are kept in order and may repeat (i.e. several sockets).
+
+        """
+        self.section = section
+        self._items = []
+
+    def _format(self, value):
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
+        return str(value)
+
+    def get(self, key, default=None):
+        """
+        Returns the first value of an option
+
+        """
+        for k, v in self._items:
+            if k == key:
+                return v
+        return default
+
+    def get_all(self, key):
+        return [v for k, v in self._items if k == key]
+
+    def keys(self):
+        return [k for k, v in self._items if k is not None]
+
+    def add(self, key, value):
+        """
+        Adds an option (keeping existing values of the same option)
+
+        """
+        self._items.append((key, self._format(value)))
+
+    def set(self, key, value):
+        """
+        Sets an option, replacing all existing values
+
+        """
+        value = self._format(value)
+        for i, (k, v) in enumerate(self._items):
+            if k == key:
+                self._items[i] = (key, value)
+                self._items = self._items[:i + 1] + \
+                    [x for x in self._items[i + 1:] if x[0] != key]
+                return
+        self._items.append((key, value))
+
+    def remove(self, key):
+        self._items = [x for x in self._items if x[0] != key]
+
+    def serialize(self):
+        lines = ['[{0}]'.format(self.section)]
+        for k, v in self._items:
+            if k is None:
+                lines.append(v)
+            else:
+                lines.append('{0} = {1}'.format(k, v))
+        return '\n'.join(lines) + '\n'
+
+def parse_uwsgi(text, section='uwsgi'):
+    """
+    Parses the uwsgi section of a uWSGI ini config
+
+    """
+    cfg = UwsgiConfig(section)
+    current = None
+    for l in text.splitlines():
+        stripped = l.strip()
+        if stripped.startswith('[') and stripped.endswith(']'):
+            current = stripped[1:-1].strip()
+            continue
+        if current != section:
+            continue
+        if not stripped or stripped[0] in '#;':
+            cfg._items.append((None, stripped))
+        elif '=' in stripped:
+            k, v = stripped.split('=', 1)
+            cfg._items.append((k.strip(), v.strip()))
+        else:
+            # bare flag
+            cfg._items.append((stripped, 'true'))
+    return cfg
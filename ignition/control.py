@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# uWSGI control helper used by the generated manage scripts.  It is copied
+# into <root_dir>/scripts so it only uses the standard library.
+#
+#   ignitionctl.py wait <socket> [timeout]
+#   ignitionctl.py reload <fifo> <stats socket> <c|r> [timeout]
+#   ignitionctl.py stop <fifo> <pidfile> [timeout]
+
+import os
+import sys
+import json
+import time
+import errno
+import socket
+
+DEFAULT_TIMEOUT = 60
+# master fifo commands
+CHAIN_RELOAD = 'c'
+GRACEFUL_RELOAD = 'r'
+GRACEFUL_STOP = 'q'
+
+def _connect(address, timeout=1):
+    if address.startswith('unix:'):
+        address = address[len('unix:'):]
+    if address.startswith('/') or address.startswith('@'):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        target = address.replace('@', '\0', 1) if address.startswith('@') else address
+    else:
+        host, port = address.rsplit(':', 1)
+        if host in ('', '0.0.0.0'):
+            host = '127.0.0.1'
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target = (host, int(port))
+    s.settimeout(timeout)
+    try:
+        s.connect(target)
+    except socket.error:
+        s.close()
+        raise
+    return s
+
+def wait_socket(address, timeout=DEFAULT_TIMEOUT):
+    """
+    Waits until a socket (unix path or host:port) accepts connections
+
+    Returns True if the socket is ready
+
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            _connect(address).close()
+            return True
+        except socket.error:
+            time.sleep(0.1)
+    return False
+
+def get_workers(stats):
+    """
+    Returns the pids of the running workers from the uWSGI stats socket
+
+    """
+    s = _connect(stats, timeout=5)
+    data = []
+    try:
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+    finally:
+        s.close()
+    workers = json.loads(b''.join(data).decode('utf-8')).get('workers', [])
+    # cheaper mode keeps some workers stopped (pid 0)
+    return set([w['pid'] for w in workers if w.get('pid')])
+
+def send_command(fifo, command):
+    """
+    Writes a command to the uWSGI master fifo
+
+    Returns False if no master is reading the fifo
+
+    """
+    try:
+        fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as e:
+        if e.errno in (errno.ENXIO, errno.ENOENT):
+            return False
+        raise
+    try:
+        os.write(fd, command.encode('ascii'))
+    finally:
+        os.close(fd)
+    return True
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def reload(fifo, stats, command=CHAIN_RELOAD, timeout=DEFAULT_TIMEOUT):
+    """
+    Gracefully reloads uWSGI and waits until every worker was replaced
+
+    With a chain reload workers are replaced one at a time (the next only
+    after the previous one is accepting requests); a graceful reload
+    replaces them all while the master keeps the sockets open.
+
+    Returns True when all the old workers were replaced
+
+    """
+    try:
+        old = get_workers(stats)
+    except (socket.error, ValueError):
+        old = set()
+    if not send_command(fifo, command):
+        return False
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.2)
+        try:
+            current = get_workers(stats)
+        except (socket.error, ValueError):
+            # the master is re-executing (graceful reload)
+            continue
+        if current and not current & old:
+            return True
+    return False
+
+def stop(fifo, pidfile, timeout=DEFAULT_TIMEOUT):
+    """
+    Gracefully stops uWSGI (in-flight requests are finished) and waits for
+    the master to exit
+
+    Returns True if uWSGI is no longer running
+
+    """
+    try:
+        with open(pidfile, 'r') as f:
+            pid = int(f.read().strip())
+    except (IOError, ValueError):
+        return True
+    if not is_running(pid):
+        return True
+    if not send_command(fifo, GRACEFUL_STOP):
+        return False
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not is_running(pid):
+            return True
+        time.sleep(0.2)
+    return False
+
+def main(args):
+    if len(args) < 2 or args[0] not in ('wait', 'reload', 'stop'):
+        sys.stderr.write('usage: {0} wait <socket> [timeout] | reload <fifo> <stats> <c|r> [timeout] | '\
+            'stop <fifo> <pidfile> [timeout]\n'.format(os.path.basename(sys.argv[0])))
+        return 2
+    if args[0] == 'wait':
+        ok = wait_socket(args[1], *[float(x) for x in args[2:3]])
+    elif args[0] == 'reload':
+        ok = reload(args[1], args[2], args[3], *[float(x) for x in args[4:5]])
+    else:
+        ok = stop(args[1], args[2], *[float(x) for x in args[3:4]])
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
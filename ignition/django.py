@@ -15,19 +15,96 @@
 
 import os
 import logging
-import subprocess
-import commands
 import shutil
-from ignition.common import check_command
+from ignition.common import check_command, run_command, make_dirs
 from ignition import ProjectCreator
+from ignition import benchmark
+from ignition import static
+from ignition import concurrency
+from ignition.config import parse_uwsgi
+
+# settings written next to the project settings by the production profile
+PRODUCTION_SETTINGS = 'production'
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+# seconds database connections are kept open between requests
+CONN_MAX_AGE = 600
+STATIC_URL = '/static/'
+# page rendered by both the stock and production settings (no database)
+SMOKE_PATH = '/admin/login/'
+
+PRODUCTION_TEMPLATE = '''# production settings for {project} (generated by ignition; do not edit)
+#
+# Overrides the project settings; local changes belong in {base}.py
+from {base_import} import *
+
+DEBUG = False
+ALLOWED_HOSTS = {allowed_hosts!r}
+
+# keep database connections open between requests
+for _db in DATABASES.values():
+    _db.setdefault('CONN_MAX_AGE', {conn_max_age})
+
+# compile templates once per process
+_LOADERS = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+for _t in globals().get('TEMPLATES', []):
+    if _t.get('BACKEND') == 'django.template.backends.django.DjangoTemplates':
+        _t['APP_DIRS'] = False
+        _t.setdefault('OPTIONS', {{}})['loaders'] = _LOADERS
+if 'TEMPLATES' not in globals():
+    # projects from Django < 1.8 (newer versions ignore or reject these)
+    TEMPLATE_DEBUG = False
+    TEMPLATE_LOADERS = _LOADERS
+
+CACHES = {{
+    'default': {{
+        'BACKEND': {cache_backend!r},
+        'LOCATION': {cache_location!r},
+    }},
+}}
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# served by nginx (see the {static_url} location)
+STATIC_URL = {static_url!r}
+STATIC_ROOT = {static_root!r}
+'''
 
 class DjangoCreator(ProjectCreator):
     '''
     Handles creating Django projects
     '''
-    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=[], **kwargs):
+    PRELOAD_MODULES = ['django', 'django.core.handlers.wsgi']
+
+    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=None, **kwargs):
+        """
+        Handles creating Django projects
+
+        :keyword production: Write production settings (see PRODUCTION_TEMPLATE)
+            and serve static files from nginx
+        :keyword django_cache: Cache backend for production ('locmem' or
+            'file' to share the cache between processes)
+
+        """
         ProjectCreator.__init__(self, project_name, root_dir, modules, **kwargs)
         self.log = logging.getLogger('DjangoCreator')
+        if 'production' in kwargs and kwargs['production']:
+            self._production = True
+        else: # stock settings (DEBUG on)
+            self._production = False
+        if 'django_cache' in kwargs and kwargs['django_cache']:
+            self._django_cache = kwargs['django_cache']
+        else: # per-process cache
+            self._django_cache = 'locmem'
+        if self._django_cache not in CACHE_BACKENDS:
+            raise ValueError('Unknown Django cache backend: {0}'.format(self._django_cache))
+        self._static_root = os.path.join(self._root_dir, 'static', self._project_name)
         # add Django
         django_found = False
         for m in self._modules:
@@ -50,45 +127,170 @@ class DjangoCreator(ProjectCreator):
                     logging.warn('Found existing project; not creating (use --force to overwrite)')
                     return
             logging.info('Creating project')
-            p = subprocess.Popen('cd {0} ; {1} startproject {2} > /dev/null'.format(self._app_dir, self._ve_dir + os.sep + self._project_name + \
-            os.sep + 'bin' + os.sep + 'django-admin.py', self._project_name), \
-            shell=True)
-            os.waitpid(p.pid, 0)
+            bin_dir = os.path.join(self._ve_dir, self._project_name, 'bin')
+            # django-admin.py was removed in Django 4
+            admin = os.path.join(bin_dir, 'django-admin')
+            if not os.path.exists(admin):
+                admin = os.path.join(bin_dir, 'django-admin.py')
+            ret, out = run_command([admin, 'startproject', self._project_name], cwd=self._app_dir)
+            if ret != 0:
+                logging.error('Unable to create project:\n{0}'.format(out))
+                return
+            if self._concurrency:
+                self.add_concurrency_notes()
+            if self._production:
+                self.create_production_settings()
+                self.collect_static()
         else:
             logging.error('Unable to find Python interpreter in virtualenv')
             return
-    
+
+    def get_project_dir(self):
+        return os.path.join(self._app_dir, self._project_name)
+
+    def get_settings_module(self, production=None):
+        """
+        Returns the settings module: <project>.settings for projects created
+        by Django 1.4+ and settings for older layouts
+
+        :keyword production: Return the production settings (default: with
+            the production profile)
+
+        """
+        if production is None:
+            production = self._production
+        name = PRODUCTION_SETTINGS if production else 'settings'
+        if os.path.exists(os.path.join(self.get_project_dir(), 'settings.py')):
+            return name
+        return '{0}.{1}'.format(self._project_name, name)
+
+    def get_wsgi_module(self):
+        """
+        Returns the uWSGI module: the project wsgi.py (Django 1.4+) or the
+        Django handler for older layouts
+
+        """
+        if os.path.exists(os.path.join(self.get_project_dir(), 'settings.py')):
+            return 'django.core.handlers.wsgi:WSGIHandler()'
+        return '{0}.wsgi:application'.format(self._project_name)
+
+    def add_concurrency_notes(self):
+        """
+        Adds notes on the concurrency model to the top of the module uWSGI
+        loads (wsgi.py, or settings.py for old layouts)
+
+        """
+        path = os.path.join(self.get_project_dir(), self._project_name, 'wsgi.py')
+        if not os.path.exists(path):
+            path = os.path.join(self.get_project_dir(), 'settings.py')
+        notes = ''.join([x + '\n' for x in concurrency.get_app_notes(self._concurrency, 'django')])
+        if not notes or not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            content = f.read()
+        if content.startswith(notes):
+            return False
+        with open(path, 'w') as f:
+            f.write(notes + '\n' + content)
+        return True
+
+    def get_production_settings(self):
+        """
+        Returns the source of the production settings overlay
+
+        """
+        base = self.get_settings_module(production=False)
+        # greenlets don't reuse connections; persistent ones would pile up
+        conn_max_age = 0 if self._concurrency in concurrency.GREENLET_MODELS else CONN_MAX_AGE
+        allowed_hosts = ['*']
+        if self._server_name:
+            allowed_hosts = [self._server_name, 'localhost', '127.0.0.1']
+        if self._django_cache == 'file':
+            cache_location = os.path.join(self._var_dir, 'cache', '{0}_django'.format(self._project_name))
+        else:
+            cache_location = self._project_name
+        return PRODUCTION_TEMPLATE.format(project=self._project_name, base=base.rsplit('.', 1)[-1], \
+            base_import=base, allowed_hosts=allowed_hosts, conn_max_age=conn_max_age, \
+            cache_backend=CACHE_BACKENDS[self._django_cache], cache_location=cache_location, \
+            static_url=STATIC_URL, static_root=self._static_root)
+
+    def create_production_settings(self):
+        module = self.get_settings_module(production=True)
+        path = os.path.join(self.get_project_dir(), *module.split('.')) + '.py'
+        return self.write_artifact('django_settings', path, self.get_production_settings())
+
+    def collect_static(self):
+        """
+        Collects the static files into the directory served by nginx and
+        pre-compresses them for gzip_static
+
+        """
+        make_dirs(self._static_root)
+        ret, out = run_command([self._py, 'manage.py', 'collectstatic', '--noinput', \
+            '--settings', self.get_settings_module()], cwd=self.get_project_dir())
+        if ret != 0:
+            self.log.warn('Unable to collect static files:\n{0}'.format(out))
+            return False
+        # Django storages fingerprint files themselves
+        static.build_static(self._static_root, fingerprint=False)
+        return True
+
+    def get_preload_modules(self):
+        modules = ProjectCreator.get_preload_modules(self)
+        modules.append(self.get_settings_module())
+        return modules
+
+    def get_nginx_server(self):
+        server = ProjectCreator.get_nginx_server(self)
+        if self._production:
+            server.add(static.get_static_location(self._static_root, STATIC_URL), \
+                after=server.find('location', ['/']))
+        return server
+
     def create_uwsgi_script(self):
-        scr = 'uwsgi '
-        # set user
-        if self._user:
-            scr += '--uid {0} '.format(self._user)
-        # set VE dir
-        scr += '-H {0} '.format(self._ve_dir + os.sep + \
-            self._project_name)
-        # set process limit
-        scr += '-p 1 '
-        # set socket
-        scr += '-s {0}.sock '.format(os.path.join(self._var_dir, self._project_name))
+        cfg = self.get_uwsgi_config()
         # chdir for app
-        scr += '--chdir {0} '.format(os.path.join(self._app_dir, self._project_name))
-        scr += '--pp {0} '.format(os.path.join(self._app_dir))
+        cfg.add('chdir', os.path.join(self._app_dir, self._project_name))
+        cfg.add('pythonpath', self._app_dir)
+        cfg.add('pythonpath', self.get_project_dir())
         # app settings
-        scr += '--env DJANGO_SETTINGS_MODULE=settings -w \
-\"django.core.handlers.wsgi:WSGIHandler()\" '
-        # uwsgi settings
-        scr += '--pidfile {0}/{1}_uwsgi.pid -d {2}/{1}_uwsgi.log '\
-            .format(self._var_dir, self._project_name, self._log_dir)
-        # misc
-        scr += '--no-orphans --vacuum -M --chmod-socket 664 \
---harakiri 300 --max-requests 5000 --limit-as 160 \
---post-buffering 16777216 '
-        
-        # write config
-        uwsgi_file = os.path.join(self._conf_dir, '{0}.uwsgi'.format(self._project_name))
-        f = open(uwsgi_file, 'w')
-        f.write(scr)
-        f.close()
-        # make executable
-        os.chmod(uwsgi_file, 0754)
+        cfg.add('env', 'DJANGO_SETTINGS_MODULE={0}'.format(self.get_settings_module()))
+        cfg.add('module', self.get_wsgi_module())
+        self.write_uwsgi_config(cfg)
+
+def smoke_benchmark(root_dir, project_name, levels=[10], duration=benchmark.DEFAULT_DURATION, \
+    path=SMOKE_PATH):
+    """
+    Benchmarks a Django project with the stock settings and with the
+    production settings (uWSGI only, same worker settings)
+
+    Returns a dict with the results of both runs (see
+    ignition.benchmark.benchmark_project)
+
+    """
+    prj = DjangoCreator(project_name=project_name, root_dir=root_dir)
+    # other variables (i.e. the profiler settings) are kept
+    with open(prj.get_uwsgi_config_file(), 'r') as f:
+        env = [x for x in parse_uwsgi(f.read()).get_all('env') if not x.startswith('DJANGO_SETTINGS_MODULE=')]
+    results = {}
+    for name, production in (('stock', False), ('production', True)):
+        settings = 'DJANGO_SETTINGS_MODULE={0}'.format(prj.get_settings_module(production))
+        results[name] = benchmark.benchmark_project(root_dir, project_name, mode='uwsgi', levels=levels, \
+            duration=duration, path=path, overrides={'env': env + [settings]})
+    return results
+
+def format_smoke_benchmark(results):
+    """
+    Formats a smoke benchmark (see smoke_benchmark)
 
+    """
+    lines = []
+    for name in ('stock', 'production'):
+        lines.append('{0} settings:'.format(name))
+        lines.append(benchmark.format_results(results[name]['results']))
+        lines.append('')
+    for stock, production in zip(results['stock']['results'], results['production']['results']):
+        change = (production['rps'] / stock['rps'] - 1) * 100 if stock['rps'] else 0.0
+        lines.append('{0} clients: {1:.1f} -> {2:.1f} req/s ({3:+.1f}%)'.format(stock['concurrency'], \
+            stock['rps'], production['rps'], change))
+    return '\n'.join(lines)
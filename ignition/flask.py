@@ -15,14 +15,15 @@
 
 import os
 import logging
-import subprocess
-import commands
 import shutil
 from ignition.common import check_command
 from ignition import ProjectCreator
+from ignition import concurrency
 
 class FlaskCreator(ProjectCreator):
-    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=[], **kwargs):
+    PRELOAD_MODULES = ['flask', 'jinja2', 'werkzeug', 'app']
+
+    def __init__(self, project_name=None, root_dir=os.getcwd(), modules=None, **kwargs):
         """
         Handles creating Flask projects
 
@@ -41,6 +42,30 @@ class FlaskCreator(ProjectCreator):
         if not flask_found:
             self._modules.append('flask')
 
+    def get_app_source(self):
+        """
+        Returns the source of the flask project stub
+
+        """
+        helper = concurrency.get_app_helper(self._concurrency)
+        app = """#!/usr/bin/env python\n"""\
+        + ''.join([x + '\n' for x in concurrency.get_app_notes(self._concurrency)])\
+        + (helper + '\n' if helper else '')\
+        + """from flask import Flask\n"""\
+        """app = Flask(__name__)\n\n"""\
+        """@app.route(\"/\")\n"""\
+        """def hello():\n"""\
+        """    return \"Hello from Flask...\"\n\n"""
+        if self._concurrency == 'asyncio':
+            app += """@app.route(\"/wait\")\n"""\
+            """def wait():\n"""\
+            """    # other requests keep running while this one waits\n"""\
+            """    run_async(asyncio.sleep(0.1))\n"""\
+            """    return \"Hello from asyncio...\"\n\n"""
+        app += """if __name__==\"__main__\":\n"""\
+        """    app.run()\n\n"""
+        return app
+
     def create_project(self):
         """
         Creates a base Flask project
@@ -57,50 +82,17 @@ class FlaskCreator(ProjectCreator):
                     return
             logging.info('Creating project')
             os.makedirs(prj_dir)
-            # create the flask project stub
-            app = """#!/usr/bin/env python\n"""\
-            """from flask import Flask\n"""\
-            """app = Flask(__name__)\n\n"""\
-            """@app.route(\"/\")\n"""\
-            """def hello():\n"""\
-            """    return \"Hello from Flask...\"\n\n"""\
-            """if __name__==\"__main__\":\n"""\
-            """    app.run()\n\n"""
             with open(os.path.join(prj_dir, 'app.py'), 'w') as f:
-                f.write(app)
+                f.write(self.get_app_source())
         else:
             logging.error('Unable to find Python interpreter in virtualenv')
             return
     
     def create_uwsgi_script(self):
-        scr = 'uwsgi '
-        # set user
-        if self._user:
-            scr += '--uid {0} '.format(self._user)
-        # set VE dir
-        scr += '-H {0} '.format(self._ve_dir + os.sep + \
-            self._project_name)
-        # set process limit
-        scr += '-p 1 '
-        # set socket
-        scr += '-s {0}.sock '.format(os.path.join(self._var_dir, self._project_name))
+        cfg = self.get_uwsgi_config()
         # chdir for app
-        scr += '--chdir {0} '.format(os.path.join(self._app_dir, self._project_name))
-        scr += '--pp {0} '.format(os.path.join(self._app_dir))
+        cfg.add('chdir', os.path.join(self._app_dir, self._project_name))
+        cfg.add('pythonpath', self._app_dir)
         # app settings
-        scr += '-w app:app '
-        # uwsgi settings
-        scr += '--pidfile {0}/{1}_uwsgi.pid -d {2}/{1}_uwsgi.log '.format(\
-            self._var_dir, self._project_name, self._log_dir)
-        # misc
-        scr += '--no-orphans --vacuum -M --chmod-socket 664 \
---harakiri 300 --max-requests 5000 --limit-as 160 \
---post-buffering 16777216 '
-        # write config
-        uwsgi_file = os.path.join(self._conf_dir, '{0}.uwsgi'.format(self._project_name))
-        f = open(uwsgi_file, 'w')
-        f.write(scr)
-        f.close()
-        # make executable
-        os.chmod(uwsgi_file, 0754)
-
+        cfg.add('module', 'app:app')
+        self.write_uwsgi_config(cfg)
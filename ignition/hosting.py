@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import glob
+import logging
+from ignition.common import check_command, run_command, get_lock
+from ignition import sizing
+from ignition import config
+from ignition import logs
+from ignition.config import Directive, ConfigError, parse_nginx
+
+# host level nginx master for shared hosting projects
+FRONTEND_CONFIG = 'frontend.conf'
+FRONTEND_NAME = 'frontend'
+
+def get_frontend_config(root_dir):
+    """
+    Returns the path to the shared hosting front end config
+
+    """
+    return os.path.join(root_dir, 'conf', FRONTEND_CONFIG)
+
+def get_frontend_pidfile(root_dir):
+    """
+    Returns the path to the shared hosting front end pid file
+
+    """
+    return os.path.join(root_dir, 'var', '{0}_nginx.pid'.format(FRONTEND_NAME))
+
+def find_shared_configs(root_dir):
+    """
+    Returns the (sorted) shared hosting server configs under a root dir
+
+    Standalone configs (with their own http section) are skipped.
+
+    """
+    log = logging.getLogger('hosting')
+    configs = []
+    for path in sorted(glob.glob(os.path.join(root_dir, 'conf', '*_nginx.conf'))):
+        with open(path, 'r') as f:
+            try:
+                cfg = parse_nginx(f.read())
+            except ConfigError as e:
+                log.error('Skipping {0}: {1}'.format(path, e))
+                continue
+        if not cfg.find('http'):
+            configs.append(path)
+    return configs
+
+def get_frontend_config_tree(root_dir, user=None, profile=sizing.DEFAULT_PROFILE):
+    """
+    Returns the nginx master config serving every shared hosting project
+
+    Worker counts and connection limits come from the host sizing, so
+    memory and descriptors scale with the nginx workers rather than the
+    number of projects.
+
+    :keyword root_dir: Base directory where projects are stored
+    :keyword user: User account for the nginx workers
+    :keyword profile: Worker sizing profile
+
+    """
+    conf_dir = os.path.join(root_dir, 'conf')
+    log_dir = os.path.join(root_dir, 'log')
+    s = sizing.calculate_sizing(profile)
+    cfg = config.new_nginx_config([config.comment('nginx shared hosting front end (generated; do not edit)')])
+    if user:
+        cfg.add(Directive('user', [user]))
+    cfg.add(Directive('worker_processes', [s['worker_processes']]))
+    cfg.add(Directive('worker_rlimit_nofile', [s['worker_rlimit_nofile']]))
+    cfg.add(Directive('error_log', ['{0}-errors.log'.format(os.path.join(log_dir, FRONTEND_NAME))]))
+    cfg.add(Directive('pid', [get_frontend_pidfile(root_dir)]))
+    cfg.add(config.blank())
+    cfg.add(Directive('events', children=[
+        Directive('worker_connections', [s['worker_connections']]),
+        Directive('multi_accept', ['on']),
+    ]))
+    cfg.add(config.blank())
+    # http section
+    http = cfg.add(Directive('http', children=[]))
+    if os.path.exists(os.path.join(conf_dir, 'mime.types')):
+        http.add(Directive('include', ['mime.types']))
+    http.add(Directive('default_type', ['application/octet-stream']))
+    http.add(Directive('client_max_body_size', ['1G']))
+    http.add(Directive('proxy_max_temp_file_size', [0]))
+    http.add(Directive('proxy_buffering', ['off']))
+    # timing log format shared by the project servers
+    http.add(logs.get_log_format())
+    http.add(Directive('access_log', ['{0}-access.log'.format(os.path.join(log_dir, FRONTEND_NAME)), \
+        logs.LOG_FORMAT_NAME]))
+    http.add(Directive('sendfile', ['on']))
+    http.add(Directive('tcp_nopush', ['on']))
+    http.add(Directive('tcp_nodelay', ['on']))
+    http.add(Directive('keepalive_timeout', [65]))
+    http.add(Directive('keepalive_requests', [1000]))
+    http.add(Directive('server_names_hash_bucket_size', [128]))
+    http.add(config.blank())
+    # projects
+    for path in find_shared_configs(root_dir):
+        http.add(Directive('include', [path]))
+    return cfg
+
+def create_frontend_config(root_dir, user=None, profile=sizing.DEFAULT_PROFILE):
+    """
+    Creates the shared hosting front end config (see get_frontend_config_tree)
+
+    Returns True if the config changed
+
+    """
+    cfg = get_frontend_config_tree(root_dir, user, profile).serialize()
+    frontend_config = get_frontend_config(root_dir)
+    if os.path.exists(frontend_config):
+        with open(frontend_config, 'r') as f:
+            if f.read() == cfg:
+                return False
+    with open(frontend_config, 'w') as f:
+        f.write(cfg)
+    return True
+
+def is_frontend_running(root_dir):
+    """
+    Returns True if the shared hosting front end is running
+
+    """
+    pidfile = get_frontend_pidfile(root_dir)
+    if not os.path.exists(pidfile):
+        return False
+    try:
+        with open(pidfile, 'r') as f:
+            os.kill(int(f.read().strip()), 0)
+    except (ValueError, OSError):
+        return False
+    return True
+
+def reload_frontend(root_dir):
+    """
+    Gracefully reloads the shared hosting front end (if running)
+
+    The config is tested first; a broken config leaves the running
+    front end untouched.
+
+    Returns True if the front end was reloaded
+
+    """
+    log = logging.getLogger('hosting')
+    if not is_frontend_running(root_dir) or not check_command('nginx'):
+        return False
+    frontend_config = get_frontend_config(root_dir)
+    ret, out = run_command(['nginx', '-t', '-c', frontend_config])
+    if ret != 0:
+        log.error('Front end config test failed; not reloading:\n{0}'.format(out))
+        return False
+    ret, out = run_command(['nginx', '-c', frontend_config, '-s', 'reload'])
+    if ret != 0:
+        log.error('Unable to reload front end:\n{0}'.format(out))
+        return False
+    log.info('Front end reloaded')
+    return True
+
+def update_frontend(root_dir, user=None, profile=sizing.DEFAULT_PROFILE):
+    """
+    Regenerates the shared hosting front end and reloads it if projects
+    were added or removed
+
+    """
+    log = logging.getLogger('hosting')
+    # projects created concurrently share the front end
+    with get_lock(get_frontend_config(root_dir)):
+        if create_frontend_config(root_dir, user, profile):
+            log.info('Front end config updated ({0} projects)'.format(\
+                len(find_shared_configs(root_dir))))
+            reload_frontend(root_dir)
+            return True
+    return False
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import glob
+import gzip
+import math
+import logging
+import multiprocessing
+from ignition.common import get_percentile_rank
+from ignition.config import Directive
+
+# nginx access log format written by generated configs (tab separated;
+# nginx escapes tabs in variables as \x09 so fields never shift)
+LOG_FORMAT_NAME = 'ignition_timing'
+LOG_FIELDS = [
+    ('time', '$time_iso8601'),
+    ('remote_addr', '$remote_addr'),
+    ('method', '$request_method'),
+    ('uri', '$uri'),
+    ('status', '$status'),
+    ('bytes', '$body_bytes_sent'),
+    ('request_time', '$request_time'),
+    ('upstream_time', '$upstream_response_time'),
+    ('upstream_connect_time', '$upstream_connect_time'),
+    ('upstream_header_time', '$upstream_header_time'),
+    ('cache', '$upstream_cache_status'),
+    ('host', '$host'),
+    ('user_agent', '$http_user_agent'),
+]
+_FIELD_INDEX = dict([(name, i) for i, (name, var) in enumerate(LOG_FIELDS)])
+
+# latency histogram buckets grow by 5% so percentiles are within 5%
+HISTOGRAM_GROWTH = 1.05
+# routes tracked per file; the rest are counted as OTHER_ROUTE
+MAX_ROUTES = 2000
+OTHER_ROUTE = '(other)'
+# routes need this many requests to be listed as slowest
+MIN_SLOW_COUNT = 10
+
+# path segments collapsed into :id when grouping requests by route
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$')
+
+def get_log_format():
+    """
+    Returns the Nginx log_format directive for the timing log format
+
+    """
+    fmt = '\\t'.join([var for name, var in LOG_FIELDS])
+    return Directive('log_format', [LOG_FORMAT_NAME, "'{0}'".format(fmt)])
+
+def normalize_route(uri):
+    """
+    Groups a request path into a route (numeric ids, hashes and uuids
+    become :id)
+
+    """
+    return '/'.join([':id' if _ID_SEGMENT.match(x) else x for x in uri.split('/')])
+
+def _bucket(ms):
+    return int(math.ceil(math.log(ms + 1, HISTOGRAM_GROWTH)))
+
+def _bucket_value(bucket):
+    return HISTOGRAM_GROWTH ** bucket - 1
+
+def percentile(histogram, pct, maximum=None):
+    """
+    Returns a percentile (ms) from a latency histogram
+
+    """
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    rank = get_percentile_rank(total, pct)
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            value = _bucket_value(bucket)
+            return min(value, maximum) if maximum is not None else value
+    return maximum or 0.0
+
+def _new_route():
+    return {'count': 0, 'time': 0.0, 'max': 0.0, 'histogram': {}, 'upstream_time': 0.0, \
+        'upstream_count': 0, 'status': {}}
+
+def _new_result():
+    return {'files': [], 'lines': 0, 'unparsed': 0, 'routes': {}, 'status': {}}
+
+def open_log(path):
+    """
+    Opens a plain or gzipped log file
+
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def _upstream_seconds(value):
+    # several upstreams (retries) are listed as "0.001, 0.002"
+    total = None
+    for x in value.replace(':', ',').split(','):
+        x = x.strip()
+        if x and x != '-':
+            total = (total or 0.0) + float(x)
+    return total
+
+def analyze_file(path):
+    """
+    Reads a timing access log (see LOG_FIELDS) and returns per-route
+    latency histograms and status counts
+
+    Lines are streamed and only histograms are kept, so memory does not
+    grow with the size of the log.
+
+    """
+    result = _new_result()
+    result['files'].append(path)
+    routes = result['routes']
+    n_fields = len(LOG_FIELDS)
+    i_method = _FIELD_INDEX['method']
+    i_uri = _FIELD_INDEX['uri']
+    i_status = _FIELD_INDEX['status']
+    i_time = _FIELD_INDEX['request_time']
+    i_upstream = _FIELD_INDEX['upstream_time']
+    f = open_log(path)
+    try:
+        for line in f:
+            result['lines'] += 1
+            fields = line.decode('utf-8', 'replace').rstrip('\r\n').split('\t')
+            if len(fields) != n_fields:
+                result['unparsed'] += 1
+                continue
+            try:
+                ms = float(fields[i_time]) * 1000
+                upstream = _upstream_seconds(fields[i_upstream])
+            except ValueError:
+                result['unparsed'] += 1
+                continue
+            status = fields[i_status]
+            route = '{0} {1}'.format(fields[i_method], normalize_route(fields[i_uri]))
+            if route not in routes:
+                if len(routes) >= MAX_ROUTES:
+                    route = OTHER_ROUTE
+                    if route not in routes:
+                        routes[route] = _new_route()
+                else:
+                    routes[route] = _new_route()
+            r = routes[route]
+            r['count'] += 1
+            r['time'] += ms
+            if ms > r['max']:
+                r['max'] = ms
+            b = _bucket(ms)
+            r['histogram'][b] = r['histogram'].get(b, 0) + 1
+            if upstream is not None:
+                r['upstream_time'] += upstream * 1000
+                r['upstream_count'] += 1
+            r['status'][status] = r['status'].get(status, 0) + 1
+            result['status'][status] = result['status'].get(status, 0) + 1
+    finally:
+        f.close()
+    return result
+
+def _merge_counts(a, b):
+    for k, v in b.items():
+        a[k] = a.get(k, 0) + v
+
+def merge(a, b):
+    """
+    Merges two results of analyze_file
+
+    """
+    a['files'].extend(b['files'])
+    a['lines'] += b['lines']
+    a['unparsed'] += b['unparsed']
+    _merge_counts(a['status'], b['status'])
+    for route, rb in b['routes'].items():
+        ra = a['routes'].setdefault(route, _new_route())
+        ra['count'] += rb['count']
+        ra['time'] += rb['time']
+        ra['max'] = max(ra['max'], rb['max'])
+        ra['upstream_time'] += rb['upstream_time']
+        ra['upstream_count'] += rb['upstream_count']
+        _merge_counts(ra['histogram'], rb['histogram'])
+        _merge_counts(ra['status'], rb['status'])
+    return a
+
+def find_logs(root_dir, project_name):
+    """
+    Returns the access logs (including rotated and gzipped ones) of a project
+
+    """
+    return sorted(glob.glob(os.path.join(root_dir, 'log', '{0}-access.log*'.format(project_name))))
+
+def analyze_logs(paths, processes=None):
+    """
+    Analyzes access logs, one file per process
+
+    :keyword paths: Log files (plain or .gz)
+    :keyword processes: Number of processes (default: one per core)
+
+    """
+    log = logging.getLogger('logs')
+    result = _new_result()
+    if not paths:
+        return result
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(paths))
+    log.debug('Analyzing {0} log files with {1} processes'.format(len(paths), processes))
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(analyze_file, paths)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [analyze_file(p) for p in paths]
+    for r in results:
+        merge(result, r)
+    return result
+
+def get_route_stats(result):
+    """
+    Returns per-route summaries (count, mean, p50, p95, p99, max, mean
+    upstream time and error rate)
+
+    """
+    stats = []
+    for route, r in result['routes'].items():
+        errors = sum([v for k, v in r['status'].items() if k.startswith('5')])
+        stats.append({
+            'route': route,
+            'count': r['count'],
+            'mean': r['time'] / r['count'],
+            'p50': percentile(r['histogram'], 50, r['max']),
+            'p95': percentile(r['histogram'], 95, r['max']),
+            'p99': percentile(r['histogram'], 99, r['max']),
+            'max': r['max'],
+            'upstream_mean': r['upstream_time'] / r['upstream_count'] if r['upstream_count'] else None,
+            'error_rate': float(errors) / r['count'],
+        })
+    return stats
+
+def format_report(result, top=10):
+    """
+    Formats the busiest routes, slowest routes and status distribution
+
+    """
+    stats = get_route_stats(result)
+    header = '{0:<40} {1:>8} {2:>9} {3:>9} {4:>9} {5:>9} {6:>7}'.format('route', 'requests', \
+        'p50 ms', 'p95 ms', 'p99 ms', 'max ms', '5xx')
+
+    def row(s):
+        return '{0:<40} {1:>8} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>6.1f}%'.format(\
+            s['route'][:40], s['count'], s['p50'], s['p95'], s['p99'], s['max'], s['error_rate'] * 100)
+
+    lines = ['{0} lines in {1} files ({2} not in the timing format)'.format(result['lines'], \
+        len(result['files']), result['unparsed']), '']
+    lines.append('Busiest routes:')
+    lines.append(header)
+    lines.extend([row(s) for s in sorted(stats, key=lambda x: -x['count'])[:top]])
+    lines.append('')
+    lines.append('Slowest routes (p99, at least {0} requests):'.format(MIN_SLOW_COUNT))
+    lines.append(header)
+    slow = [s for s in stats if s['count'] >= MIN_SLOW_COUNT]
+    lines.extend([row(s) for s in sorted(slow, key=lambda x: -x['p99'])[:top]])
+    lines.append('')
+    lines.append('Status codes:')
+    total = sum(result['status'].values()) or 1
+    for status, count in sorted(result['status'].items()):
+        lines.append('  {0}: {1} ({2:.1f}%)'.format(status, count, count * 100.0 / total))
+    return '\n'.join(lines)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import logging
+from multiprocessing.pool import ThreadPool
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:
+    from configparser import RawConfigParser
+try:
+    import yaml
+except ImportError:
+    yaml = None
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+DEFAULT_WORKERS = 4
+
+# manifest keys passed to the creators
+PROJECT_KEYS = [
+    'template',
+    'port',
+    'server_name',
+    'modules',
+    'user',
+    'shared_hosting',
+    'profile',
+    'force',
+]
+BOOLEAN_KEYS = ['shared_hosting', 'force']
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'yes', 'true', 'on')
+
+def load_manifest(path):
+    """
+    Loads a list of projects from a JSON, YAML or INI manifest
+
+    JSON and YAML manifests are either a list of projects or a mapping with
+    a 'projects' list; each project is a mapping with at least 'name' and
+    'template'.  INI manifests use one section per project (the section name
+    is the project name).
+
+    :keyword path: Path to the manifest
+
+    Returns a list of project dicts
+
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.ini', '.cfg'):
+        cp = RawConfigParser()
+        cp.read(path)
+        data = []
+        for section in cp.sections():
+            prj = dict(cp.items(section))
+            prj['name'] = section
+            data.append(prj)
+    elif ext in ('.yaml', '.yml'):
+        if not yaml:
+            raise ValueError('PyYAML is required for YAML manifests')
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f)
+    else:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('projects', [])
+    projects = []
+    names = set()
+    for entry in data or []:
+        if not entry.get('name') or not entry.get('template'):
+            raise ValueError('Manifest projects must have a name and template: {0}'.format(entry))
+        prj = {'name': str(entry['name']).strip().lower()}
+        if prj['name'] in names:
+            raise ValueError('Duplicate project in manifest: {0}'.format(prj['name']))
+        names.add(prj['name'])
+        for k in PROJECT_KEYS:
+            if k in entry and entry[k] is not None:
+                prj[k] = entry[k]
+        prj['template'] = str(prj['template']).lower()
+        modules = prj.get('modules', [])
+        if isinstance(modules, string_types):
+            modules = [x.strip() for x in modules.split(',') if x.strip()]
+        prj['modules'] = list(modules)
+        for k in BOOLEAN_KEYS:
+            if k in prj:
+                prj[k] = _to_bool(prj[k])
+        projects.append(prj)
+    return projects
+
+def _create_project(args):
+    prj, creator_class, opts = args
+    log = logging.getLogger('manifest')
+    start = time.time()
+    status = {'name': prj['name'], 'template': prj['template'], 'error': None}
+    try:
+        # invalid options raise here and only fail this project
+        creator = creator_class(**opts)
+        status['ok'] = bool(creator.create())
+        if not status['ok']:
+            status['error'] = 'creation failed (see log)'
+    except Exception as e:
+        log.exception('Error creating {0}'.format(prj['name']))
+        status['ok'] = False
+        status['error'] = str(e)
+    status['time'] = time.time() - start
+    return status
+
+def provision(projects, get_creator, workers=DEFAULT_WORKERS, **kwargs):
+    """
+    Creates the projects from a manifest on a bounded worker pool
+
+    Creators sharing a base environment or wheelhouse wait for the first to
+    build it, so shared work is only done once.
+
+    :keyword projects: List of projects (see load_manifest)
+    :keyword get_creator: Callable returning the creator class for a template
+    :keyword workers: Number of projects to create concurrently
+    :keyword kwargs: Defaults passed to every creator (root_dir, user, etc.)
+
+    Returns a list of per project status dicts (name, template, ok, error, time)
+
+    """
+    log = logging.getLogger('manifest')
+    jobs = []
+    results = []
+    for prj in projects:
+        creator_class = get_creator(prj['template'])
+        if not creator_class:
+            results.append({'name': prj['name'], 'template': prj['template'], \
+                'ok': False, 'error': 'unknown template', 'time': 0.0})
+            continue
+        opts = dict(kwargs)
+        opts.update(prj)
+        opts['project_name'] = opts.pop('name')
+        opts.pop('template')
+        jobs.append((prj, creator_class, opts))
+    log.info('Creating {0} projects with {1} workers'.format(len(jobs), workers))
+    pool = ThreadPool(max(1, min(workers, len(jobs) or 1)))
+    try:
+        results.extend(pool.map(_create_project, jobs))
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def format_summary(results):
+    """
+    Formats the per project status of a manifest run
+
+    """
+    lines = []
+    width = max([len(r['name']) for r in results] + [7])
+    for r in results:
+        status = 'ok' if r['ok'] else 'FAILED ({0})'.format(r['error'])
+        lines.append(' {0}  {1:<10} {2:>8.1f}s  {3}'.format(r['name'].ljust(width), \
+            r['template'], r['time'], status))
+    failed = len([r for r in results if not r['ok']])
+    lines.append('{0} projects, {1} failed'.format(len(results), failed))
+    return '\n'.join(lines)
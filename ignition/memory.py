@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import logging
+import threading
+from ignition import benchmark
+from ignition import startup
+from ignition import scaling
+from ignition import tuning
+from ignition.common import get_process_tree, get_process_rss, get_uwsgi_configs, write_file
+from ignition.config import parse_uwsgi
+
+MB = 1024 * 1024
+# seconds of load used to reach the steady state
+DEFAULT_DURATION = 10
+DEFAULT_CONCURRENCY = 16
+# a worker is recycled (after its request) at this multiple of the steady
+# state RSS, and killed by the master at EVIL_FACTOR times that
+RELOAD_FACTOR = 1.5
+EVIL_FACTOR = 1.5
+# minimum room (MB) between the steady state and reload-on-rss
+MIN_HEADROOM = 32
+# limits used before the app was measured (MB)
+DEFAULT_RELOAD_RSS = 512
+# workers are recycled after MAX_WORKER_LIFETIME seconds; uwsgi adds
+# worker id * LIFETIME_DELTA so they don't all restart at once
+MAX_WORKER_LIFETIME = 3600
+LIFETIME_DELTA = 30
+# cheaper mode stops spawning workers past this share of the budget
+CHEAPER_SOFT_SHARE = 0.8
+# recycling and scaling options (disabled while measuring)
+UWSGI_OPTIONS = ['reload-on-rss', 'evil-reload-on-rss', 'max-worker-lifetime', \
+    'max-worker-lifetime-delta', 'max-requests', 'cheaper', 'cheaper-initial', \
+    'cheaper-rss-limit-soft', 'cheaper-rss-limit-hard']
+
+def get_measurement_file(root_dir, project_name):
+    """
+    Returns the path to the measured memory usage of a project
+
+    """
+    return os.path.join(root_dir, 'conf', '{0}_memory.json'.format(project_name))
+
+def load_measurement(root_dir, project_name):
+    """
+    Returns the measured memory usage of a project (None if not measured)
+
+    """
+    path = get_measurement_file(root_dir, project_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_measurement(root_dir, project_name, measurement):
+    return write_file(get_measurement_file(root_dir, project_name), \
+        json.dumps(measurement, indent=1, sort_keys=True))
+
+def _worker_rss(pid):
+    return [get_process_rss(x, children=False) for x in get_process_tree(pid) if x != pid]
+
+def _sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max([peak[0]] + _worker_rss(pid))
+        stop.wait(0.2)
+
+def measure(root_dir, project_name, concurrency=DEFAULT_CONCURRENCY, duration=DEFAULT_DURATION, \
+    path='/'):
+    """
+    Starts the project uWSGI instance (without recycling) and measures the
+    resident memory of its workers
+
+    The baseline is taken once every worker served a few requests (lazy
+    workers load the app on their first one), the steady state after
+    duration seconds of load.
+
+    Returns a dict with baseline, steady and peak (largest worker RSS in
+    bytes) and the number of workers
+
+    """
+    log = logging.getLogger('memory')
+    port = benchmark.get_free_port()
+    url = 'http://127.0.0.1:{0}{1}'.format(port, path)
+    p = benchmark.start_uwsgi(root_dir, project_name, port, dict([(k, None) for k in \
+        UWSGI_OPTIONS + scaling.UWSGI_OPTIONS]))
+    peak = [0]
+    stop = threading.Event()
+    try:
+        if not startup.wait_for_response(url, process=p):
+            raise benchmark.BenchmarkError('No response from uWSGI (see log/{0}_bench_uwsgi.log)'.format(\
+                project_name))
+        benchmark.run_load(url, concurrency=concurrency, requests=concurrency * 4)
+        baseline = max(_worker_rss(p.pid) or [0])
+        log.info('Baseline worker RSS: {0} MB'.format(baseline // MB))
+        sampler = threading.Thread(target=_sample_rss, args=(p.pid, peak, stop))
+        sampler.daemon = True
+        sampler.start()
+        result = benchmark.run_load(url, concurrency=concurrency, duration=duration)
+        stop.set()
+        sampler.join()
+        rss = _worker_rss(p.pid)
+    finally:
+        stop.set()
+        benchmark.stop_uwsgi(p)
+    steady = max(rss or [0])
+    log.info('Steady state worker RSS: {0} MB (peak {1} MB, {2:.1f} req/s)'.format(steady // MB, \
+        peak[0] // MB, result['rps']))
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'baseline': baseline,
+        'steady': steady,
+        'peak': max(peak[0], steady),
+        'workers': len(rss),
+        'requests': result['requests'],
+        'error_rate': result['error_rate'],
+    }
+
+def get_limits(processes, measurement=None, memory_budget=None):
+    """
+    Returns the uWSGI recycling and scaling settings for a project
+
+    Workers are recycled once they grow well past the measured steady
+    state (instead of after a fixed number of requests) and the process
+    count is bounded by how many such workers fit in the memory budget.
+
+    :keyword processes: Processes sized for the host
+    :keyword measurement: Measured memory usage (see measure); without it
+        DEFAULT_RELOAD_RSS is used
+    :keyword memory_budget: Memory (bytes) the workers may use
+
+    Returns a dict of uWSGI options (processes included)
+
+    """
+    if measurement and measurement.get('steady'):
+        steady = measurement['steady'] / float(MB)
+        reload_rss = int(max(steady * RELOAD_FACTOR, steady + MIN_HEADROOM)) + 1
+    else:
+        reload_rss = DEFAULT_RELOAD_RSS
+    if measurement and memory_budget:
+        processes = max(1, min(processes, memory_budget // (reload_rss * MB)))
+    limits = {
+        'processes': processes,
+        'reload-on-rss': reload_rss,
+        'evil-reload-on-rss': int(reload_rss * EVIL_FACTOR),
+        'max-worker-lifetime': MAX_WORKER_LIFETIME,
+        'max-worker-lifetime-delta': LIFETIME_DELTA,
+    }
+    if processes > 1:
+        # idle workers are stopped down to a quarter of the pool
+        limits['cheaper'] = max(1, processes // 4)
+        limits['cheaper-initial'] = limits['cheaper']
+        if memory_budget:
+            limits['cheaper-rss-limit-soft'] = int(memory_budget * CHEAPER_SOFT_SHARE)
+            limits['cheaper-rss-limit-hard'] = int(memory_budget)
+    return limits
+
+def add_uwsgi_options(cfg, limits):
+    """
+    Adds the recycling and scaling options (see get_limits) to a uWSGI
+    config
+
+    """
+    for k in UWSGI_OPTIONS:
+        if k in limits:
+            cfg.add(k, limits[k])
+    return cfg
+
+def apply_limits(root_dir, project_name, limits):
+    """
+    Writes recycling and scaling settings (see get_limits) into the
+    config of every project instance
+
+    Tuned settings (see ignition.tuning) still take precedence.
+
+    """
+    written = False
+    tuned = tuning.load_tuning(root_dir, project_name).get('uwsgi', {})
+    for uwsgi_config in get_uwsgi_configs(root_dir, project_name):
+        if not os.path.exists(uwsgi_config):
+            continue
+        with open(uwsgi_config, 'r') as f:
+            cfg = parse_uwsgi(f.read())
+        for k in UWSGI_OPTIONS + ['limit-as']:
+            cfg.remove(k)
+        cfg.set('processes', limits['processes'])
+        add_uwsgi_options(cfg, limits)
+        # keep the scaling profile steps in line with the new bounds
+        for k in ('cheaper-step', 'cheaper-busyness-backlog-step'):
+            if cfg.get(k) and 'cheaper' in limits:
+                cfg.set(k, scaling.get_step(limits))
+        for k, v in sorted(tuned.items()):
+            cfg.set(k, v)
+        scaling.clamp_cheaper(cfg)
+        written = write_file(uwsgi_config, cfg.serialize()) or written
+    return written
+
+def format_measurement(measurement, limits):
+    """
+    Formats a measurement and the limits derived from it
+
+    """
+    lines = [
+        'baseline worker RSS: {0:.1f} MB'.format(measurement['baseline'] / float(MB)),
+        'steady worker RSS:   {0:.1f} MB (peak {1:.1f} MB)'.format(measurement['steady'] / float(MB), \
+            measurement['peak'] / float(MB)),
+    ]
+    lines.extend(['{0}: {1}'.format(k, limits[k]) for k in ['processes'] + UWSGI_OPTIONS if k in limits])
+    return '\n'.join(lines)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Request profiling middleware used by generated projects.  It is copied
+# next to the app as ignition_profiler.py so it only uses the standard
+# library.  uWSGI loads ignition_profiler:application, which wraps the app
+# named by IGNITION_PROFILE_APP (see ignition.profiling):
+#
+#   IGNITION_PROFILE_APP        WSGI app (module:callable, i.e. app:app)
+#   IGNITION_PROFILE_DIR        directory for the profiles
+#   IGNITION_PROFILE_RATE       fraction of requests to profile (0-1)
+#   IGNITION_PROFILE_THRESHOLD  also profile requests slower than this (ms)
+#   IGNITION_PROFILE_MAX_FILES  profiles kept (oldest are removed)
+#   IGNITION_PROFILE_MAX_BYTES  total size of the profiles kept
+#
+# Profiled requests have their thread stack sampled every INTERVAL seconds
+# by a background thread (uWSGI needs enable-threads); each profile is
+# written in the collapsed stack format (frame;frame;frame count) after a
+# '#' header line.
+
+import os
+import sys
+import time
+import random
+import threading
+
+INTERVAL = 0.005
+# samples kept per request (about a minute at INTERVAL)
+MAX_SAMPLES = 12000
+DEFAULT_MAX_FILES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# profiles written by a process between scans of the profile directory
+ROTATE_EVERY = 20
+SUFFIX = '.collapsed'
+
+def _frame_name(code):
+    # ';' separates frames in the collapsed format
+    return '{0} ({1}:{2})'.format(code.co_name, code.co_filename, code.co_firstlineno).replace(';', ':')
+
+def get_stack(frame):
+    """
+    Returns the stack of a frame in collapsed form (outermost frame first)
+
+    """
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+class Sampler(object):
+    """
+    Samples the stacks of the threads serving profiled requests
+
+    The sampling thread is started on the first profiled request of each
+    process (after uWSGI forks the workers).
+
+    """
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self, ident):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                t = threading.Thread(target=self._run)
+                t.daemon = True
+                t.start()
+            self._active[ident] = [{}, 0]
+
+    def stop(self, ident):
+        """
+        Stops sampling a thread
+
+        Returns a dict of stack and sample count
+
+        """
+        with self._lock:
+            return self._active.pop(ident, [{}, 0])[0]
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, entry in self._active.items():
+                frame = frames.get(ident)
+                if frame is None or entry[1] >= MAX_SAMPLES:
+                    continue
+                stack = get_stack(frame)
+                entry[0][stack] = entry[0].get(stack, 0) + 1
+                entry[1] += 1
+
+    def _run(self):
+        # module globals are cleared while a Python 2 interpreter exits
+        sleep = time.sleep
+        while True:
+            sleep(self.interval)
+            if self._active:
+                self.sample()
+
+def _is_file_response(result, environ):
+    # responses from wsgi.file_wrapper are returned as is so the server can
+    # still send the file itself (uWSGI checks for the object it returned)
+    wrapper = environ.get('wsgi.file_wrapper')
+    if isinstance(wrapper, type) and isinstance(result, wrapper):
+        return True
+    return hasattr(result, 'fileno') or hasattr(result, 'filelike')
+
+class _ClosingIterator(object):
+    # calls on_close once the response was sent (streamed responses are
+    # sampled until then)
+    def __init__(self, result, on_close):
+        self._result = result
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def close(self):
+        try:
+            if hasattr(self._result, 'close'):
+                self._result.close()
+        finally:
+            self._on_close()
+
+class ProfilerMiddleware(object):
+    """
+    WSGI middleware writing stack profiles of sampled and slow requests
+
+    :keyword app: WSGI application
+    :keyword profile_dir: Directory for the profiles
+    :keyword rate: Fraction of requests to profile
+    :keyword threshold: Also profile requests slower than this (ms); every
+        request is sampled while the app runs and only slow ones are kept
+        (the response body of these requests is not timed)
+    :keyword max_files: Number of profiles kept
+    :keyword max_bytes: Total size of the profiles kept (checked every
+        ROTATE_EVERY profiles a process writes, so each worker can go over
+        by that many)
+
+    """
+    def __init__(self, app, profile_dir, rate=0.0, threshold=None, max_files=DEFAULT_MAX_FILES, \
+        max_bytes=DEFAULT_MAX_BYTES, sampler=None):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.rate = rate
+        self.threshold = threshold
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.sampler = sampler or Sampler()
+        self._count = 0
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        sampled = self.rate > 0 and random.random() < self.rate
+        if not sampled and self.threshold is None:
+            return self.app(environ, start_response)
+        ident = threading.current_thread().ident
+        start = time.time()
+        self.sampler.start(ident)
+        try:
+            result = self.app(environ, start_response)
+        except Exception:
+            self.finish(ident, environ, start, sampled)
+            raise
+        # only sampled responses are wrapped (to sample streamed bodies)
+        if not sampled or _is_file_response(result, environ):
+            self.finish(ident, environ, start, sampled)
+            return result
+        return _ClosingIterator(result, lambda: self.finish(ident, environ, start, sampled))
+
+    def finish(self, ident, environ, start, sampled):
+        stacks = self.sampler.stop(ident)
+        elapsed = (time.time() - start) * 1000
+        if not stacks:
+            return
+        if not sampled and elapsed < self.threshold:
+            return
+        try:
+            self.write_profile(stacks, environ, elapsed, 'sampled' if sampled else 'slow')
+            # the directory is only scanned every ROTATE_EVERY profiles
+            with self._lock:
+                self._written += 1
+                scan = self._written >= ROTATE_EVERY
+                if scan:
+                    self._written = 0
+            if scan:
+                self.rotate()
+        except (IOError, OSError) as e:
+            sys.stderr.write('ignition_profiler: unable to write profile: {0}\n'.format(e))
+
+    def write_profile(self, stacks, environ, elapsed, reason):
+        with self._lock:
+            self._count += 1
+            count = self._count
+        name = '{0}-{1}-{2}-{3:.0f}ms{4}'.format(time.strftime('%Y%m%dT%H%M%S'), os.getpid(), count, \
+            elapsed, SUFFIX)
+        path = os.path.join(self.profile_dir, name)
+        lines = ['# {0} {1} {2:.1f}ms {3}\n'.format(environ.get('REQUEST_METHOD', '-'), \
+            environ.get('PATH_INFO', '-'), elapsed, reason)]
+        lines.extend(['{0} {1}\n'.format(k, v) for k, v in sorted(stacks.items())])
+        # written under a temporary name so readers never see partial files
+        with open(path + '.tmp', 'w') as f:
+            f.write(''.join(lines))
+        os.rename(path + '.tmp', path)
+        return path
+
+    def rotate(self):
+        """
+        Removes the oldest profiles beyond max_files or max_bytes
+
+        """
+        profiles = []
+        for name in os.listdir(self.profile_dir):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.profile_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            profiles.append((st.st_mtime, name, st.st_size))
+        profiles.sort()
+        total = sum([x[2] for x in profiles])
+        while profiles and (len(profiles) > self.max_files or total > self.max_bytes):
+            mtime, name, size = profiles.pop(0)
+            total -= size
+            try:
+                os.remove(os.path.join(self.profile_dir, name))
+            except OSError:
+                # another worker removed it
+                pass
+
+def load_app(target):
+    """
+    Imports a WSGI app from module:callable (a trailing () calls it, i.e.
+    django.core.handlers.wsgi:WSGIHandler())
+
+    """
+    module_name, _, attr = target.partition(':')
+    call = attr.endswith('()')
+    __import__(module_name)
+    app = sys.modules[module_name]
+    for part in (attr[:-2] if call else attr or 'application').split('.'):
+        app = getattr(app, part)
+    return app() if call else app
+
+def from_environ(environ=os.environ):
+    """
+    Returns the wrapped app configured by the IGNITION_PROFILE_* variables
+
+    """
+    threshold = environ.get('IGNITION_PROFILE_THRESHOLD')
+    return ProfilerMiddleware(load_app(environ['IGNITION_PROFILE_APP']), environ['IGNITION_PROFILE_DIR'], \
+        rate=float(environ.get('IGNITION_PROFILE_RATE') or 0), \
+        threshold=float(threshold) if threshold else None, \
+        max_files=int(environ.get('IGNITION_PROFILE_MAX_FILES') or DEFAULT_MAX_FILES), \
+        max_bytes=int(environ.get('IGNITION_PROFILE_MAX_BYTES') or DEFAULT_MAX_BYTES))
+
+if 'IGNITION_PROFILE_APP' in os.environ:
+    application = from_environ()
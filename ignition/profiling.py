@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import glob
+from ignition import profiler
+
+# module the profiler is installed as (next to the app)
+PROFILER_MODULE = 'ignition_profiler'
+
+def get_profile_dir(root_dir, project_name):
+    return os.path.join(root_dir, 'var', 'profiles', project_name)
+
+def get_collapsed_file(root_dir, project_name):
+    """
+    Returns the default path of the aggregated profile of a project
+
+    """
+    return os.path.join(root_dir, 'var', 'profiles', '{0}{1}'.format(project_name, profiler.SUFFIX))
+
+def get_profiler_source():
+    with open(os.path.splitext(profiler.__file__)[0] + '.py', 'r') as f:
+        return f.read()
+
+def add_uwsgi_options(cfg, profile_dir, rate=0.0, threshold=None, max_files=profiler.DEFAULT_MAX_FILES, \
+    max_bytes=profiler.DEFAULT_MAX_BYTES):
+    """
+    Wraps the app of a uWSGI config in the profiling middleware (see
+    ignition.profiler)
+
+    :keyword rate: Fraction of requests to profile
+    :keyword threshold: Also profile requests slower than this (ms)
+
+    """
+    app = cfg.get('module')
+    cfg.set('module', '{0}:application'.format(PROFILER_MODULE))
+    cfg.add('env', 'IGNITION_PROFILE_APP={0}'.format(app))
+    cfg.add('env', 'IGNITION_PROFILE_DIR={0}'.format(profile_dir))
+    cfg.add('env', 'IGNITION_PROFILE_RATE={0}'.format(rate or 0))
+    if threshold:
+        cfg.add('env', 'IGNITION_PROFILE_THRESHOLD={0}'.format(threshold))
+    cfg.add('env', 'IGNITION_PROFILE_MAX_FILES={0}'.format(max_files))
+    cfg.add('env', 'IGNITION_PROFILE_MAX_BYTES={0}'.format(max_bytes))
+    # the stack sampler is a thread
+    cfg.set('enable-threads', True)
+    return cfg
+
+def read_profile(path):
+    """
+    Reads a profile written by the middleware
+
+    Returns a tuple of (header, dict of stack and samples)
+
+    """
+    header = None
+    stacks = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('#'):
+                header = line[1:].strip()
+                continue
+            stack, _, count = line.rpartition(' ')
+            if not stack:
+                continue
+            try:
+                stacks[stack] = stacks.get(stack, 0) + int(count)
+            except ValueError:
+                continue
+    return (header, stacks)
+
+def aggregate(profile_dir, path_prefix=None):
+    """
+    Sums the stacks of all the profiles in a directory
+
+    :keyword path_prefix: Only include requests for URL paths starting with
+        this prefix
+
+    Returns a dict with the number of profiles and samples and the stacks
+    (dict of stack and samples)
+
+    """
+    stacks = {}
+    profiles = 0
+    for path in sorted(glob.glob(os.path.join(profile_dir, '*' + profiler.SUFFIX))):
+        try:
+            header, profile = read_profile(path)
+        except IOError:
+            # rotated away while reading
+            continue
+        # header: method path latency reason
+        fields = (header or '').split(' ')
+        if path_prefix and not (len(fields) > 1 and fields[1].startswith(path_prefix)):
+            continue
+        profiles += 1
+        for stack, count in profile.items():
+            stacks[stack] = stacks.get(stack, 0) + count
+    return {
+        'profiles': profiles,
+        'samples': sum(stacks.values()),
+        'stacks': stacks,
+    }
+
+def write_collapsed(stacks, path):
+    """
+    Writes stacks in the collapsed format read by flamegraph.pl and
+    speedscope
+
+    """
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write('{0} {1}\n'.format(stack, count))
+
+def get_hotspots(stacks, top=10):
+    """
+    Returns the frames with the most samples as a list of (frame, self
+    samples, total samples), ordered by self samples
+
+    """
+    own = {}
+    total = {}
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for frame in set(frames):
+            total[frame] = total.get(frame, 0) + count
+    ranked = sorted(own.items(), key=lambda x: (-x[1], x[0]))[:top]
+    return [(frame, count, total[frame]) for frame, count in ranked]
+
+def format_summary(result, top=10):
+    """
+    Formats an aggregated profile (see aggregate)
+
+    """
+    samples = result['samples']
+    lines = ['{0} profiles, {1} samples'.format(result['profiles'], samples)]
+    if samples:
+        lines.append('{0:>7} {1:>7}  {2}'.format('self %', 'total %', 'frame'))
+        for frame, own, total in get_hotspots(result['stacks'], top):
+            lines.append('{0:>7.1f} {1:>7.1f}  {2}'.format(own * 100.0 / samples, total * 100.0 / samples, \
+                frame))
+    return '\n'.join(lines)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Provisioning steps and the commands they run.  Commands never go through
+# a shell; each step records its wall time and the exit code of the
+# commands it ran (see Timings).
+
+import os
+import json
+import time
+import threading
+import subprocess
+
+# output kept for failed commands (characters)
+OUTPUT_TAIL = 2000
+
+# step currently running on each thread
+_local = threading.local()
+
+def which(command, path=None):
+    """
+    Returns the full path of an executable (None if not found)
+
+    :keyword path: Directories to search (default: PATH)
+
+    """
+    if os.path.dirname(command):
+        return command if os.path.isfile(command) and os.access(command, os.X_OK) else None
+    if path is None:
+        path = os.environ.get('PATH', os.defpath)
+    for d in path.split(os.pathsep):
+        candidate = os.path.join(d, command)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def run_command(args, cwd=None, env=None):
+    """
+    Runs a command (without a shell) and captures its output
+
+    The command is recorded with the step running on the current thread
+    (see Timings.run).
+
+    :keyword args: Command and arguments as a list
+    :keyword cwd: Working directory for the command
+    :keyword env: Environment for the command
+
+    Returns a tuple of (returncode, output)
+
+    """
+    start = time.time()
+    try:
+        p = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, \
+            stderr=subprocess.STDOUT)
+    except OSError as e:
+        ret, out = (127, '{0}: {1}'.format(args[0], e))
+    else:
+        out = p.communicate()[0]
+        ret = p.returncode
+    step = getattr(_local, 'step', None)
+    if step is not None:
+        command = {
+            'args': [str(x) for x in args],
+            'returncode': ret,
+            'seconds': time.time() - start,
+        }
+        if ret != 0:
+            if not isinstance(out, str):
+                out = out.decode('utf-8', 'replace')
+            command['output'] = out[-OUTPUT_TAIL:]
+        step['commands'].append(command)
+    return (ret, out)
+
+class Timings(object):
+    """
+    Runs the provisioning steps of a project and records their wall time,
+    outcome and commands
+
+    Steps run on the calling thread; run_parallel runs independent chains
+    of steps on their own threads.
+
+    """
+    def __init__(self, project_name):
+        self.project_name = project_name
+        self.steps = []
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._end = None
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Runs a step
+
+        A step fails if it returns False or raises (the exception is
+        re-raised).
+
+        Returns the result of func
+
+        """
+        step = {
+            'name': name,
+            'start': time.time() - self._start,
+            'ok': False,
+            'commands': [],
+        }
+        parent = getattr(_local, 'step', None)
+        _local.step = step
+        try:
+            result = func(*args, **kwargs)
+            step['ok'] = result is not False
+            return result
+        except Exception as e:
+            step['error'] = str(e)
+            raise
+        finally:
+            _local.step = parent
+            step['seconds'] = time.time() - self._start - step['start']
+            failed = [c['returncode'] for c in step['commands'] if c['returncode'] != 0]
+            step['returncode'] = failed[0] if failed else (0 if step['commands'] else None)
+            with self._lock:
+                self.steps.append(step)
+                self._end = time.time()
+
+    def run_parallel(self, funcs):
+        """
+        Runs callables concurrently (each on its own thread) and waits for
+        all of them
+
+        Returns the results in the order of funcs; the first exception
+        raised by a callable is re-raised once all are done
+
+        """
+        results = [None] * len(funcs)
+        errors = []
+
+        def target(i, func):
+            try:
+                results[i] = func()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=target, args=(i, f)) for i, f in enumerate(funcs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def report(self):
+        """
+        Returns the recorded steps (ordered by start time) with the total
+        wall time and the time spent in steps
+
+        """
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s['start'])
+            end = self._end or time.time()
+        return {
+            'project': self.project_name,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._start)),
+            'seconds': end - self._start,
+            'step_seconds': sum([s['seconds'] for s in steps]),
+            'ok': all([s['ok'] for s in steps]),
+            'steps': steps,
+        }
+
+def format_report(report):
+    """
+    Formats provisioning timings (see Timings.report)
+
+    """
+    lines = ['{0:<20} {1:>9} {2:>9} {3:>6} {4:>9}'.format('step', 'start s', 'seconds', 'exit', 'commands')]
+    for s in report['steps']:
+        lines.append('{0:<20} {1:>9.2f} {2:>9.2f} {3:>6} {4:>9}{5}'.format(s['name'], s['start'], \
+            s['seconds'], '-' if s['returncode'] is None else s['returncode'], len(s['commands']), \
+            '' if s['ok'] else '  FAILED'))
+    lines.append('')
+    lines.append('{0}: {1:.2f}s wall, {2:.2f}s in steps ({3:.2f}s overlapped)'.format(report['project'], \
+        report['seconds'], report['step_seconds'], max(0.0, report['step_seconds'] - report['seconds'])))
+    return '\n'.join(lines)
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+import logging
+import threading
+from ignition import benchmark
+from ignition import startup
+from ignition.common import get_process_tree
+
+# uwsgi cheaper algorithms:
+#   spare: spawns step workers when all are busy, stops one idle worker
+#       every overload seconds
+#   backlog: spawns when more than overload requests wait in the listen
+#       queue (Linux, TCP sockets only)
+#   busyness: keeps the average worker busyness between min and max
+#       percent, measured over overload seconds
+PROFILES = [
+    'spare',
+    'backlog',
+    'busyness',
+]
+# seconds between scaling decisions (spare, busyness)
+OVERLOAD = 5
+# queued requests that trigger a spawn (backlog)
+BACKLOG_OVERLOAD = 8
+# target average busyness (percent)
+BUSYNESS_MIN = 25
+BUSYNESS_MAX = 50
+# idle cycles before stopping a worker (busyness)
+BUSYNESS_MULTIPLIER = 2
+# options set by the profiles (removed while measuring memory)
+UWSGI_OPTIONS = ['cheaper-algo', 'cheaper-step', 'cheaper-overload', 'cheaper-busyness-min', \
+    'cheaper-busyness-max', 'cheaper-busyness-multiplier', 'cheaper-busyness-backlog-alert', \
+    'cheaper-busyness-backlog-step']
+# verification ramp (concurrent clients per step; 0 is idle)
+DEFAULT_RAMP = [1, 4, 16, 32, 16, 4, 1, 0, 0]
+SAMPLE_INTERVAL = 0.5
+
+def get_step(limits):
+    """
+    Returns the number of workers spawned at once: the range between the
+    cheaper minimum and the maximum is covered in about four steps
+
+    """
+    return max(1, (limits['processes'] - limits['cheaper'] + 3) // 4)
+
+def get_options(profile, limits):
+    """
+    Returns the uWSGI options for a scaling profile as a list of
+    (option, value)
+
+    :keyword profile: Scaling profile (see PROFILES)
+    :keyword limits: Process bounds (see ignition.memory.get_limits); the
+        maximum is 'processes' and the minimum 'cheaper'
+
+    """
+    if profile not in PROFILES:
+        raise ValueError('Unknown scaling profile: {0}'.format(profile))
+    if 'cheaper' not in limits:
+        # a single process can't scale
+        return []
+    options = [('cheaper-algo', profile), ('cheaper-step', get_step(limits))]
+    if profile == 'spare':
+        options.append(('cheaper-overload', OVERLOAD))
+    elif profile == 'backlog':
+        options.append(('cheaper-overload', BACKLOG_OVERLOAD))
+    elif profile == 'busyness':
+        options.extend([
+            ('cheaper-overload', OVERLOAD),
+            ('cheaper-busyness-min', BUSYNESS_MIN),
+            ('cheaper-busyness-max', BUSYNESS_MAX),
+            ('cheaper-busyness-multiplier', BUSYNESS_MULTIPLIER),
+            # spawn early when requests queue up (Linux)
+            ('cheaper-busyness-backlog-alert', BACKLOG_OVERLOAD),
+            ('cheaper-busyness-backlog-step', get_step(limits)),
+        ])
+    return options
+
+def add_uwsgi_options(cfg, profile, limits):
+    """
+    Adds the uWSGI options for a scaling profile (see get_options)
+
+    """
+    for k, v in get_options(profile, limits):
+        cfg.add(k, v)
+    return cfg
+
+def clamp_cheaper(cfg):
+    """
+    Keeps the cheaper mode settings of a uWSGI config below its process
+    count (uWSGI refuses to start when cheaper >= processes)
+
+    Tuned settings may lower the processes after the limits were set, so
+    this runs once the config is complete.  Cheaper mode is removed when a
+    single process is left.
+
+    """
+    processes = int(cfg.get('processes', 1))
+    if processes <= 1:
+        for k in set([x for x in cfg.keys() if x.startswith('cheaper')]):
+            cfg.remove(k)
+        return cfg
+    for k in ('cheaper', 'cheaper-initial'):
+        if cfg.get(k) and int(cfg.get(k)) >= processes:
+            cfg.set(k, processes - 1)
+    if cfg.get('cheaper'):
+        spare = processes - int(cfg.get('cheaper'))
+        for k in ('cheaper-step', 'cheaper-busyness-backlog-step'):
+            if cfg.get(k) and int(cfg.get(k)) > spare:
+                cfg.set(k, spare)
+    return cfg
+
+def count_workers(pid):
+    """
+    Returns the number of running workers of a uWSGI master
+
+    """
+    return len([x for x in get_process_tree(pid) if x != pid])
+
+def _sample_workers(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(count_workers(pid))
+        stop.wait(SAMPLE_INTERVAL)
+
+def verify(root_dir, project_name, ramp=DEFAULT_RAMP, duration=benchmark.DEFAULT_DURATION, path='/'):
+    """
+    Starts the project uWSGI instance and runs a load ramp, counting the
+    workers during each step
+
+    Returns a dict with the steps (concurrency, rps, p99 and the lowest,
+    highest and final worker count), the initial and peak worker counts,
+    and whether the workers scaled up and back down
+
+    """
+    log = logging.getLogger('scaling')
+    port = benchmark.get_free_port()
+    url = 'http://127.0.0.1:{0}{1}'.format(port, path)
+    p = benchmark.start_uwsgi(root_dir, project_name, port)
+    steps = []
+    try:
+        if not startup.wait_for_response(url, process=p):
+            raise benchmark.BenchmarkError('No response from uWSGI (see log/{0}_bench_uwsgi.log)'.format(\
+                project_name))
+        initial = count_workers(p.pid)
+        for concurrency in ramp:
+            samples = []
+            stop = threading.Event()
+            sampler = threading.Thread(target=_sample_workers, args=(p.pid, samples, stop))
+            sampler.daemon = True
+            sampler.start()
+            if concurrency:
+                result = benchmark.run_load(url, concurrency=concurrency, duration=duration)
+            else:
+                time.sleep(duration)
+                result = {'rps': 0.0, 'latency_ms': {'p99': 0.0}}
+            stop.set()
+            sampler.join()
+            samples.append(count_workers(p.pid))
+            step = {
+                'concurrency': concurrency,
+                'rps': result['rps'],
+                'p99': result['latency_ms']['p99'],
+                'workers_min': min(samples),
+                'workers_max': max(samples),
+                'workers_end': samples[-1],
+            }
+            log.info('{0} clients: {1:.1f} req/s, {2}-{3} workers'.format(concurrency, step['rps'], \
+                step['workers_min'], step['workers_max']))
+            steps.append(step)
+    finally:
+        benchmark.stop_uwsgi(p)
+    peak = max([s['workers_max'] for s in steps] or [initial])
+    return {
+        'project': project_name,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration': duration,
+        'initial': initial,
+        'peak': peak,
+        'steps': steps,
+        'scaled_up': peak > initial,
+        'scaled_down': bool(steps) and steps[-1]['workers_end'] < peak,
+    }
+
+def format_ramp(report):
+    """
+    Formats a verification run (see verify)
+
+    """
+    lines = ['{0:>8} {1:>10} {2:>10} {3:>12} {4:>8}'.format('clients', 'req/s', 'p99 ms', 'workers', 'end')]
+    for s in report['steps']:
+        lines.append('{0:>8} {1:>10.1f} {2:>10.2f} {3:>12} {4:>8}'.format(s['concurrency'], s['rps'], \
+            s['p99'], '{0}-{1}'.format(s['workers_min'], s['workers_max']), s['workers_end']))
+    lines.append('')
+    lines.append('workers: {0} at start, {1} at peak; scaled up: {2}, scaled down: {3}'.format(\
+        report['initial'], report['peak'], 'yes' if report['scaled_up'] else 'no', \
+        'yes' if report['scaled_down'] else 'no'))
+    return '\n'.join(lines)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import logging
+import multiprocessing
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILES = [
+    'cpu-bound',
+    'io-bound',
+    'memory-constrained',
+]
+DEFAULT_PROFILE = 'io-bound'
+
+# per profile tuning:
+#   workers_per_cpu: uWSGI processes per core
+#   threads: uWSGI threads per process
+#   worker_mem: estimated memory (MB) per uWSGI process
+#   mem_share: fraction of physical memory the stack may use
+#   max_connections: upper bound for Nginx worker_connections
+PROFILE_SETTINGS = {
+    'cpu-bound': {
+        'workers_per_cpu': 1,
+        'threads': 1,
+        'worker_mem': 64,
+        'mem_share': 0.75,
+        'max_connections': 2048,
+    },
+    'io-bound': {
+        'workers_per_cpu': 2,
+        'threads': 4,
+        'worker_mem': 64,
+        'mem_share': 0.75,
+        'max_connections': 4096,
+    },
+    'memory-constrained': {
+        'workers_per_cpu': 0.5,
+        'threads': 2,
+        'worker_mem': 64,
+        'mem_share': 0.5,
+        'max_connections': 1024,
+    },
+}
+
+# fallbacks when the host can't be inspected
+DEFAULT_MEMORY = 512 * 1024 * 1024
+DEFAULT_NOFILE = 1024
+DEFAULT_SOMAXCONN = 128
+MAX_NOFILE = 65536
+
+def get_host_resources():
+    """
+    Reads the core count, physical memory (bytes), open file limit and
+    listen backlog limit of the current host
+
+    """
+    log = logging.getLogger('sizing')
+    try:
+        cpus = multiprocessing.cpu_count()
+    except NotImplementedError:
+        log.warn('Unable to determine CPU count; assuming 1')
+        cpus = 1
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        log.warn('Unable to determine physical memory; assuming {0} bytes'.format(DEFAULT_MEMORY))
+        memory = DEFAULT_MEMORY
+    nofile = DEFAULT_NOFILE
+    if resource:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        # nginx raises its own soft limit up to the hard limit
+        if hard == resource.RLIM_INFINITY or hard > MAX_NOFILE:
+            nofile = MAX_NOFILE
+        else:
+            nofile = hard
+    somaxconn = DEFAULT_SOMAXCONN
+    if os.path.exists('/proc/sys/net/core/somaxconn'):
+        with open('/proc/sys/net/core/somaxconn', 'r') as f:
+            try:
+                somaxconn = int(f.read().strip())
+            except ValueError:
+                pass
+    return {
+        'cpus': cpus,
+        'memory': memory,
+        'nofile': nofile,
+        'somaxconn': somaxconn,
+    }
+
+def calculate_sizing(profile=DEFAULT_PROFILE, resources=None):
+    """
+    Calculates uWSGI and Nginx worker settings for the host
+
+    :keyword profile: Workload profile (see PROFILES)
+    :keyword resources: Host resources (defaults to get_host_resources())
+
+    Returns a dict with the keys cpus, memory, processes, threads, listen,
+    worker_processes, worker_connections and worker_rlimit_nofile
+
+    """
+    if profile not in PROFILE_SETTINGS:
+        raise ValueError('Unknown sizing profile: {0}'.format(profile))
+    settings = PROFILE_SETTINGS[profile]
+    if not resources:
+        resources = get_host_resources()
+    cpus = max(1, resources['cpus'])
+    # uwsgi processes bounded by the memory available to the stack
+    processes = max(1, int(cpus * settings['workers_per_cpu']))
+    mem_mb = resources['memory'] / (1024 * 1024)
+    mem_processes = int(mem_mb * settings['mem_share'] / settings['worker_mem'])
+    processes = max(1, min(processes, mem_processes))
+    threads = settings['threads']
+    # listen queue sized for bursts but never past the kernel limit
+    listen = min(resources['somaxconn'], max(100, processes * threads * 16))
+    # nginx
+    worker_processes = max(1, min(cpus, int(cpus * settings['workers_per_cpu'])))
+    worker_rlimit_nofile = resources['nofile']
+    # each proxied request uses two descriptors (client + upstream)
+    worker_connections = max(32, min(worker_rlimit_nofile // 2, \
+        settings['max_connections']))
+    return {
+        'cpus': cpus,
+        'memory': resources['memory'],
+        'processes': processes,
+        'threads': threads,
+        'listen': listen,
+        'worker_processes': worker_processes,
+        'worker_connections': worker_connections,
+        'worker_rlimit_nofile': worker_rlimit_nofile,
+    }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import time
+import socket
+import logging
+from ignition import benchmark
+from ignition.common import run_command, get_process_tree, get_process_rss, get_process_uss
+
+# seconds to wait for the first response when measuring startup
+START_TIMEOUT = 60
+# seconds of load used to make every worker serve requests before measuring
+WARMUP = 2
+
+PRELOAD_TEMPLATE = '''# preload module for {project} (generated; do not edit)
+#
+# uWSGI imports this in the master before forking so the workers share
+# the imported modules (and the app) copy-on-write.
+import gc
+import sys
+
+for name in {modules!r}:
+    try:
+        __import__(name)
+    except Exception as e:
+        sys.stderr.write('preload: unable to import {{0}}: {{1}}\\n'.format(name, e))
+'''
+
+GC_FREEZE = '''
+# move everything imported so far out of the collector so that collections
+# in the workers don't touch (and copy) the shared pages
+gc.collect()
+if hasattr(gc, 'freeze'):
+    gc.freeze()
+'''
+
+def get_preload_module(project_name, modules, gc_freeze=False):
+    """
+    Returns the source of the preload module imported by the uWSGI master
+
+    :keyword modules: Modules to import (the app module last)
+    :keyword gc_freeze: Freeze the garbage collector after importing
+        (Python 3.7+; ignored on older versions)
+
+    """
+    source = PRELOAD_TEMPLATE.format(project=project_name, modules=list(modules))
+    if gc_freeze:
+        source += GC_FREEZE
+    return source
+
+def compile_bytecode(python, paths):
+    """
+    Precompiles the bytecode of the given trees with the virtualenv python
+
+    Returns True if everything compiled
+
+    """
+    log = logging.getLogger('startup')
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return True
+    ret, out = run_command([python, '-m', 'compileall', '-q'] + paths)
+    if ret != 0:
+        log.warn('Unable to compile all bytecode:\n{0}'.format(out))
+        return False
+    return True
+
+def wait_for_response(url, timeout=START_TIMEOUT, process=None):
+    """
+    Waits for the first HTTP response (of any status) from a URL
+
+    Returns True if the server responded
+
+    """
+    # urllib2 is slow to import and only needed here
+    try:
+        from urllib2 import urlopen, HTTPError, URLError
+    except ImportError:
+        from urllib.request import urlopen
+        from urllib.error import HTTPError, URLError
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            return False
+        try:
+            urlopen(url, timeout=timeout).close()
+            return True
+        except HTTPError:
+            return True
+        except (URLError, socket.error):
+            time.sleep(0.05)
+    return False
+
+def measure_startup(root_dir, project_name, overrides=None, path='/'):
+    """
+    Starts the project uWSGI instance and measures the time to the first
+    response and the memory of each worker after serving requests
+
+    Unique memory (USS) is what a worker doesn't share with the master;
+    the less the workers load after forking, the lower it is.
+
+    Returns a dict with cold_start (seconds), workers (pid, rss and uss in
+    bytes) and mean_uss
+
+    """
+    port = benchmark.get_free_port()
+    url = 'http://127.0.0.1:{0}{1}'.format(port, path)
+    started = time.time()
+    p = benchmark.start_uwsgi(root_dir, project_name, port, overrides)
+    try:
+        if not wait_for_response(url, process=p):
+            raise benchmark.BenchmarkError('No response from uWSGI (see log/{0}_bench_uwsgi.log)'.format(\
+                project_name))
+        cold_start = time.time() - started
+        workers = [x for x in get_process_tree(p.pid) if x != p.pid]
+        benchmark.run_load(url, concurrency=max(1, len(workers)) * 2, duration=WARMUP)
+        stats = []
+        for pid in workers:
+            stats.append({'pid': pid, 'rss': get_process_rss(pid, children=False), \
+                'uss': get_process_uss(pid)})
+    finally:
+        benchmark.stop_uwsgi(p)
+    return {
+        'cold_start': cold_start,
+        'workers': stats,
+        'mean_uss': sum([x['uss'] for x in stats]) / len(stats) if stats else 0,
+    }
+
+def compare_startup(root_dir, project_name, path='/'):
+    """
+    Measures startup with the app loaded by each worker (lazy-apps) and
+    preloaded by the master (the project config)
+
+    """
+    log = logging.getLogger('startup')
+    results = {}
+    for name, overrides in (('lazy', {'lazy-apps': True, 'import': None}), ('preload', {'lazy-apps': False})):
+        log.info('Measuring startup ({0})'.format(name))
+        results[name] = measure_startup(root_dir, project_name, overrides, path)
+    return results
+
+def format_comparison(results):
+    """
+    Formats a startup comparison (see compare_startup)
+
+    """
+    lines = ['{0:<10} {1:>14} {2:>9} {3:>16}'.format('mode', 'cold start ms', 'workers', 'mean worker USS')]
+    for name in ('lazy', 'preload'):
+        r = results[name]
+        lines.append('{0:<10} {1:>14.1f} {2:>9} {3:>13.1f} MB'.format(name, r['cold_start'] * 1000, \
+            len(r['workers']), r['mean_uss'] / (1024.0 * 1024)))
+    return '\n'.join(lines)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+from ignition.config import Directive, parse_nginx
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# build state (sources and generated files) kept in each static dir
+STATE_FILE = '.ignition-static.json'
+# maps source paths to fingerprinted paths for the application
+MANIFEST_FILE = 'staticmanifest.json'
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.html', '.htm', '.svg', '.json', '.txt', \
+    '.xml', '.map', '.ico', '.ttf', '.otf', '.eot')
+# smaller files don't benefit from compression
+MIN_COMPRESS_SIZE = 256
+
+# matches the fingerprinted names created by build_static
+FINGERPRINT_REGEX = r'\.[0-9a-f]{8}\.\w+$'
+
+def _file_hash(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _fingerprint_name(rel_path, digest):
+    base, ext = os.path.splitext(rel_path)
+    return '{0}.{1}{2}'.format(base, digest[:8], ext)
+
+def _compress(path):
+    """
+    Writes gzip (and brotli if available) versions of a file next to it
+
+    Returns the list of files written
+
+    """
+    written = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    gz_path = path + '.gz'
+    with open(gz_path, 'wb') as raw:
+        # fixed mtime keeps the output identical between builds
+        gz = gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=raw, mtime=0)
+        gz.write(data)
+        gz.close()
+    if os.path.getsize(gz_path) < len(data):
+        written.append(gz_path)
+    else:
+        os.remove(gz_path)
+    if brotli:
+        compressed = brotli.compress(data)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+            written.append(path + '.br')
+    return written
+
+def _remove(static_dir, rel_paths):
+    for rel in rel_paths:
+        path = os.path.join(static_dir, rel)
+        if os.path.exists(path):
+            os.remove(path)
+
+def build_static(static_dir, fingerprint=True):
+    """
+    Pre-compresses and fingerprints the files in a static directory
+
+    Only files that changed since the last build are processed.  For each
+    file a copy named with a content hash (i.e. app.1a2b3c4d.css) is
+    written for long lived caching, and .gz (and .br when the brotli module
+    is installed) versions are written next to it for gzip_static.
+
+    :keyword static_dir: Path to the static directory
+    :keyword fingerprint: Create fingerprinted copies
+
+    Returns a dict with the number of processed, unchanged and removed files
+
+    """
+    log = logging.getLogger('static')
+    state_file = os.path.join(static_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+    generated = set([STATE_FILE, MANIFEST_FILE])
+    for entry in state.values():
+        generated.update(entry['outputs'])
+    counts = {'processed': 0, 'unchanged': 0, 'removed': 0}
+    new_state = {}
+    for root, dirs, files in os.walk(static_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir)
+            if rel in generated or rel.endswith(('.gz', '.br')):
+                continue
+            st = os.stat(path)
+            prev = state.get(rel)
+            if prev and prev['mtime'] == st.st_mtime and prev['size'] == st.st_size:
+                new_state[rel] = prev
+                counts['unchanged'] += 1
+                continue
+            digest = _file_hash(path)
+            if prev:
+                _remove(static_dir, prev['outputs'])
+            outputs = []
+            targets = [path]
+            if fingerprint:
+                fp_rel = _fingerprint_name(rel, digest)
+                shutil.copy2(path, os.path.join(static_dir, fp_rel))
+                outputs.append(fp_rel)
+                targets.append(os.path.join(static_dir, fp_rel))
+            if rel.lower().endswith(COMPRESS_EXTENSIONS) and st.st_size >= MIN_COMPRESS_SIZE:
+                for target in targets:
+                    outputs.extend([os.path.relpath(x, static_dir) for x in _compress(target)])
+            new_state[rel] = {'mtime': st.st_mtime, 'size': st.st_size, \
+                'hash': digest, 'outputs': outputs}
+            counts['processed'] += 1
+    # clean up generated files for sources that no longer exist
+    for rel in set(state) - set(new_state):
+        _remove(static_dir, state[rel]['outputs'])
+        counts['removed'] += 1
+    with open(state_file, 'w') as f:
+        json.dump(new_state, f, indent=1, sort_keys=True)
+    if fingerprint:
+        manifest = {}
+        for rel, entry in new_state.items():
+            if entry['outputs']:
+                manifest[rel] = entry['outputs'][0]
+        with open(os.path.join(static_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    log.debug('Built static files in {0}: {1}'.format(static_dir, counts))
+    return counts
+
+def get_static_location(static_dir, alias, brotli_static=False):
+    """
+    Returns a tuned Nginx location serving a static directory
+
+    The location is a ^~ prefix so requests never fall through to uWSGI.
+    Fingerprinted files are cached forever, everything else for an hour.
+
+    :keyword static_dir: Path to the static directory
+    :keyword alias: URL path for the directory (i.e. /static)
+    :keyword brotli_static: Serve .br files (requires the ngx_brotli module)
+
+    """
+    loc = Directive('location', ['^~', '/' + alias.strip('/') + '/'], [])
+    loc.add(Directive('alias', [static_dir.rstrip('/') + '/']))
+    loc.add(Directive('gzip_static', ['on']))
+    if brotli_static:
+        loc.add(Directive('brotli_static', ['on']))
+    loc.add(Directive('expires', ['1h']))
+    loc.add(Directive('add_header', ['Cache-Control', 'public']))
+    loc.add(Directive('open_file_cache', ['max=10000', 'inactive=120s']))
+    loc.add(Directive('open_file_cache_valid', ['60s']))
+    loc.add(Directive('open_file_cache_min_uses', [2]))
+    loc.add(Directive('open_file_cache_errors', ['on']))
+    loc.add(Directive('access_log', ['off']))
+    loc.add(Directive('location', ['~', '"{0}"'.format(FINGERPRINT_REGEX)], [
+        Directive('expires', ['max']),
+        Directive('add_header', ['Cache-Control', '"public, immutable"']),
+    ]))
+    return loc
+
+def find_static_dirs(nginx_config):
+    """
+    Returns the static directories (alias paths) in an Nginx config
+
+    :keyword nginx_config: Config text
+
+    """
+    dirs = []
+    for d in parse_nginx(nginx_config).find_all('alias', recursive=True):
+        path = d.args[0].strip('"\'').rstrip('/')
+        if path and path not in dirs:
+            dirs.append(path)
+    return dirs
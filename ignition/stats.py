@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import json
+import time
+import socket
+from ignition.common import get_uwsgi_configs
+from ignition.config import parse_uwsgi, parse_nginx
+
+# nginx stub_status location (only reachable from the host)
+NGINX_STATUS_PATH = '/nginx_status'
+DEFAULT_INTERVAL = 2
+
+class StatsError(Exception):
+    pass
+
+def get_stats_socket(root_dir, project_name):
+    """
+    Returns the path to the uWSGI stats socket for a project
+
+    """
+    return os.path.join(root_dir, 'var', '{0}_stats.sock'.format(project_name))
+
+def read_uwsgi_stats(address, timeout=5):
+    """
+    Reads the JSON document served by a uWSGI stats socket
+
+    :keyword address: Unix socket path or host:port
+
+    """
+    if address.startswith('/'):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        target = address
+    else:
+        host, port = address.rsplit(':', 1)
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target = (host or '127.0.0.1', int(port))
+    s.settimeout(timeout)
+    data = []
+    try:
+        s.connect(target)
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+    except socket.error as e:
+        raise StatsError('Unable to read uWSGI stats from {0}: {1}'.format(address, e))
+    finally:
+        s.close()
+    try:
+        return json.loads(b''.join(data).decode('utf-8'))
+    except ValueError as e:
+        raise StatsError('Invalid uWSGI stats from {0}: {1}'.format(address, e))
+
+def parse_stub_status(text):
+    """
+    Parses the Nginx stub_status page
+
+    Returns a dict with active, accepts, handled, requests, reading,
+    writing and waiting
+
+    """
+    numbers = [int(x) for x in re.findall(r'\d+', text)]
+    if len(numbers) != 7:
+        raise StatsError('Unexpected stub_status output: {0}'.format(text))
+    keys = ['active', 'accepts', 'handled', 'requests', 'reading', 'writing', 'waiting']
+    return dict(zip(keys, numbers))
+
+def read_nginx_status(url, host=None, timeout=5):
+    """
+    Reads an Nginx stub_status page
+
+    :keyword host: Host header (for name based virtual servers)
+
+    """
+    # urllib2 is slow to import and only needed here
+    try:
+        from urllib2 import Request, urlopen, URLError
+    except ImportError:
+        from urllib.request import Request, urlopen
+        from urllib.error import URLError
+    req = Request(url)
+    if host:
+        req.add_header('Host', host)
+    try:
+        f = urlopen(req, timeout=timeout)
+        try:
+            return parse_stub_status(f.read().decode('utf-8'))
+        finally:
+            f.close()
+    except (URLError, socket.error) as e:
+        raise StatsError('Unable to read Nginx status from {0}: {1}'.format(url, e))
+
+def get_endpoints(root_dir, project_name):
+    """
+    Returns the uWSGI stats addresses and the Nginx status URL and Host
+    header for a project (from its generated configs)
+
+    'uwsgi' is the stats address of the first instance and
+    'uwsgi_instances' lists the addresses of every instance.
+
+    """
+    nginx_config = os.path.join(root_dir, 'conf', '{0}_nginx.conf'.format(project_name))
+    endpoints = {'uwsgi': None, 'uwsgi_instances': [], 'nginx': None, 'host': None}
+    for uwsgi_config in get_uwsgi_configs(root_dir, project_name):
+        if not os.path.exists(uwsgi_config):
+            continue
+        with open(uwsgi_config, 'r') as f:
+            address = parse_uwsgi(f.read()).get('stats')
+        if address:
+            endpoints['uwsgi_instances'].append(address)
+    if endpoints['uwsgi_instances']:
+        endpoints['uwsgi'] = endpoints['uwsgi_instances'][0]
+    if os.path.exists(nginx_config):
+        with open(nginx_config, 'r') as f:
+            cfg = parse_nginx(f.read())
+        # with TLS the status location is on the plain HTTP server
+        servers = [x for x in cfg.find_all('server', recursive=True) if x.is_block() and \
+            x.find('location', ['=', NGINX_STATUS_PATH])]
+        server = servers[0] if servers else None
+        if server:
+            port = server.find('listen').args[0].rsplit(':', 1)[-1]
+            endpoints['nginx'] = 'http://127.0.0.1:{0}{1}'.format(port, NGINX_STATUS_PATH)
+            if server.find('server_name'):
+                endpoints['host'] = server.find('server_name').args[0]
+    return endpoints
+
+def merge_uwsgi_stats(instances):
+    """
+    Combines the stats of the uWSGI instances of a project: queue numbers
+    are summed and every worker is tagged with its instance
+
+    :keyword instances: List of (instance number, stats)
+
+    """
+    merged = {'listen_queue': 0, 'listen_queue_errors': 0, 'workers': []}
+    for instance, data in instances:
+        merged['listen_queue'] += data.get('listen_queue', 0)
+        merged['listen_queue_errors'] += data.get('listen_queue_errors', 0)
+        for w in data.get('workers', []):
+            merged['workers'].append(dict(w, instance=instance))
+    return merged
+
+def collect(root_dir, project_name):
+    """
+    Takes a snapshot of the project uWSGI and Nginx stats
+
+    Sources that are not configured or not reachable are None (errors are
+    listed under 'errors').
+
+    """
+    endpoints = get_endpoints(root_dir, project_name)
+    snapshot = {'project': project_name, 'time': time.time(), 'uwsgi': None, 'nginx': None, \
+        'errors': []}
+    instances = []
+    for i, address in enumerate(endpoints['uwsgi_instances']):
+        try:
+            instances.append((i, read_uwsgi_stats(address)))
+        except StatsError as e:
+            snapshot['errors'].append(str(e))
+    if len(endpoints['uwsgi_instances']) > 1:
+        # instances behind the same upstream
+        snapshot['uwsgi'] = merge_uwsgi_stats(instances) if instances else None
+    elif instances:
+        snapshot['uwsgi'] = instances[0][1]
+    if endpoints['nginx']:
+        try:
+            snapshot['nginx'] = read_nginx_status(endpoints['nginx'], endpoints['host'])
+        except StatsError as e:
+            snapshot['errors'].append(str(e))
+    return snapshot
+
+def summarize(snapshot, previous=None):
+    """
+    Returns per-worker and server metrics for a snapshot
+
+    Request rates are calculated from the previous snapshot (if any).
+
+    """
+    elapsed = snapshot['time'] - previous['time'] if previous else 0
+    summary = {'project': snapshot['project'], 'workers': [], 'listen_queue': None, \
+        'listen_queue_errors': None, 'nginx': snapshot['nginx'], 'nginx_rps': None}
+    uwsgi = snapshot['uwsgi']
+    if uwsgi:
+        prev_requests = {}
+        if previous and previous['uwsgi']:
+            for w in previous['uwsgi'].get('workers', []):
+                prev_requests[(w.get('instance'), w['id'])] = w['requests']
+        summary['listen_queue'] = uwsgi.get('listen_queue', 0)
+        summary['listen_queue_errors'] = uwsgi.get('listen_queue_errors', 0)
+        for w in uwsgi.get('workers', []):
+            rps = None
+            key = (w.get('instance'), w['id'])
+            if elapsed and key in prev_requests:
+                rps = max(0, w['requests'] - prev_requests[key]) / elapsed
+            summary['workers'].append({
+                'instance': w.get('instance'),
+                'id': w['id'],
+                'pid': w.get('pid'),
+                'status': w.get('status'),
+                'requests': w['requests'],
+                'rps': rps,
+                'rss': w.get('rss', 0),
+                # avg_rt is in microseconds
+                'avg_rt_ms': w.get('avg_rt', 0) / 1000.0,
+            })
+    if elapsed and snapshot['nginx'] and previous and previous['nginx']:
+        summary['nginx_rps'] = max(0, snapshot['nginx']['requests'] - \
+            previous['nginx']['requests']) / elapsed
+    return summary
+
+def format_summary(summary):
+    """
+    Formats a stats summary for the console
+
+    """
+    lines = []
+    if summary['listen_queue'] is not None:
+        lines.append('uWSGI listen queue: {0} (overflows: {1})'.format(summary['listen_queue'], \
+            summary['listen_queue_errors']))
+        lines.append('{0:>6} {1:>8} {2:>8} {3:>10} {4:>9} {5:>9} {6:>11}'.format('worker', 'pid', \
+            'status', 'requests', 'req/s', 'rss MB', 'avg rt ms'))
+        for w in summary['workers']:
+            # <instance>/<worker> with several instances
+            worker = w['id'] if w.get('instance') is None else '{0}/{1}'.format(w['instance'], w['id'])
+            lines.append('{0:>6} {1:>8} {2:>8} {3:>10} {4:>9} {5:>9.1f} {6:>11.2f}'.format(worker, \
+                w['pid'], w['status'], w['requests'], '-' if w['rps'] is None else \
+                '{0:.1f}'.format(w['rps']), w['rss'] / (1024.0 * 1024), w['avg_rt_ms']))
+    nginx = summary['nginx']
+    if nginx:
+        lines.append('Nginx: {0} active ({1} reading, {2} writing, {3} waiting), {4} requests{5}'.format(\
+            nginx['active'], nginx['reading'], nginx['writing'], nginx['waiting'], nginx['requests'], \
+            '' if summary['nginx_rps'] is None else ', {0:.1f} req/s'.format(summary['nginx_rps'])))
+    return '\n'.join(lines)
+
+def format_prometheus(snapshot):
+    """
+    Formats a snapshot in the Prometheus text exposition format
+
+    """
+    project = snapshot['project']
+    metrics = []
+
+    def metric(name, kind, help, samples):
+        metrics.append('# HELP {0} {1}'.format(name, help))
+        metrics.append('# TYPE {0} {1}'.format(name, kind))
+        for labels, value in samples:
+            labels = dict(labels, project=project)
+            metrics.append('{0}{{{1}}} {2}'.format(name, ','.join(['{0}="{1}"'.format(k, v) \
+                for k, v in sorted(labels.items())]), value))
+
+    def worker(w):
+        # 'instance' is the scrape target label in Prometheus
+        if w.get('instance') is None:
+            return {'worker': w['id']}
+        return {'worker': w['id'], 'uwsgi_instance': w['instance']}
+
+    uwsgi = snapshot['uwsgi']
+    if uwsgi:
+        workers = uwsgi.get('workers', [])
+        metric('uwsgi_listen_queue', 'gauge', 'Requests waiting in the listen queue', \
+            [({}, uwsgi.get('listen_queue', 0))])
+        metric('uwsgi_listen_queue_errors_total', 'counter', 'Listen queue overflows', \
+            [({}, uwsgi.get('listen_queue_errors', 0))])
+        metric('uwsgi_worker_requests_total', 'counter', 'Requests handled by the worker', \
+            [(worker(w), w['requests']) for w in workers])
+        metric('uwsgi_worker_exceptions_total', 'counter', 'Exceptions raised in the worker', \
+            [(worker(w), w.get('exceptions', 0)) for w in workers])
+        metric('uwsgi_worker_rss_bytes', 'gauge', 'Resident memory of the worker', \
+            [(worker(w), w.get('rss', 0)) for w in workers])
+        metric('uwsgi_worker_avg_response_time_seconds', 'gauge', 'Average response time of the worker', \
+            [(worker(w), w.get('avg_rt', 0) / 1000000.0) for w in workers])
+        metric('uwsgi_worker_busy', 'gauge', 'Worker is handling a request', \
+            [(worker(w), int(w.get('status') == 'busy')) for w in workers])
+    nginx = snapshot['nginx']
+    if nginx:
+        metric('nginx_connections_active', 'gauge', 'Active client connections', \
+            [({}, nginx['active'])])
+        metric('nginx_connections', 'gauge', 'Client connections by state', \
+            [({'state': k}, nginx[k]) for k in ('reading', 'writing', 'waiting')])
+        metric('nginx_connections_accepted_total', 'counter', 'Accepted client connections', \
+            [({}, nginx['accepts'])])
+        metric('nginx_connections_handled_total', 'counter', 'Handled client connections', \
+            [({}, nginx['handled'])])
+        metric('nginx_http_requests_total', 'counter', 'Client requests', [({}, nginx['requests'])])
+    return '\n'.join(metrics) + '\n'
+
+def poll(root_dir, project_name, callback, interval=DEFAULT_INTERVAL, count=0):
+    """
+    Collects stats every interval seconds and passes each snapshot (and
+    the previous one) to callback
+
+    :keyword count: Number of snapshots to take (0 runs until interrupted)
+
+    """
+    previous = None
+    taken = 0
+    while True:
+        snapshot = collect(root_dir, project_name)
+        callback(snapshot, previous)
+        previous = snapshot
+        taken += 1
+        if count and taken >= count:
+            break
+        time.sleep(interval)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Project templates are ProjectCreator subclasses registered by name.
+# Packages add templates with an entry point in ENTRY_POINT_GROUP:
+#
+#   setup(...,
+#       entry_points={'ignition.templates': ['pyramid = ignition_pyramid:PyramidCreator']})
+#
+# Templates are listed from the entry point metadata; a template module is
+# only imported when the template is used.  Built-in templates are loaded
+# without reading any metadata.
+
+import os
+import sys
+import glob
+import logging
+import zipfile
+import threading
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:
+    from configparser import RawConfigParser
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+ENTRY_POINT_GROUP = 'ignition.templates'
+# templates shipped with ignition (also available without entry point metadata)
+BUILTIN_TEMPLATES = {
+    'django': 'ignition.django:DjangoCreator',
+    'flask': 'ignition.flask:FlaskCreator',
+}
+
+_creators = {}
+_lock = threading.Lock()
+
+def _read_entry_points(text, group):
+    # entry_points.txt is an ini file with a section per group
+    parser = RawConfigParser()
+    parser.optionxform = str
+    try:
+        (getattr(parser, 'read_file', None) or parser.readfp)(StringIO(text))
+    except Exception:
+        return []
+    if not parser.has_section(group):
+        return []
+    return [(k.strip(), v.replace(' ', '')) for k, v in parser.items(group)]
+
+def _scan_entry_points(group):
+    # reads entry_points.txt of the distributions on sys.path directly
+    # (importing pkg_resources costs more than the whole listing)
+    found = []
+    for path in sys.path:
+        path = path or os.curdir
+        if os.path.isdir(path):
+            files = glob.glob(os.path.join(path, '*.egg-info', 'entry_points.txt')) + \
+                glob.glob(os.path.join(path, '*.dist-info', 'entry_points.txt')) + \
+                glob.glob(os.path.join(path, '*.egg', 'EGG-INFO', 'entry_points.txt'))
+            if os.path.basename(path).endswith('.egg'):
+                files.append(os.path.join(path, 'EGG-INFO', 'entry_points.txt'))
+            for name in sorted(files):
+                try:
+                    with open(name, 'r') as f:
+                        found.extend(_read_entry_points(f.read(), group))
+                except IOError:
+                    continue
+        elif path.endswith('.egg') and zipfile.is_zipfile(path):
+            try:
+                z = zipfile.ZipFile(path)
+                try:
+                    text = z.read('EGG-INFO/entry_points.txt').decode('utf-8')
+                finally:
+                    z.close()
+            except (KeyError, IOError, zipfile.BadZipfile):
+                continue
+            found.extend(_read_entry_points(text, group))
+    return found
+
+def _iter_entry_points(group):
+    # (name, 'module:attr') from installed package metadata
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+    if metadata:
+        eps = metadata.entry_points()
+        if hasattr(eps, 'select'):
+            eps = eps.select(group=group)
+        else:
+            eps = eps.get(group, [])
+        return [(ep.name, ep.value) for ep in eps]
+    return _scan_entry_points(group)
+
+def find_templates():
+    """
+    Returns the available templates as a dict of name and 'module:class'
+    (nothing is imported)
+
+    """
+    log = logging.getLogger('templates')
+    templates = dict(BUILTIN_TEMPLATES)
+    for name, value in _iter_entry_points(ENTRY_POINT_GROUP):
+        name = name.lower()
+        if name in templates and templates[name] != value:
+            log.warn('Ignoring template {0} from {1} (already provided by {2})'.format(name, value, \
+                templates[name]))
+            continue
+        templates[name] = value
+    return templates
+
+def list_templates():
+    """
+    Returns the sorted names of the available templates
+
+    """
+    return sorted(find_templates().keys())
+
+def load_creator(template):
+    """
+    Imports and returns the creator class for a template
+
+    Returns None if the template is unknown or its creator can't be loaded
+
+    """
+    from ignition import ProjectCreator
+    log = logging.getLogger('templates')
+    template = template.lower()
+    with _lock:
+        if template in _creators:
+            return _creators[template]
+        value = BUILTIN_TEMPLATES.get(template) or find_templates().get(template)
+        if not value:
+            return None
+        module_name, _, attr = value.partition(':')
+        try:
+            __import__(module_name)
+            creator = sys.modules[module_name]
+            for part in attr.split('.'):
+                creator = getattr(creator, part)
+        except (ImportError, AttributeError) as e:
+            log.error('Unable to load template {0} ({1}): {2}'.format(template, value, e))
+            return None
+        if not isinstance(creator, type) or not issubclass(creator, ProjectCreator):
+            log.error('Template {0} ({1}) is not a ProjectCreator'.format(template, value))
+            return None
+        _creators[template] = creator
+        return creator
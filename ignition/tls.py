@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import logging
+import threading
+from ignition.common import run_command
+from ignition.config import Directive
+
+DEFAULT_PORT = 443
+PROTOCOLS = ['TLSv1.2', 'TLSv1.3']
+# forward secret AEAD suites, ECDSA first (TLSv1.3 suites are fixed by openssl)
+CIPHERS = ':'.join([
+    'ECDHE-ECDSA-AES128-GCM-SHA256',
+    'ECDHE-RSA-AES128-GCM-SHA256',
+    'ECDHE-ECDSA-AES256-GCM-SHA384',
+    'ECDHE-RSA-AES256-GCM-SHA384',
+    'ECDHE-ECDSA-CHACHA20-POLY1305',
+    'ECDHE-RSA-CHACHA20-POLY1305',
+])
+# sessions shared by all nginx workers (1m holds about 4000 sessions)
+SESSION_CACHE = 'shared:SSL:10m'
+SESSION_TIMEOUT = '1d'
+# smaller records so the first bytes of a response can be decrypted sooner
+BUFFER_SIZE = '4k'
+# self-signed certificates (local testing)
+CERT_DAYS = 365
+CERT_BITS = 2048
+# session reuse check: concurrent clients (openssl s_client -reconnect
+# connects once and then reconnects 5 times with the session)
+DEFAULT_CLIENTS = 8
+TIMEOUT = 30
+
+def get_certificate_paths(root_dir, project_name):
+    """
+    Returns the default certificate and key paths of a project
+
+    """
+    conf_dir = os.path.join(root_dir, 'conf')
+    return (os.path.join(conf_dir, '{0}_tls.crt'.format(project_name)), \
+        os.path.join(conf_dir, '{0}_tls.key'.format(project_name)))
+
+def get_ticket_key_path(root_dir, project_name):
+    return os.path.join(root_dir, 'conf', '{0}_tickets.key'.format(project_name))
+
+def create_self_signed(cert_file, key_file, server_name='localhost', days=CERT_DAYS):
+    """
+    Creates a self-signed certificate (for local testing) with openssl
+
+    Returns True if the certificate was created
+
+    """
+    log = logging.getLogger('tls')
+    args = ['openssl', 'req', '-x509', '-newkey', 'rsa:{0}'.format(CERT_BITS), '-nodes', \
+        '-keyout', key_file, '-out', cert_file, '-days', str(days), '-subj', '/CN={0}'.format(server_name)]
+    ret, out = run_command(args + ['-addext', 'subjectAltName=DNS:{0}'.format(server_name)])
+    if ret != 0:
+        # openssl < 1.1.1 has no -addext
+        ret, out = run_command(args)
+    if ret != 0:
+        log.error('Unable to create a self-signed certificate:\n{0}'.format(out))
+        return False
+    os.chmod(key_file, 0600)
+    return True
+
+def create_ticket_key(path):
+    """
+    Creates a session ticket key (80 random bytes) unless one exists
+
+    Tickets stay valid across nginx reloads and workers while the key is
+    kept; remove the file to rotate it.
+
+    Returns True if the key was created
+
+    """
+    if os.path.exists(path):
+        return False
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+    try:
+        os.write(fd, os.urandom(80))
+    finally:
+        os.close(fd)
+    return True
+
+def get_server_directives(cert_file, key_file, ticket_key=None):
+    """
+    Returns the TLS directives for an Nginx server block
+
+    :keyword ticket_key: Session ticket key file (see create_ticket_key);
+        without it nginx uses a random key per start
+
+    """
+    directives = [
+        Directive('ssl_certificate', [cert_file]),
+        Directive('ssl_certificate_key', [key_file]),
+        Directive('ssl_protocols', PROTOCOLS),
+        Directive('ssl_ciphers', [CIPHERS]),
+        Directive('ssl_prefer_server_ciphers', ['on']),
+        Directive('ssl_session_cache', [SESSION_CACHE]),
+        Directive('ssl_session_timeout', [SESSION_TIMEOUT]),
+        Directive('ssl_session_tickets', ['on']),
+    ]
+    if ticket_key:
+        directives.append(Directive('ssl_session_ticket_key', [ticket_key]))
+    directives.append(Directive('ssl_buffer_size', [BUFFER_SIZE]))
+    return directives
+
+def get_redirect_server(port, tls_port=DEFAULT_PORT, server_name=None, locations=[]):
+    """
+    Returns an Nginx server block redirecting HTTP requests to HTTPS
+
+    :keyword locations: Locations still served over HTTP (i.e. status pages)
+
+    """
+    server = Directive('server', children=[])
+    server.add(Directive('listen', ['0.0.0.0:{0}'.format(port)]))
+    if server_name:
+        server.add(Directive('server_name', [server_name]))
+    for loc in locations:
+        server.add(loc)
+    target = 'https://$host{0}$request_uri'.format('' if tls_port == DEFAULT_PORT else ':{0}'.format(tls_port))
+    server.add(Directive('location', ['/'], [Directive('return', [301, target])]))
+    return server
+
+def parse_s_client(output):
+    """
+    Parses the output of openssl s_client -reconnect
+
+    Returns a dict with the handshakes ('New' or 'Reused' for each
+    connection), the protocol and the ALPN protocol
+
+    """
+    handshakes = re.findall(r'^(New|Reused), ', output, re.M)
+    protocol = re.search(r'^\s*Protocol\s*:\s*(\S+)', output, re.M)
+    alpn = re.search(r'^ALPN protocol: (\S+)', output, re.M)
+    return {
+        'handshakes': handshakes,
+        'protocol': protocol.group(1) if protocol else None,
+        'alpn': alpn.group(1) if alpn else None,
+    }
+
+def check_session_reuse(host, port, server_name=None, clients=DEFAULT_CLIENTS, tickets=True):
+    """
+    Connects concurrent clients that each reconnect several times (with
+    openssl s_client) and counts the resumed handshakes
+
+    :keyword tickets: Resume with session tickets; otherwise with session
+        ids (the shared session cache)
+
+    Returns a dict with the connections, resumed connections, reuse rate
+    (of the reconnects), protocol and ALPN protocol (h2 with HTTP/2)
+
+    """
+    # s_client only resumes TLSv1.2 sessions with -reconnect (TLSv1.3
+    # tickets arrive after the handshake)
+    args = ['openssl', 's_client', '-connect', '{0}:{1}'.format(host, port), '-reconnect', \
+        '-tls1_2', '-alpn', 'h2,http/1.1']
+    if server_name:
+        args += ['-servername', server_name]
+    if not tickets:
+        args.append('-no_ticket')
+    results = []
+    lock = threading.Lock()
+
+    def client():
+        # s_client waits for stdin; an empty stdin closes each connection
+        ret, out = run_command(['sh', '-c', 'exec "$@" < /dev/null', 's_client'] + args)
+        if not isinstance(out, str):
+            out = out.decode('utf-8', 'replace')
+        with lock:
+            results.append(parse_s_client(out))
+    threads = [threading.Thread(target=client) for i in range(clients)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join(TIMEOUT)
+    connections = sum([len(r['handshakes']) for r in results])
+    reused = sum([r['handshakes'].count('Reused') for r in results])
+    # the first connection of each client is always a full handshake
+    reconnects = connections - len([r for r in results if r['handshakes']])
+    return {
+        'mode': 'tickets' if tickets else 'cache',
+        'clients': clients,
+        'connections': connections,
+        'reused': reused,
+        'reuse_rate': float(reused) / reconnects if reconnects > 0 else 0.0,
+        'protocol': ([r['protocol'] for r in results if r['protocol']] or [None])[0],
+        'alpn': ([r['alpn'] for r in results if r['alpn']] or [None])[0],
+    }
+
+def format_reuse(results):
+    """
+    Formats session reuse checks (see check_session_reuse)
+
+    """
+    lines = []
+    for r in results:
+        lines.append('TLS session reuse ({0}): {1}/{2} connections resumed ({3:.0f}% of reconnects), '\
+            '{4}, ALPN {5}'.format(r['mode'], r['reused'], r['connections'], r['reuse_rate'] * 100, \
+            r['protocol'] or 'unknown protocol', r['alpn'] or 'none'))
+    return '\n'.join(lines)
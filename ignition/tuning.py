@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+#   Copyright 2011 Evan Hazlett <ejhazlett@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import logging
+import threading
+from ignition import sizing
+from ignition import benchmark
+from ignition import scaling
+from ignition.common import get_process_rss, get_uwsgi_configs, write_file
+from ignition.config import parse_uwsgi
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_DURATION = 10
+# candidates within this fraction of the best throughput are compared on p99
+RPS_TOLERANCE = 0.05
+# highest error rate a candidate may have
+MAX_ERROR_RATE = 0.01
+# share of physical memory the uwsgi processes may use by default
+DEFAULT_MEMORY_SHARE = 0.5
+# uwsgi options searched (in order); async cores only when a loop engine is set
+PARAMETERS = ['processes', 'threads', 'gevent', 'asyncio', 'async', 'buffer-size', 'post-buffering']
+
+def parse_size(value):
+    """
+    Parses a size like 512M or 2g into bytes
+
+    """
+    value = str(value).strip().lower()
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def get_tuning_file(root_dir, project_name):
+    """
+    Returns the path to the tuned settings for a project
+
+    """
+    return os.path.join(root_dir, 'conf', '{0}_tuning.json'.format(project_name))
+
+def load_tuning(root_dir, project_name):
+    """
+    Returns the tuned settings for a project ({} if not tuned)
+
+    """
+    path = get_tuning_file(root_dir, project_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def get_candidates(cfg, resources=None):
+    """
+    Returns the candidate values for each tuned uWSGI option
+
+    :keyword cfg: Current uWSGI config (see ignition.config.UwsgiConfig)
+    :keyword resources: Host resources (defaults to sizing.get_host_resources())
+
+    """
+    if not resources:
+        resources = sizing.get_host_resources()
+    cpus = max(1, resources['cpus'])
+    candidates = {
+        'processes': sorted(set([max(1, cpus // 2), cpus, cpus * 2, cpus * 4])),
+        'threads': [1, 2, 4, 8],
+        'buffer-size': [4096, 8192, 32768],
+        'post-buffering': [8192, 65536, 16777216],
+    }
+    for engine in ('gevent', 'asyncio'):
+        if cfg.get(engine):
+            candidates[engine] = [100, 500, 1000]
+            # greenlets replace threads
+            candidates.pop('threads', None)
+    if cfg.get('async'):
+        candidates['async'] = [10, 50, 100]
+    return candidates
+
+def _sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], get_process_rss(pid))
+        stop.wait(0.2)
+
+def run_trial(root_dir, project_name, overrides, concurrency=DEFAULT_CONCURRENCY, \
+    duration=DEFAULT_DURATION, path='/'):
+    """
+    Starts uWSGI with the given option overrides and load tests it
+
+    Returns the load test result (see benchmark.run_load) with the peak
+    resident memory of the uWSGI processes added as 'rss'
+
+    """
+    port = benchmark.get_free_port()
+    p = benchmark.start_uwsgi(root_dir, project_name, port, overrides)
+    peak = [0]
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_rss, args=(p.pid, peak, stop))
+    sampler.daemon = True
+    sampler.start()
+    try:
+        result = benchmark.run_load('http://127.0.0.1:{0}{1}'.format(port, path), \
+            concurrency=concurrency, duration=duration)
+    finally:
+        stop.set()
+        sampler.join()
+        benchmark.stop_uwsgi(p)
+    result['rss'] = peak[0]
+    result['overrides'] = overrides
+    return result
+
+def is_feasible(result, memory_budget=None, max_p99=None):
+    """
+    Returns True if a trial is within the error, memory and latency limits
+
+    """
+    if result['error_rate'] > MAX_ERROR_RATE:
+        return False
+    if memory_budget and result['rss'] > memory_budget:
+        return False
+    if max_p99 and result['latency_ms']['p99'] > max_p99:
+        return False
+    return True
+
+def is_better(result, best):
+    """
+    Returns True if a trial beats the current best
+
+    Throughput wins unless both are within RPS_TOLERANCE, in which case the
+    lower p99 latency wins.
+
+    """
+    if best is None:
+        return True
+    if abs(result['rps'] - best['rps']) <= RPS_TOLERANCE * max(result['rps'], best['rps']):
+        return result['latency_ms']['p99'] < best['latency_ms']['p99']
+    return result['rps'] > best['rps']
+
+def tune(root_dir, project_name, concurrency=DEFAULT_CONCURRENCY, duration=DEFAULT_DURATION, \
+    path='/', memory_budget=None, max_p99=None, trial=run_trial, resources=None):
+    """
+    Searches uWSGI worker and buffer settings for the project
+
+    Each option is varied in turn while the others are kept at their best
+    value so far (a coordinate search), so the number of trials grows with
+    the number of candidates rather than their product.
+
+    :keyword concurrency: Concurrent clients for each trial
+    :keyword duration: Seconds per trial
+    :keyword memory_budget: Maximum resident memory (bytes) of the uWSGI
+        processes (default: DEFAULT_MEMORY_SHARE of physical memory)
+    :keyword max_p99: Maximum p99 latency (ms)
+    :keyword trial: Function running a single trial (see run_trial)
+
+    Returns a dict with the best settings and all trial results
+
+    """
+    log = logging.getLogger('tuning')
+    if not resources:
+        resources = sizing.get_host_resources()
+    if memory_budget is None:
+        memory_budget = int(resources['memory'] * DEFAULT_MEMORY_SHARE)
+    uwsgi_config = os.path.join(root_dir, 'conf', '{0}_uwsgi.ini'.format(project_name))
+    if not os.path.exists(uwsgi_config):
+        raise benchmark.BenchmarkError('Unable to find uWSGI config: {0}'.format(uwsgi_config))
+    with open(uwsgi_config, 'r') as f:
+        cfg = parse_uwsgi(f.read())
+    candidates = get_candidates(cfg, resources)
+    current = {}
+    for k in PARAMETERS:
+        if k in candidates:
+            current[k] = int(cfg.get(k, 1 if k == 'threads' else candidates[k][0]))
+    trials = {}
+
+    def run(settings):
+        key = tuple(sorted(settings.items()))
+        if key not in trials:
+            log.info('Trying {0}'.format(', '.join(['{0}={1}'.format(k, v) for k, v in key])))
+            result = trial(root_dir, project_name, dict(settings), concurrency=concurrency, \
+                duration=duration, path=path)
+            result['feasible'] = is_feasible(result, memory_budget, max_p99)
+            log.info('{0:.1f} req/s, p99 {1:.2f} ms, {2} MB{3}'.format(result['rps'], \
+                result['latency_ms']['p99'], result['rss'] // (1024 * 1024), \
+                '' if result['feasible'] else ' (over limits)'))
+            trials[key] = result
+        return trials[key]
+
+    best = None
+    baseline = run(current)
+    if baseline['feasible']:
+        best = baseline
+    for k in PARAMETERS:
+        if k not in candidates:
+            continue
+        for value in candidates[k]:
+            settings = dict(best['overrides'] if best else current)
+            settings[k] = value
+            result = run(settings)
+            if result['feasible'] and is_better(result, best):
+                best = result
+    return {
+        'project': project_name,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'concurrency': concurrency,
+        'duration': duration,
+        'memory_budget': memory_budget,
+        'max_p99': max_p99,
+        'baseline': baseline,
+        'best': best,
+        'trials': list(trials.values()),
+    }
+
+def apply_tuning(root_dir, project_name, settings):
+    """
+    Writes tuned uWSGI settings into the project config
+
+    The settings are also saved in conf/<project>_tuning.json so that
+    regenerating the project keeps them.
+
+    """
+    tuning = load_tuning(root_dir, project_name)
+    tuning['uwsgi'] = dict([(k, v) for k, v in settings.items()])
+    write_file(get_tuning_file(root_dir, project_name), json.dumps(tuning, indent=1, sort_keys=True))
+    written = False
+    for uwsgi_config in get_uwsgi_configs(root_dir, project_name):
+        with open(uwsgi_config, 'r') as f:
+            cfg = parse_uwsgi(f.read())
+        for k, v in settings.items():
+            cfg.set(k, v)
+        scaling.clamp_cheaper(cfg)
+        written = write_file(uwsgi_config, cfg.serialize()) or written
+    return written
+
+def format_trials(report):
+    """
+    Formats tuning trials as a table (best first)
+
+    """
+    trials = sorted(report['trials'], key=lambda x: -x['rps'])
+    lines = ['{0:>10} {1:>9} {2:>9} {3:>8}  {4}'.format('req/s', 'p99 ms', 'rss MB', 'ok', 'settings')]
+    for t in trials:
+        lines.append('{0:>10.1f} {1:>9.2f} {2:>9} {3:>8}  {4}{5}'.format(t['rps'], \
+            t['latency_ms']['p99'], t['rss'] // (1024 * 1024), 'yes' if t['feasible'] else 'no', \
+            ' '.join(['{0}={1}'.format(k, v) for k, v in sorted(t['overrides'].items())]), \
+            ' *' if t is report['best'] else ''))
+    return '\n'.join(lines)
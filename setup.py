@@ -1,6 +1,20 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+try:
+    from setuptools import setup
+    # templates are discovered from this metadata (see ignition.templates)
+    extra = {
+        'entry_points': {
+            'ignition.templates': [
+                'django = ignition.django:DjangoCreator',
+                'flask = ignition.flask:FlaskCreator',
+            ],
+        },
+    }
+except ImportError:
+    # built-in templates are still found without entry points
+    from distutils.core import setup
+    extra = {}
 
 setup(name='ignition',
     version = '0.3',
@@ -29,6 +43,7 @@ setup(name='ignition',
         "Topic :: Software Development",
         "Topic :: Software Development :: Build Tools",
         "Topic :: Utilities",
-        ]
+        ],
+    **extra
     )
 
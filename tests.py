@@ -8,6 +8,37 @@ from ignition import ProjectCreator
 from ignition import common
 from ignition.django import DjangoCreator
 from ignition.flask import FlaskCreator
+from ignition import sizing
+from ignition import baseenv
+from ignition import manifest
+from ignition import hosting
+from ignition import static
+from ignition import config
+from ignition import benchmark
+from ignition import tuning
+from ignition import stats
+from ignition import logs
+from ignition import concurrency
+from ignition import startup
+from ignition import control
+from ignition import memory
+from ignition import scaling
+from ignition import tls
+from ignition import templates
+from ignition import runner
+from ignition import profiler
+from ignition import profiling
+import json
+import collections
+import subprocess
+import sys
+import gzip
+import socket
+import ssl
+import threading
+import BaseHTTPServer
+import SocketServer
+import time
 from random import Random
 import string
 
@@ -103,5 +134,1443 @@ class ProjectCreatorTestCase(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.prj._app_dir, \
             self.project_name) + os.sep + 'app.py'))
 
+class InstallModulesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject', \
+            modules='flask,requests')
+        # fake pip that records its arguments
+        bin_dir = os.path.join(self.prj.get_ve_dir(), 'testproject', 'bin')
+        os.makedirs(bin_dir)
+        self.pip_log = os.path.join(self.root_dir, 'pip.log')
+        pip = os.path.join(bin_dir, 'pip')
+        f = open(pip, 'w')
+        f.write('#!/bin/sh\necho "$@" >> {0}\n'.format(self.pip_log))
+        f.close()
+        os.chmod(pip, 0755)
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testRunCommand(self):
+        ret, out = common.run_command(['sh', '-c', 'echo hello ; exit 3'])
+        self.assertEqual(ret, 3)
+        self.assertEqual(out.strip(), 'hello')
+        ret, out = common.run_command(['ignition-missing-command'])
+        self.assertEqual(ret, 127)
+
+    def testSingleResolverPass(self):
+        self.assertTrue(self.prj.install_modules())
+        calls = open(self.pip_log, 'r').read().splitlines()
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(calls[0].startswith('wheel'))
+        self.assertTrue(calls[1].startswith('install --no-index'))
+        self.assertTrue(calls[1].endswith('flask requests'))
+
+    def testConcurrentBuilds(self):
+        # fake pip that takes a while to build a wheel into --wheel-dir
+        pip = os.path.join(self.prj.get_ve_dir(), 'testproject', 'bin', 'pip')
+        with open(pip, 'w') as f:
+            f.write('#!/bin/sh\nif [ "$1" = wheel ]; then sleep 0.5 ; touch "$3/flask-1.0-py2-none-any.whl" ; fi\n')
+        ve_dir = os.path.join(self.prj.get_ve_dir(), 'testproject')
+        other = ProjectCreator(root_dir=self.root_dir, project_name='other', modules='flask')
+        start = time.time()
+        threads = [threading.Thread(target=p.install_modules, args=(ve_dir,)) for p in (self.prj, other)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(time.time() - start < 0.9)
+        wheelhouse = os.path.join(self.root_dir, 'wheelhouse')
+        self.assertEqual(os.listdir(wheelhouse), ['flask-1.0-py2-none-any.whl'])
+
+    def testOffline(self):
+        self.prj._offline = True
+        self.assertTrue(self.prj.install_modules())
+        calls = open(self.pip_log, 'r').read().splitlines()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(calls[0].startswith('install --no-index'))
+
+class BaseEnvTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        # fake base environment built at a temporary path
+        self.build_dir = os.path.join(self.root_dir, '.build-test')
+        os.makedirs(os.path.join(self.build_dir, 'bin'))
+        os.makedirs(os.path.join(self.build_dir, 'lib', 'site-packages'))
+        f = open(os.path.join(self.build_dir, 'bin', 'pip'), 'w')
+        f.write('#!{0}/bin/python\n'.format(self.build_dir))
+        f.close()
+        f = open(os.path.join(self.build_dir, 'lib', 'site-packages', 'module.py'), 'w')
+        f.write('VALUE = 1\n')
+        f.close()
+        os.symlink(os.path.join(self.build_dir, 'lib'), os.path.join(self.build_dir, 'lib64'))
+        baseenv.mark_base_env(self.build_dir)
+        self.base_dir = os.path.join(self.root_dir, 'base')
+        os.rename(self.build_dir, self.base_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testKey(self):
+        self.assertEqual(baseenv.get_base_env_key('DjangoCreator', ['south', 'django']), \
+            baseenv.get_base_env_key('DjangoCreator', ['django', 'south']))
+        self.assertNotEqual(baseenv.get_base_env_key('DjangoCreator', ['django']), \
+            baseenv.get_base_env_key('FlaskCreator', ['django']))
+
+    def testClone(self):
+        ve_dir = os.path.join(self.root_dir, 've', 'testproject')
+        counts = baseenv.clone_env(self.base_dir, ve_dir)
+        self.assertEqual(counts['relocated'], 1)
+        pip = open(os.path.join(ve_dir, 'bin', 'pip'), 'r').read()
+        self.assertEqual(pip, '#!{0}/bin/python\n'.format(ve_dir))
+        # modules are shared with the base environment
+        module = os.path.join('lib', 'site-packages', 'module.py')
+        self.assertEqual(os.stat(os.path.join(ve_dir, module)).st_ino, \
+            os.stat(os.path.join(self.base_dir, module)).st_ino)
+        self.assertEqual(os.readlink(os.path.join(ve_dir, 'lib64')), os.path.join(ve_dir, 'lib'))
+        self.assertFalse(os.path.exists(os.path.join(ve_dir, baseenv.BASE_MARKER)))
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testLoadJson(self):
+        path = os.path.join(self.root_dir, 'projects.json')
+        f = open(path, 'w')
+        json.dump({'projects': [{'name': 'One', 'template': 'flask', 'port': 8001, \
+            'modules': 'requests, redis'}, {'name': 'two', 'template': 'Django'}]}, f)
+        f.close()
+        projects = manifest.load_manifest(path)
+        self.assertEqual(len(projects), 2)
+        self.assertEqual(projects[0]['name'], 'one')
+        self.assertEqual(projects[0]['modules'], ['requests', 'redis'])
+        self.assertEqual(projects[1]['template'], 'django')
+
+    def testLoadIni(self):
+        path = os.path.join(self.root_dir, 'projects.ini')
+        f = open(path, 'w')
+        f.write('[one]\ntemplate = flask\nshared_hosting = yes\n\n[two]\ntemplate = django\n')
+        f.close()
+        projects = manifest.load_manifest(path)
+        self.assertEqual([x['name'] for x in projects], ['one', 'two'])
+        self.assertTrue(projects[0]['shared_hosting'])
+
+    def testProvision(self):
+        class SlowCreator(ProjectCreator):
+            def create(self):
+                time.sleep(0.2)
+                return self._project_name != 'bad'
+        projects = [{'name': x, 'template': 'slow', 'modules': []} for x in ('a', 'b', 'c', 'bad')]
+        projects.append({'name': 'other', 'template': 'unknown', 'modules': []})
+        # invalid options only fail their own project
+        projects.append({'name': 'invalid', 'template': 'slow', 'modules': [], 'profile': 'bogus'})
+        creators = {'slow': SlowCreator}
+        start = time.time()
+        results = manifest.provision(projects, creators.get, workers=4, root_dir=self.root_dir)
+        # projects run concurrently
+        self.assertTrue(time.time() - start < 0.6)
+        status = dict([(r['name'], r['ok']) for r in results])
+        self.assertEqual(status, {'a': True, 'b': True, 'c': True, 'bad': False, 'other': False, \
+            'invalid': False})
+        self.assertTrue(manifest.format_summary(results).endswith('6 projects, 3 failed'))
+
+class HostingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testFrontend(self):
+        for name in ('one', 'two'):
+            prj = ProjectCreator(root_dir=self.root_dir, project_name=name, shared_hosting=True)
+            prj.create_nginx_config()
+        standalone = ProjectCreator(root_dir=self.root_dir, project_name='standalone')
+        standalone.create_nginx_config()
+        self.assertTrue(hosting.update_frontend(self.root_dir))
+        cfg = open(hosting.get_frontend_config(self.root_dir), 'r').read()
+        self.assertTrue(cfg.find('one_nginx.conf;') > -1)
+        self.assertTrue(cfg.find('two_nginx.conf;') > -1)
+        self.assertEqual(cfg.find('standalone_nginx.conf'), -1)
+        # unchanged projects don't rewrite (or reload) the front end
+        self.assertFalse(hosting.update_frontend(self.root_dir))
+        os.remove(os.path.join(self.root_dir, 'conf', 'two_nginx.conf'))
+        self.assertTrue(hosting.update_frontend(self.root_dir))
+        cfg = open(hosting.get_frontend_config(self.root_dir), 'r').read()
+        self.assertEqual(cfg.find('two_nginx.conf'), -1)
+
+    def testManageScripts(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='one', shared_hosting=True)
+        prj.create_manage_scripts()
+        start = open(os.path.join(self.root_dir, 'scripts', 'one_start.sh'), 'r').read()
+        self.assertTrue(start.find(hosting.get_frontend_config(self.root_dir)) > -1)
+        self.assertEqual(start.find('one_nginx.conf'), -1)
+
+class UpstreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testUpstream(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', \
+            uwsgi_sockets=2, backends=['10.0.0.2:3031'], harakiri=60)
+        prj.create_nginx_config()
+        cfg = prj.get_nginx_config()
+        self.assertTrue(cfg.find('upstream testproject_uwsgi {') > -1)
+        self.assertTrue(cfg.find('server unix:{0} max_fails=3 fail_timeout=10s;'.format(\
+            os.path.join(self.root_dir, 'var', 'testproject_1.sock'))) > -1)
+        self.assertTrue(cfg.find('server 10.0.0.2:3031 max_fails=3 fail_timeout=10s;') > -1)
+        self.assertTrue(cfg.find('least_conn;') > -1)
+        self.assertTrue(cfg.find('uwsgi_pass testproject_uwsgi;') > -1)
+        self.assertTrue(cfg.find('uwsgi_read_timeout 65s;') > -1)
+        prj.create_uwsgi_script()
+        cfg = config.parse_uwsgi(open(prj.get_uwsgi_config_file(), 'r').read())
+        self.assertEqual(len(cfg.get_all('socket')), 2)
+        self.assertEqual(cfg.get('harakiri'), '60')
+
+    def testBind(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', \
+            uwsgi_bind='0.0.0.0:3031')
+        self.assertEqual(prj.get_upstream_servers(), ['127.0.0.1:3031'])
+
+    def testInstances(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', uwsgi_instances=3, \
+            backends=['10.0.0.2:3031:4'])
+        self.assertEqual(len(prj.get_upstream_servers()), 4)
+        upstream = prj.get_upstream()
+        self.assertTrue(upstream.find('least_conn'))
+        self.assertEqual(upstream.find('server', ['10.0.0.2:3031', 'weight=4', 'max_fails=3', \
+            'fail_timeout=10s']).name, 'server')
+        prj.create_uwsgi_script()
+        prj.create_manage_scripts()
+        for i in range(3):
+            cfg = config.parse_uwsgi(open(prj.get_uwsgi_config_file(i), 'r').read())
+            self.assertEqual(cfg.get_all('socket'), prj.get_uwsgi_sockets(i))
+            self.assertEqual(cfg.get('master-fifo'), prj.get_master_fifo(i))
+            self.assertEqual(cfg.get('module'), 'app:app')
+            self.assertTrue(os.path.exists(os.path.join(self.root_dir, 'conf', \
+                '{0}.uwsgi'.format(prj.get_instance_name(i)))))
+        self.assertEqual(len(set([prj.get_uwsgi_sockets(i)[0] for i in range(3)])), 3)
+        start = open(os.path.join(self.root_dir, 'scripts', 'testproject_start.sh')).read()
+        self.assertEqual(start.count('.uwsgi\n'), 3)
+        tuning.apply_tuning(self.root_dir, 'testproject', {'processes': 2})
+        for i in range(3):
+            cfg = config.parse_uwsgi(open(prj.get_uwsgi_config_file(i), 'r').read())
+            self.assertEqual(cfg.get('processes'), '2')
+
+    def testBindInstances(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', \
+            uwsgi_bind='0.0.0.0:3031', uwsgi_instances=2)
+        self.assertEqual(prj.get_upstream_servers(), ['127.0.0.1:3031', '127.0.0.1:3032'])
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testDisabled(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_nginx_config()
+        self.assertEqual(prj.get_nginx_config().find('uwsgi_cache'), -1)
+
+    def testCacheRoutes(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject', \
+            cache=True, cache_routes=[('/news', '5m')], shared_hosting=True)
+        prj.create_nginx_config()
+        cfg = prj.get_nginx_config()
+        # cache zone is declared before the server block
+        self.assertTrue(-1 < cfg.find('keys_zone=testproject_cache:10m') < cfg.find('server {'))
+        self.assertTrue(cfg.find('location /news {') > -1)
+        self.assertEqual(cfg.count('uwsgi_cache_valid'), 1)
+        self.assertTrue(cfg.find('uwsgi_cache_valid 200 301 302 5m;') > -1)
+        self.assertEqual(cfg.count('X-Cache-Status'), 2)
+
+class StaticTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.static_dir = os.path.join(self.root_dir, 'static')
+        os.makedirs(os.path.join(self.static_dir, 'css'))
+        self.css = os.path.join(self.static_dir, 'css', 'site.css')
+        f = open(self.css, 'w')
+        f.write('body { color: #000; }\n' * 100)
+        f.close()
+        f = open(os.path.join(self.static_dir, 'logo.png'), 'wb')
+        f.write(b'PNG' * 10)
+        f.close()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testBuild(self):
+        counts = static.build_static(self.static_dir)
+        self.assertEqual(counts['processed'], 2)
+        files = os.listdir(os.path.join(self.static_dir, 'css'))
+        self.assertTrue('site.css.gz' in files)
+        fingerprinted = [x for x in files if x.startswith('site.') and x.endswith('.css') and x != 'site.css']
+        self.assertEqual(len(fingerprinted), 1)
+        self.assertTrue(fingerprinted[0] + '.gz' in files)
+        # png files are fingerprinted but not compressed
+        self.assertFalse(os.path.exists(os.path.join(self.static_dir, 'logo.png.gz')))
+        manifest = json.load(open(os.path.join(self.static_dir, static.MANIFEST_FILE), 'r'))
+        self.assertEqual(manifest[os.path.join('css', 'site.css')], os.path.join('css', fingerprinted[0]))
+        # only changed files are processed again
+        counts = static.build_static(self.static_dir)
+        self.assertEqual(counts, {'processed': 0, 'unchanged': 2, 'removed': 0})
+        f = open(self.css, 'a')
+        f.write('a { color: #fff; }\n')
+        f.close()
+        os.utime(self.css, (time.time() + 10, time.time() + 10))
+        counts = static.build_static(self.static_dir)
+        self.assertEqual(counts['processed'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.static_dir, 'css', fingerprinted[0])))
+        os.remove(os.path.join(self.static_dir, 'logo.png'))
+        counts = static.build_static(self.static_dir)
+        self.assertEqual(counts['removed'], 1)
+        self.assertEqual([x for x in os.listdir(self.static_dir) if x.startswith('logo')], [])
+
+    def testAddStaticDir(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_nginx_config()
+        common.add_static_dir(root_dir=self.root_dir, project_name='testproject', \
+            static_dir_path=self.static_dir, alias='/static')
+        cfg = prj.get_nginx_config()
+        self.assertTrue(cfg.find('location ^~ /static/ {') > -1)
+        self.assertTrue(cfg.find('gzip_static on;') > -1)
+        self.assertEqual(static.find_static_dirs(cfg), [self.static_dir])
+        self.assertTrue(os.path.exists(self.css + '.gz'))
+        self.assertTrue(common.rebuild_static(self.root_dir, 'testproject'))
+
+class ConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testNginxRoundTrip(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject', cache=True)
+        text = prj.get_nginx_config_tree().serialize()
+        self.assertEqual(config.parse_nginx(text).serialize(), text)
+
+    def testNginxParse(self):
+        text = '# comment\nhttp {\n  log_format main \'$remote_addr "$request"\';\n\n' \
+            '  server {\n    location ~ "\\.[0-9a-f]{8}\\.css$" { expires max; }\n' \
+            '    set $x ${host}x;\n  }\n}\n'
+        cfg = config.parse_nginx(text)
+        http = cfg.find('http')
+        self.assertEqual(http.find('log_format').args, ['main', '\'$remote_addr "$request"\''])
+        server = config.find_server(cfg)
+        self.assertEqual(server.find('location').find('expires').args, ['max'])
+        self.assertEqual(server.find('set').args, ['$x', '${host}x'])
+        # targeted edit
+        server.set('listen', ['8080'])
+        self.assertTrue(cfg.serialize().find('\t\tlisten 8080;') > -1)
+        self.assertRaises(config.ConfigError, config.parse_nginx, 'http {\n')
+        self.assertRaises(config.ConfigError, config.parse_nginx, 'listen 80\n')
+
+    def testUwsgi(self):
+        cfg = config.parse_uwsgi('[uwsgi]\n# comment\nsocket = /tmp/a.sock\nsocket = /tmp/b.sock\n' \
+            'master = true\n\n[other]\nkey = value\n')
+        self.assertEqual(cfg.get_all('socket'), ['/tmp/a.sock', '/tmp/b.sock'])
+        self.assertEqual(cfg.get('key'), None)
+        cfg.set('socket', '/tmp/c.sock')
+        cfg.add('processes', 4)
+        self.assertEqual(cfg.serialize(), '[uwsgi]\n# comment\nsocket = /tmp/c.sock\n' \
+            'master = true\n\nprocesses = 4\n')
+
+    def testAddStaticDirTwice(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_nginx_config()
+        for i in range(2):
+            common.add_static_dir(root_dir=self.root_dir, project_name='testproject', \
+                static_dir_path=self.root_dir, alias='/static', precompress=False)
+        cfg = config.parse_nginx(prj.get_nginx_config())
+        server = config.find_server(cfg)
+        self.assertEqual(len(server.find_all('location', ['^~', '/static/'])), 1)
+        self.assertEqual(server.children.index(server.find('location', ['^~', '/static/'])), \
+            server.children.index(server.find('location', ['/'])) + 1)
+
+class StateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testWriteArtifacts(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_uwsgi_script()
+        prj.create_nginx_config()
+        prj.create_manage_scripts()
+        state = json.load(open(os.path.join(self.root_dir, 'conf', 'testproject_state.json'), 'r'))
+        self.assertEqual(sorted(state.keys()), ['control_script', 'nginx', 'reload_script', \
+            'restart_script', 'start_script', 'stop_script', 'uwsgi_config', 'uwsgi_script'])
+        # unchanged configs are not rewritten
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject')
+        self.assertFalse(prj.write_artifact('nginx', prj._nginx_config, \
+            prj.get_nginx_config_tree().serialize()))
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', harakiri=30)
+        self.assertTrue(prj.write_artifact('nginx', prj._nginx_config, \
+            prj.get_nginx_config_tree().serialize()))
+
+    def testKeepStaticDirs(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_nginx_config()
+        common.add_static_dir(root_dir=self.root_dir, project_name='testproject', \
+            static_dir_path=self.root_dir, alias='/static', precompress=False)
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject', harakiri=30)
+        prj.create_nginx_config()
+        cfg = prj.get_nginx_config()
+        self.assertTrue(cfg.find('uwsgi_read_timeout 35s;') > -1)
+        self.assertTrue(cfg.find('location ^~ /static/ {') > -1)
+
+    def testVirtualenvKey(self):
+        one = ProjectCreator(root_dir=self.root_dir, project_name='one', modules=['b', 'a'])
+        two = ProjectCreator(root_dir=self.root_dir, project_name='two', modules=['a', 'b'])
+        self.assertEqual(one.get_virtualenv_key(), two.get_virtualenv_key())
+        two._modules.append('c')
+        self.assertNotEqual(one.get_virtualenv_key(), two.get_virtualenv_key())
+
+class SizingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.resources = {
+            'cpus': 16,
+            'memory': 32 * 1024 * 1024 * 1024,
+            'nofile': 65536,
+            'somaxconn': 4096,
+        }
+
+    def testProfiles(self):
+        cpu = sizing.calculate_sizing('cpu-bound', self.resources)
+        io = sizing.calculate_sizing('io-bound', self.resources)
+        mem = sizing.calculate_sizing('memory-constrained', self.resources)
+        self.assertEqual(cpu['processes'], 16)
+        self.assertEqual(cpu['threads'], 1)
+        self.assertTrue(io['processes'] * io['threads'] > cpu['processes'])
+        self.assertTrue(mem['processes'] < cpu['processes'])
+        self.assertEqual(cpu['worker_processes'], 16)
+        self.assertTrue(cpu['worker_connections'] <= cpu['worker_rlimit_nofile'] // 2)
+
+    def testLimits(self):
+        self.resources['memory'] = 128 * 1024 * 1024
+        self.resources['nofile'] = 256
+        self.resources['somaxconn'] = 128
+        s = sizing.calculate_sizing('io-bound', self.resources)
+        self.assertEqual(s['processes'], 1)
+        self.assertEqual(s['worker_connections'], 128)
+        self.assertTrue(s['listen'] <= 128)
+        self.assertRaises(ValueError, sizing.calculate_sizing, 'unknown', self.resources)
+
+    def testNginxConfig(self):
+        root_dir = tempfile.mkdtemp()
+        try:
+            prj = ProjectCreator(root_dir=root_dir, project_name='testproject', profile='cpu-bound')
+            prj.create_nginx_config()
+            cfg = prj.get_nginx_config()
+            self.assertTrue(cfg.find('worker_connections {0};'.format(\
+                prj.get_sizing()['worker_connections'])) > -1)
+        finally:
+            shutil.rmtree(root_dir)
+
+class _BenchmarkHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = 'hello'
+        self.send_response(500 if self.path == '/error' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _BenchmarkServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class BenchmarkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = _BenchmarkServer(('127.0.0.1', 0), _BenchmarkHandler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 95), 95)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile(values, 7), 7)
+        self.assertEqual(benchmark.percentile(values, 100), 100)
+        self.assertEqual(benchmark.percentile(values, 0), 1)
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 75), 3)
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 76), 4)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+        self.assertEqual(benchmark.percentile([], 50), 0.0)
+
+    def testRunLoad(self):
+        r = benchmark.run_load(self.url + '/', concurrency=4, requests=200)
+        self.assertEqual(r['requests'], 200)
+        self.assertEqual(r['status'], {'200': 200})
+        self.assertEqual(r['error_rate'], 0.0)
+        self.assertTrue(r['latency_ms']['p50'] <= r['latency_ms']['p99'] <= r['latency_ms']['max'])
+        self.assertTrue(r['rps'] > 0)
+
+    def testErrors(self):
+        r = benchmark.run_load(self.url + '/error', concurrency=2, requests=20, keepalive=False)
+        self.assertEqual(r['status'], {'500': 20})
+        self.assertEqual(r['error_rate'], 1.0)
+
+    def testParseResponse(self):
+        chunked = 'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n'
+        self.assertEqual(benchmark._parse_response(chunked), (200, True, len(chunked)))
+        self.assertEqual(benchmark._parse_response(chunked[:-4]), None)
+        self.assertEqual(benchmark._parse_response('HTTP/1.0 200 OK\r\n\r\nbody')[:2], (200, False))
+
+    def testBenchConfig(self):
+        root_dir = tempfile.mkdtemp()
+        try:
+            prj = FlaskCreator(root_dir=root_dir, project_name='testproject')
+            prj.create_uwsgi_script()
+            cfg = benchmark.get_uwsgi_bench_config(root_dir, 'testproject', 9000, {'processes': 2})
+            self.assertEqual(cfg.get('http-socket'), '127.0.0.1:9000')
+            self.assertEqual(cfg.get('daemonize'), None)
+            self.assertEqual(cfg.get_all('socket'), [])
+            self.assertEqual(cfg.get('processes'), '2')
+            self.assertEqual(cfg.get('module'), 'app:app')
+        finally:
+            shutil.rmtree(root_dir)
+
+class TuningTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.resources = {'cpus': 2, 'memory': 1024 * 1024 * 1024, 'nofile': 1024, 'somaxconn': 128}
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject')
+        prj.create_uwsgi_script()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def _trial(self, root_dir, project_name, overrides, **kwargs):
+        # throughput peaks at 4 processes and 2 threads; 8 processes use too much memory
+        rps = 1000 - abs(overrides['processes'] - 4) * 100 - abs(overrides['threads'] - 2) * 50
+        return {
+            'rps': float(rps),
+            'latency_ms': {'p99': 10000.0 / rps},
+            'error_rate': 0.0,
+            'rss': overrides['processes'] * 100 * 1024 * 1024,
+            'overrides': overrides,
+        }
+
+    def testTune(self):
+        report = tuning.tune(self.root_dir, 'testproject', memory_budget=500 * 1024 * 1024, \
+            trial=self._trial, resources=self.resources)
+        self.assertEqual(report['best']['overrides']['processes'], 4)
+        self.assertEqual(report['best']['overrides']['threads'], 2)
+        self.assertFalse([t for t in report['trials'] if t['overrides']['processes'] == 8 and t['feasible']])
+        # coordinate search, not the full grid
+        self.assertTrue(len(report['trials']) < 3 * 4 * 3 * 3)
+
+    def testApply(self):
+        tuning.apply_tuning(self.root_dir, 'testproject', {'processes': 3, 'threads': 2})
+        cfg = config.parse_uwsgi(open(os.path.join(self.root_dir, 'conf', 'testproject_uwsgi.ini')).read())
+        self.assertEqual(cfg.get('processes'), '3')
+        # regenerated configs keep tuned settings
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject')
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get_all('processes'), ['3'])
+        self.assertEqual(cfg.get('threads'), '2')
+
+    def testProcessRss(self):
+        self.assertTrue(common.get_process_rss(os.getpid()) > 0)
+        self.assertEqual(tuning.parse_size('512M'), 512 * 1024 * 1024)
+
+class StatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.uwsgi_stats = {
+            'listen_queue': 3,
+            'listen_queue_errors': 1,
+            'workers': [
+                {'id': 1, 'pid': 100, 'status': 'busy', 'requests': 50, 'rss': 20971520, \
+                    'avg_rt': 1500, 'exceptions': 0},
+                {'id': 2, 'pid': 101, 'status': 'idle', 'requests': 10, 'rss': 10485760, \
+                    'avg_rt': 500, 'exceptions': 2},
+            ],
+        }
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testGeneratedConfigs(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', port=8080)
+        prj.create_uwsgi_script()
+        prj.create_nginx_config()
+        endpoints = stats.get_endpoints(self.root_dir, 'testproject')
+        self.assertEqual(endpoints['uwsgi'], stats.get_stats_socket(self.root_dir, 'testproject'))
+        self.assertEqual(endpoints['nginx'], 'http://127.0.0.1:8080/nginx_status')
+        cfg = prj.get_nginx_config()
+        self.assertTrue(cfg.find('stub_status;') > -1)
+        self.assertTrue(cfg.find('allow 127.0.0.1;') > -1)
+
+    def _serve_stats(self, path, data):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+
+        def serve():
+            conn, addr = server.accept()
+            conn.sendall(json.dumps(data))
+            conn.close()
+            server.close()
+        t = threading.Thread(target=serve)
+        t.daemon = True
+        t.start()
+        return t
+
+    def testInstances(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', uwsgi_instances=2)
+        prj.create_uwsgi_script()
+        endpoints = stats.get_endpoints(self.root_dir, 'testproject')
+        self.assertEqual(endpoints['uwsgi_instances'], [stats.get_stats_socket(self.root_dir, 'testproject'), \
+            stats.get_stats_socket(self.root_dir, 'testproject.1')])
+        self.assertEqual(endpoints['uwsgi'], endpoints['uwsgi_instances'][0])
+        second = json.loads(json.dumps(self.uwsgi_stats))
+        second['listen_queue'] = 4
+        second['workers'][0]['requests'] = 5
+        threads = [self._serve_stats(path, data) for path, data in \
+            zip(endpoints['uwsgi_instances'], [self.uwsgi_stats, second])]
+        snapshot = stats.collect(self.root_dir, 'testproject')
+        for t in threads:
+            t.join()
+        self.assertEqual(snapshot['errors'], [])
+        self.assertEqual(snapshot['uwsgi']['listen_queue'], 7)
+        self.assertEqual(snapshot['uwsgi']['listen_queue_errors'], 2)
+        self.assertEqual([(w['instance'], w['id'], w['requests']) for w in snapshot['uwsgi']['workers']], \
+            [(0, 1, 50), (0, 2, 10), (1, 1, 5), (1, 2, 10)])
+        previous = json.loads(json.dumps(snapshot))
+        snapshot['time'] = previous['time'] + 1
+        snapshot['uwsgi']['workers'][2]['requests'] = 15
+        summary = stats.summarize(snapshot, previous)
+        self.assertEqual([w['rps'] for w in summary['workers']], [0.0, 0.0, 10.0, 0.0])
+        self.assertTrue(' 1/1 ' in stats.format_summary(summary))
+        text = stats.format_prometheus(snapshot).splitlines()
+        self.assertTrue('uwsgi_worker_requests_total{project="testproject",uwsgi_instance="1",worker="1"} 15' in text)
+        self.assertTrue('uwsgi_listen_queue{project="testproject"} 7' in text)
+
+    def testReadUwsgiStats(self):
+        path = os.path.join(self.root_dir, 'stats.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+
+        def serve():
+            conn, addr = server.accept()
+            conn.sendall(json.dumps(self.uwsgi_stats))
+            conn.close()
+        t = threading.Thread(target=serve)
+        t.start()
+        try:
+            self.assertEqual(stats.read_uwsgi_stats(path)['listen_queue'], 3)
+        finally:
+            t.join()
+            server.close()
+        self.assertRaises(stats.StatsError, stats.read_uwsgi_stats, path)
+
+    def testSummary(self):
+        nginx = stats.parse_stub_status('Active connections: 5 \nserver accepts handled requests\n'\
+            ' 10 10 40 \nReading: 1 Writing: 2 Waiting: 2 \n')
+        self.assertEqual(nginx['requests'], 40)
+        previous = {'project': 'testproject', 'time': 0, 'uwsgi': self.uwsgi_stats, 'nginx': nginx}
+        current = json.loads(json.dumps(previous))
+        current['time'] = 2
+        current['uwsgi']['workers'][0]['requests'] = 70
+        current['nginx']['requests'] = 60
+        summary = stats.summarize(current, previous)
+        self.assertEqual(summary['workers'][0]['rps'], 10.0)
+        self.assertEqual(summary['workers'][1]['rps'], 0.0)
+        self.assertEqual(summary['workers'][0]['avg_rt_ms'], 1.5)
+        self.assertEqual(summary['nginx_rps'], 10.0)
+        self.assertTrue(stats.format_summary(summary).find('listen queue: 3') > -1)
+
+    def testPrometheus(self):
+        snapshot = {'project': 'testproject', 'uwsgi': self.uwsgi_stats, 'nginx': None}
+        text = stats.format_prometheus(snapshot)
+        self.assertTrue('uwsgi_listen_queue{project="testproject"} 3' in text.splitlines())
+        self.assertTrue('uwsgi_worker_requests_total{project="testproject",worker="2"} 10' in text.splitlines())
+        self.assertTrue('# TYPE uwsgi_worker_rss_bytes gauge' in text)
+
+class LogsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root_dir, 'log'))
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def _line(self, uri, status, request_time, upstream_time='-'):
+        values = {'time': '2013-01-01T00:00:00+00:00', 'remote_addr': '127.0.0.1', 'method': 'GET', \
+            'uri': uri, 'status': status, 'bytes': '10', 'request_time': request_time, \
+            'upstream_time': upstream_time, 'upstream_connect_time': '-', 'upstream_header_time': '-', \
+            'cache': '-', 'host': 'localhost', 'user_agent': 'test agent'}
+        return '\t'.join([values[name] for name, var in logs.LOG_FIELDS]) + '\n'
+
+    def testPercentile(self):
+        histogram = {}
+        for ms in range(1, 101):
+            histogram[logs._bucket(ms)] = histogram.get(logs._bucket(ms), 0) + 1
+        # same rank as benchmark.percentile (a float rank gives the 8th value)
+        self.assertEqual(logs.percentile(histogram, 7), logs._bucket_value(logs._bucket(7)))
+        self.assertEqual(logs.percentile(histogram, 100, 100.0), 100.0)
+        self.assertEqual(logs.percentile({}, 50), 0.0)
+
+    def testLogFormat(self):
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        cfg = prj.get_nginx_config_tree().find('http')
+        self.assertEqual(cfg.find('access_log').args[1], logs.LOG_FORMAT_NAME)
+        self.assertEqual(cfg.find('log_format').args[0], logs.LOG_FORMAT_NAME)
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject', shared_hosting=True)
+        prj.create_nginx_config()
+        server = config.find_server(prj.get_nginx_config_tree())
+        self.assertEqual(server.find('access_log').args[1], logs.LOG_FORMAT_NAME)
+        frontend = hosting.get_frontend_config_tree(self.root_dir).find('http')
+        self.assertEqual(frontend.find('log_format').args[0], logs.LOG_FORMAT_NAME)
+
+    def testAnalyze(self):
+        path = os.path.join(self.root_dir, 'log', 'testproject-access.log')
+        with open(path, 'w') as f:
+            for i in range(100):
+                f.write(self._line('/items/{0}'.format(i), '200', '0.010', '0.009'))
+            f.write(self._line('/slow', '500', '2.000', '1.000, 0.500'))
+            f.write('not a timing line\n')
+        f = gzip.open(path + '.1.gz', 'wb')
+        for i in range(100):
+            f.write(self._line('/items/{0}'.format(i), '200', '0.100'))
+        f.close()
+        paths = logs.find_logs(self.root_dir, 'testproject')
+        self.assertEqual(len(paths), 2)
+        result = logs.analyze_logs(paths, processes=2)
+        self.assertEqual(result['lines'], 202)
+        self.assertEqual(result['unparsed'], 1)
+        self.assertEqual(result['status'], {'200': 200, '500': 1})
+        routes = dict([(s['route'], s) for s in logs.get_route_stats(result)])
+        items = routes['GET /items/:id']
+        self.assertEqual(items['count'], 200)
+        self.assertTrue(abs(items['p50'] - 10) <= 0.5)
+        self.assertTrue(abs(items['p99'] - 100) <= 5)
+        self.assertEqual(routes['GET /slow']['error_rate'], 1.0)
+        self.assertEqual(routes['GET /slow']['upstream_mean'], 1500.0)
+        self.assertTrue(logs.format_report(result).find('GET /items/:id') > -1)
+
+    def testMaxRoutes(self):
+        path = os.path.join(self.root_dir, 'log', 'testproject-access.log')
+        with open(path, 'w') as f:
+            for i in range(logs.MAX_ROUTES + 10):
+                f.write(self._line('/page{0}'.format(i), '200', '0.001'))
+        result = logs.analyze_file(path)
+        self.assertEqual(len(result['routes']), logs.MAX_ROUTES + 1)
+        self.assertEqual(result['routes'][logs.OTHER_ROUTE]['count'], 10)
+
+class ConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testModels(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', concurrency='prefork')
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('threads'), None)
+        self.assertTrue(int(cfg.get('offload-threads')) >= 1)
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', concurrency='threaded')
+        cfg = prj.get_uwsgi_config()
+        self.assertTrue(int(cfg.get('threads')) >= concurrency.MIN_THREADS)
+        self.assertEqual(cfg.get('enable-threads'), 'true')
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', concurrency='gevent')
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('gevent'), str(concurrency.ASYNC_CORES))
+        self.assertEqual(cfg.get('threads'), None)
+        self.assertTrue('gevent' in prj._modules and 'uwsgi' in prj._modules)
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', concurrency='asyncio')
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('greenlet'), 'true')
+        self.assertTrue('greenlet' in prj._modules)
+        self.assertRaises(ValueError, concurrency.add_uwsgi_options, cfg, 'unknown', prj.get_sizing())
+
+    def testAppSource(self):
+        source = FlaskCreator(root_dir=self.root_dir, project_name='testproject').get_app_source()
+        self.assertEqual(source.find('run_async'), -1)
+        source = FlaskCreator(root_dir=self.root_dir, project_name='testproject', \
+            concurrency='asyncio').get_app_source()
+        self.assertTrue(source.find('def run_async(coro):') > -1)
+        self.assertTrue(source.find('run_async(asyncio.sleep(0.1))') > -1)
+        compile(source, 'app.py', 'exec')
+
+    def testModulesNotShared(self):
+        modules = ['requests']
+        FlaskCreator(root_dir=self.root_dir, project_name='testproject', modules=modules, concurrency='gevent')
+        self.assertEqual(modules, ['requests'])
+        ProjectCreator(root_dir=self.root_dir, project_name='testproject', concurrency='gevent')
+        prj = ProjectCreator(root_dir=self.root_dir, project_name='testproject')
+        self.assertFalse('gevent' in prj._modules)
+
+    def testVirtualenvUwsgi(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', concurrency='gevent')
+        prj.create_uwsgi_script()
+        script = open(os.path.join(self.root_dir, 'conf', 'testproject.uwsgi')).read()
+        self.assertTrue(script.startswith(os.path.join(self.root_dir, 've', 'testproject', 'bin', 'uwsgi')))
+        self.assertTrue('gevent' in tuning.get_candidates(prj.get_uwsgi_config()))
+
+class StartupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testPreloadConfig(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', preload=True, \
+            preload_modules=['numpy'], gc_freeze=True)
+        prj.create_uwsgi_script()
+        cfg = config.parse_uwsgi(open(prj.get_uwsgi_config_file()).read())
+        self.assertEqual(cfg.get('lazy-apps'), 'false')
+        self.assertEqual(cfg.get('import'), prj.get_preload_file())
+        self.assertEqual(prj.get_preload_modules(), ['numpy', 'flask', 'jinja2', 'werkzeug', 'app'])
+        source = open(prj.get_preload_file()).read()
+        self.assertTrue(source.find('gc.freeze()') > -1)
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='other')
+        self.assertEqual(prj.get_uwsgi_config().get('import'), None)
+
+    def testPreloadModule(self):
+        source = startup.get_preload_module('testproject', ['json', 'missing_module_xyz'], gc_freeze=True)
+        namespace = {}
+        exec(compile(source, 'preload.py', 'exec'), namespace)
+        self.assertTrue('json' in sys.modules)
+
+    def testCompileBytecode(self):
+        with open(os.path.join(self.root_dir, 'mod.py'), 'w') as f:
+            f.write('x = 1\n')
+        self.assertTrue(startup.compile_bytecode(sys.executable, [self.root_dir, '/nonexistent']))
+        self.assertTrue(os.path.exists(os.path.join(self.root_dir, 'mod.pyc')))
+
+    def testProcessUss(self):
+        uss = common.get_process_uss(os.getpid())
+        self.assertTrue(0 < uss <= common.get_process_rss(os.getpid()))
+
+class ControlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.fifo = os.path.join(self.root_dir, 'master.fifo')
+        os.mkfifo(self.fifo)
+        self.workers = [{'id': 1, 'pid': 101}, {'id': 2, 'pid': 102}]
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def _serve_stats(self, path):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(5)
+
+        def serve():
+            while True:
+                try:
+                    conn, addr = server.accept()
+                except socket.error:
+                    break
+                conn.sendall(json.dumps({'workers': self.workers}))
+                conn.close()
+        t = threading.Thread(target=serve)
+        t.daemon = True
+        t.start()
+        return server
+
+    def _read_fifo(self, commands, on_command):
+        def read():
+            with open(self.fifo, 'r') as f:
+                commands.append(f.read(1))
+            on_command()
+        t = threading.Thread(target=read)
+        t.daemon = True
+        t.start()
+        # wait for the reader to open the fifo
+        time.sleep(0.2)
+        return t
+
+    def testWaitSocket(self):
+        path = os.path.join(self.root_dir, 'app.sock')
+        self.assertFalse(control.wait_socket(path, timeout=0.3))
+        server = self._serve_stats(path)
+        try:
+            self.assertTrue(control.wait_socket('unix:' + path, timeout=1))
+        finally:
+            server.close()
+
+    def testSendCommand(self):
+        # no master reading the fifo
+        self.assertFalse(control.send_command(self.fifo, 'r'))
+        self.assertFalse(control.reload(self.fifo, os.path.join(self.root_dir, 'none.sock'), timeout=1))
+
+    def testReload(self):
+        stats_path = os.path.join(self.root_dir, 'stats.sock')
+        server = self._serve_stats(stats_path)
+        commands = []
+
+        def replace_workers():
+            self.workers = [{'id': 1, 'pid': 201}, {'id': 2, 'pid': 202}]
+        t = self._read_fifo(commands, replace_workers)
+        try:
+            self.assertTrue(control.reload(self.fifo, stats_path, control.CHAIN_RELOAD, timeout=5))
+        finally:
+            t.join()
+            server.close()
+        self.assertEqual(commands, ['c'])
+
+    def testStop(self):
+        p = subprocess.Popen(['sleep', '30'])
+        pidfile = os.path.join(self.root_dir, 'uwsgi.pid')
+        with open(pidfile, 'w') as f:
+            f.write(str(p.pid))
+        commands = []
+
+        def graceful_stop():
+            p.terminate()
+            p.wait()
+        t = self._read_fifo(commands, graceful_stop)
+        self.assertTrue(control.stop(self.fifo, pidfile, timeout=5))
+        t.join()
+        self.assertEqual(commands, ['q'])
+
+    def testScripts(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', port=8080)
+        prj.create_uwsgi_script()
+        prj.create_manage_scripts()
+        script_dir = os.path.join(self.root_dir, 'scripts')
+        self.assertTrue(os.path.exists(os.path.join(script_dir, 'ignitionctl.py')))
+        start = open(os.path.join(script_dir, 'testproject_start.sh')).read()
+        self.assertTrue(start.find('sleep') == -1)
+        self.assertTrue(start.find('wait 127.0.0.1:8080') > -1)
+        reload = open(os.path.join(script_dir, 'testproject_reload.sh')).read()
+        self.assertTrue(reload.find('reload {0} '.format(prj.get_master_fifo())) > -1)
+        self.assertTrue(reload.find(' c ') > -1)
+        self.assertTrue(reload.find('nginx -t -q -c') > -1)
+        restart = open(os.path.join(script_dir, 'testproject_restart.sh')).read()
+        self.assertTrue(restart.find(' r ') > -1)
+        self.assertEqual(prj.get_uwsgi_config().get('lazy-apps'), 'true')
+        self.assertEqual(prj.get_uwsgi_config().get('master-fifo'), prj.get_master_fifo())
+
+class MemoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.measurement = {'baseline': 80 * memory.MB, 'steady': 100 * memory.MB, 'peak': 110 * memory.MB}
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testLimits(self):
+        limits = memory.get_limits(8, self.measurement, 1024 * memory.MB)
+        self.assertEqual(limits['reload-on-rss'], 151)
+        self.assertTrue(limits['evil-reload-on-rss'] > limits['reload-on-rss'])
+        # 1024 MB fits 6 workers of 151 MB
+        self.assertEqual(limits['processes'], 6)
+        self.assertEqual(limits['cheaper'], 1)
+        self.assertEqual(limits['cheaper-rss-limit-hard'], 1024 * memory.MB)
+        # small apps keep MIN_HEADROOM
+        limits = memory.get_limits(1, {'steady': 20 * memory.MB}, 1024 * memory.MB)
+        self.assertEqual(limits['reload-on-rss'], 20 + memory.MIN_HEADROOM + 1)
+        self.assertFalse('cheaper' in limits)
+        self.assertEqual(memory.get_limits(4)['reload-on-rss'], memory.DEFAULT_RELOAD_RSS)
+
+    def testTunedProcesses(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', scaling='busyness')
+        prj._sizing['processes'] = 8
+        self.assertEqual(prj.get_uwsgi_config().get('cheaper'), '2')
+        prj.create_uwsgi_script()
+        uwsgi_config = os.path.join(self.root_dir, 'conf', 'testproject_uwsgi.ini')
+        # tuning lowers the processes below the cheaper minimum
+        tuning.apply_tuning(self.root_dir, 'testproject', {'processes': 2})
+        self.assertEqual(config.parse_uwsgi(open(uwsgi_config).read()).get('cheaper'), '1')
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('processes'), '2')
+        self.assertEqual(cfg.get('cheaper'), '1')
+        self.assertEqual(cfg.get('cheaper-initial'), '1')
+        self.assertEqual(cfg.get('cheaper-step'), '1')
+        tuning.apply_tuning(self.root_dir, 'testproject', {'processes': 1})
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('processes'), '1')
+        self.assertEqual([k for k in cfg.keys() if k.startswith('cheaper')], [])
+        # re-applying the limits keeps the tuned processes
+        prj.create_uwsgi_script()
+        memory.apply_limits(self.root_dir, 'testproject', memory.get_limits(8, self.measurement))
+        cfg = config.parse_uwsgi(open(uwsgi_config).read())
+        self.assertEqual(cfg.get('processes'), '1')
+        self.assertEqual(cfg.get('cheaper'), None)
+
+    def testConfig(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', memory_budget=512 * memory.MB)
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('limit-as'), None)
+        self.assertEqual(cfg.get('max-requests'), None)
+        self.assertEqual(cfg.get('reload-on-rss'), str(memory.DEFAULT_RELOAD_RSS))
+        self.assertEqual(cfg.get('max-worker-lifetime-delta'), str(memory.LIFETIME_DELTA))
+        prj.create_uwsgi_script()
+        memory.save_measurement(self.root_dir, 'testproject', self.measurement)
+        cfg = prj.get_uwsgi_config()
+        self.assertEqual(cfg.get('reload-on-rss'), '151')
+        self.assertTrue(int(cfg.get('processes')) <= 3)
+        # existing configs are patched in place
+        limits = memory.get_limits(2, self.measurement, 512 * memory.MB)
+        memory.apply_limits(self.root_dir, 'testproject', limits)
+        cfg = config.parse_uwsgi(open(prj.get_uwsgi_config_file()).read())
+        self.assertEqual(cfg.get('processes'), '2')
+        self.assertEqual(cfg.get('cheaper'), '1')
+        self.assertEqual(cfg.get('module'), 'app:app')
+        # trials with fewer processes than the cheaper minimum drop cheaper mode
+        bench = benchmark.get_uwsgi_bench_config(self.root_dir, 'testproject', 8000, {'processes': 1})
+        self.assertEqual(bench.get('cheaper'), None)
+
+class ScalingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.limits = {'processes': 9, 'cheaper': 2}
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testOptions(self):
+        options = dict(scaling.get_options('busyness', self.limits))
+        self.assertEqual(options['cheaper-algo'], 'busyness')
+        self.assertEqual(options['cheaper-step'], 2)
+        self.assertEqual(options['cheaper-busyness-max'], scaling.BUSYNESS_MAX)
+        options = dict(scaling.get_options('backlog', self.limits))
+        self.assertEqual(options['cheaper-overload'], scaling.BACKLOG_OVERLOAD)
+        self.assertEqual(scaling.get_options('spare', {'processes': 1}), [])
+        self.assertRaises(ValueError, scaling.get_options, 'unknown', self.limits)
+
+    def testConfig(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', scaling='spare')
+        cfg = prj.get_uwsgi_config()
+        limits = prj.get_memory_limits()
+        if limits['processes'] > 1:
+            self.assertEqual(cfg.get('cheaper-algo'), 'spare')
+            self.assertEqual(cfg.get('cheaper'), str(limits['cheaper']))
+            self.assertEqual(cfg.get('cheaper-step'), str(scaling.get_step(limits)))
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='other')
+        self.assertEqual(prj.get_uwsgi_config().get('cheaper-algo'), None)
+
+    def testCountWorkers(self):
+        p = subprocess.Popen([sys.executable, '-c', 'import os, time\nif os.fork(): time.sleep(5)\n' \
+            'else: time.sleep(5)'])
+        try:
+            deadline = time.time() + 5
+            while scaling.count_workers(p.pid) < 1 and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(scaling.count_workers(p.pid), 1)
+        finally:
+            for pid in common.get_process_tree(p.pid):
+                os.kill(pid, 9)
+            p.wait()
+
+    def testFormat(self):
+        report = {'initial': 2, 'peak': 6, 'scaled_up': True, 'scaled_down': True, 'steps': [{\
+            'concurrency': 16, 'rps': 100.0, 'p99': 20.0, 'workers_min': 2, 'workers_max': 6, \
+            'workers_end': 6}]}
+        self.assertTrue(scaling.format_ramp(report).find('2-6') > -1)
+
+class TlsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testServer(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', port=8080, tls=True, \
+            tls_port=8443, tls_cert='/etc/ssl/site.pem')
+        cfg = prj.get_nginx_config_tree()
+        servers = [x for x in cfg.find_all('server', recursive=True) if x.is_block()]
+        self.assertEqual(servers[0].find('listen').args, ['0.0.0.0:8443', 'ssl', 'http2'])
+        self.assertEqual(servers[0].find('ssl_certificate_key').args, ['/etc/ssl/site.pem'])
+        self.assertEqual(servers[0].find('ssl_session_cache').args, [tls.SESSION_CACHE])
+        self.assertEqual(servers[0].find('ssl_session_tickets').args, ['on'])
+        self.assertEqual(servers[0].find('location', ['=', stats.NGINX_STATUS_PATH]), None)
+        redirect = servers[1]
+        self.assertEqual(redirect.find('listen').args, ['0.0.0.0:8080'])
+        self.assertEqual(redirect.find('location', ['/']).find('return').args, \
+            ['301', 'https://$host:8443$request_uri'])
+        prj.create_nginx_config()
+        endpoints = stats.get_endpoints(self.root_dir, 'testproject')
+        self.assertEqual(endpoints['nginx'], 'http://127.0.0.1:8080{0}'.format(stats.NGINX_STATUS_PATH))
+        self.assertEqual(benchmark.get_nginx_url(self.root_dir, 'testproject', '/x'), 'https://127.0.0.1:8443/x')
+        self.assertTrue(os.path.exists(tls.get_ticket_key_path(self.root_dir, 'testproject')))
+
+    def testSelfSigned(self):
+        if not common.check_command('openssl'):
+            return
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', tls=True)
+        self.assertTrue(prj.create_tls_files())
+        cert, key = tls.get_certificate_paths(self.root_dir, 'testproject')
+        self.assertTrue(open(cert).read().startswith('-----BEGIN CERTIFICATE-----'))
+        self.assertEqual(os.stat(key).st_mode & 0777, 0600)
+
+    def testLoad(self):
+        if not common.check_command('openssl'):
+            return
+        cert, key = os.path.join(self.root_dir, 'test.crt'), os.path.join(self.root_dir, 'test.key')
+        self.assertTrue(tls.create_self_signed(cert, key))
+        server = _BenchmarkServer(('127.0.0.1', 0), _BenchmarkHandler)
+        server.socket = ssl.wrap_socket(server.socket, certfile=cert, keyfile=key, server_side=True)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+        try:
+            url = 'https://127.0.0.1:{0}/'.format(server.server_address[1])
+            r = benchmark.run_load(url, concurrency=2, requests=20)
+            self.assertEqual(r['status'], {'200': 20})
+            # keepalive clients only handshake once
+            self.assertEqual(r['tls']['handshakes'], 2)
+            r = benchmark.run_load(url, concurrency=2, requests=10, keepalive=False)
+            self.assertEqual(r['status'], {'200': 10})
+            self.assertTrue(r['tls']['handshakes'] >= 10)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def testParseClient(self):
+        out = 'CONNECTED(00000003)\nNew, TLSv1.2, Cipher is ECDHE-RSA-AES128-GCM-SHA256\n' \
+            'ALPN protocol: h2\nSSL-Session:\n    Protocol  : TLSv1.2\ndrop connection and then reconnect\n' \
+            'Reused, TLSv1.2, Cipher is ECDHE-RSA-AES128-GCM-SHA256\n'
+        parsed = tls.parse_s_client(out)
+        self.assertEqual(parsed['handshakes'], ['New', 'Reused'])
+        self.assertEqual(parsed['protocol'], 'TLSv1.2')
+        self.assertEqual(parsed['alpn'], 'h2')
+
+class TemplatesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.iter_entry_points = templates._iter_entry_points
+        with open(os.path.join(self.root_dir, 'ignition_testplugin.py'), 'w') as f:
+            f.write('from ignition import ProjectCreator\n\nclass PyramidCreator(ProjectCreator):\n'\
+                '    pass\n\nclass Other(object):\n    pass\n')
+        sys.path.insert(0, self.root_dir)
+        templates._iter_entry_points = lambda group: [('pyramid', 'ignition_testplugin:PyramidCreator'), \
+            ('other', 'ignition_testplugin:Other'), ('missing', 'ignition_missing_xyz:Creator'), \
+            ('flask', 'ignition_testplugin:PyramidCreator')]
+
+    def tearDown(self):
+        templates._iter_entry_points = self.iter_entry_points
+        templates._creators.clear()
+        sys.path.remove(self.root_dir)
+        sys.modules.pop('ignition_testplugin', None)
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testList(self):
+        self.assertEqual(templates.list_templates(), ['django', 'flask', 'missing', 'other', 'pyramid'])
+        # listing doesn't import template modules
+        self.assertFalse('ignition_testplugin' in sys.modules)
+
+    def testLoad(self):
+        self.assertEqual(templates.load_creator('Flask'), FlaskCreator)
+        creator = templates.load_creator('pyramid')
+        self.assertEqual(creator.__name__, 'PyramidCreator')
+        self.assertTrue(issubclass(creator, ProjectCreator))
+        self.assertEqual(templates.load_creator('other'), None)
+        self.assertEqual(templates.load_creator('missing'), None)
+        self.assertEqual(templates.load_creator('unknown'), None)
+
+    def testBuiltinWithoutMetadata(self):
+        def fail(group):
+            raise AssertionError('metadata scanned')
+        templates._iter_entry_points = fail
+        self.assertEqual(templates.load_creator('flask'), FlaskCreator)
+
+    def testScan(self):
+        info = os.path.join(self.root_dir, 'ignition_testplugin-1.0.egg-info')
+        os.makedirs(info)
+        with open(os.path.join(info, 'entry_points.txt'), 'w') as f:
+            f.write('[console_scripts]\npyramid = other:main\n\n[ignition.templates]\n'\
+                'Pyramid = ignition_testplugin : PyramidCreator\n')
+        self.assertEqual(templates._scan_entry_points(templates.ENTRY_POINT_GROUP), \
+            [('Pyramid', 'ignition_testplugin:PyramidCreator')])
+
+class DjangoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.project_dir = os.path.join(self.root_dir, 'app', 'testproject')
+        os.makedirs(os.path.join(self.project_dir, 'testproject'))
+        for name in ('__init__.py', 'wsgi.py'):
+            open(os.path.join(self.project_dir, 'testproject', name), 'w').close()
+        with open(os.path.join(self.project_dir, 'testproject', 'settings.py'), 'w') as f:
+            f.write("DEBUG = True\nDATABASES = {'default': {'NAME': 'db.sqlite3'}}\n"\
+                "TEMPLATES = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}]\n")
+
+    def tearDown(self):
+        for name in ('testproject', 'testproject.settings', 'testproject.production'):
+            sys.modules.pop(name, None)
+        if self.project_dir in sys.path:
+            sys.path.remove(self.project_dir)
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def testSettingsModule(self):
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject')
+        self.assertEqual(prj.get_settings_module(), 'testproject.settings')
+        self.assertEqual(prj.get_wsgi_module(), 'testproject.wsgi:application')
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', production=True)
+        self.assertEqual(prj.get_settings_module(), 'testproject.production')
+        self.assertTrue('testproject.production' in prj.get_preload_modules())
+        # pre 1.4 layout
+        open(os.path.join(self.project_dir, 'settings.py'), 'w').close()
+        self.assertEqual(prj.get_settings_module(), 'production')
+        self.assertEqual(prj.get_wsgi_module(), 'django.core.handlers.wsgi:WSGIHandler()')
+
+    def testProductionSettings(self):
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', production=True, \
+            server_name='example.com', django_cache='file')
+        self.assertTrue(prj.create_production_settings())
+        sys.path.insert(0, self.project_dir)
+        __import__('testproject.production')
+        settings = sys.modules['testproject.production']
+        self.assertFalse(settings.DEBUG)
+        self.assertEqual(settings.ALLOWED_HOSTS, ['example.com', 'localhost', '127.0.0.1'])
+        self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 600)
+        self.assertFalse(settings.TEMPLATES[0]['APP_DIRS'])
+        self.assertEqual(settings.TEMPLATES[0]['OPTIONS']['loaders'][0][0], \
+            'django.template.loaders.cached.Loader')
+        self.assertFalse(hasattr(settings, 'TEMPLATE_LOADERS'))
+        self.assertEqual(settings.CACHES['default']['BACKEND'], \
+            'django.core.cache.backends.filebased.FileBasedCache')
+        self.assertEqual(settings.STATIC_ROOT, os.path.join(self.root_dir, 'static', 'testproject'))
+        self.assertRaises(ValueError, DjangoCreator, root_dir=self.root_dir, project_name='testproject', \
+            django_cache='redis')
+        # settings without TEMPLATES (Django < 1.8) use the legacy setting
+        with open(os.path.join(self.project_dir, 'testproject', 'settings.py'), 'w') as f:
+            f.write("DATABASES = {}\n")
+        for name in ('settings', 'production'):
+            sys.modules.pop('testproject.' + name)
+            if os.path.exists(os.path.join(self.project_dir, 'testproject', name + '.pyc')):
+                os.remove(os.path.join(self.project_dir, 'testproject', name + '.pyc'))
+        __import__('testproject.production')
+        settings = sys.modules['testproject.production']
+        self.assertEqual(settings.TEMPLATE_LOADERS[0][0], 'django.template.loaders.cached.Loader')
+
+    def testConcurrency(self):
+        wsgi = os.path.join(self.project_dir, 'testproject', 'wsgi.py')
+        with open(wsgi, 'w') as f:
+            f.write('application = None\n')
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', concurrency='gevent', \
+            production=True)
+        self.assertTrue(prj.add_concurrency_notes())
+        self.assertFalse(prj.add_concurrency_notes())
+        content = open(wsgi).read()
+        self.assertTrue(content.startswith('# Requests run in greenlets.'))
+        self.assertTrue(content.endswith('\n\napplication = None\n'))
+        self.assertTrue("_db.setdefault('CONN_MAX_AGE', 0)" in prj.get_production_settings())
+
+    def testPythonVersion(self):
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', concurrency='asyncio')
+        # fake virtualenv Python
+        os.makedirs(os.path.dirname(prj._py))
+        for version, ok in (('2 7', False), ('3 8', True)):
+            with open(prj._py, 'w') as f:
+                f.write('#!/bin/sh\necho "{0}"\n'.format(version))
+            os.chmod(prj._py, 0755)
+            self.assertEqual(prj.check_python(), ok)
+        self.assertTrue(DjangoCreator(root_dir=self.root_dir, project_name='other').check_python())
+
+    def testConfig(self):
+        prj = DjangoCreator(root_dir=self.root_dir, project_name='testproject', production=True)
+        prj.create_uwsgi_script()
+        cfg = config.parse_uwsgi(open(os.path.join(self.root_dir, 'conf', 'testproject_uwsgi.ini')).read())
+        self.assertEqual(cfg.get('env'), 'DJANGO_SETTINGS_MODULE=testproject.production')
+        self.assertEqual(cfg.get('module'), 'testproject.wsgi:application')
+        server = prj.get_nginx_server()
+        loc = server.find('location', ['^~', '/static/'])
+        self.assertEqual(loc.find('alias').args, [os.path.join(self.root_dir, 'static', 'testproject') + '/'])
+        stock = DjangoCreator(root_dir=self.root_dir, project_name='testproject')
+        self.assertEqual(stock.get_nginx_server().find('location', ['^~', '/static/']), None)
+
+class RunnerTestCase(unittest.TestCase):
+    def testWhich(self):
+        self.assertEqual(runner.which('sh', '/nonexistent:/bin'), '/bin/sh')
+        self.assertEqual(runner.which('ignition-missing-command'), None)
+        self.assertEqual(runner.which('/bin/sh'), '/bin/sh')
+        self.assertFalse(common.check_command('ignition-missing-command'))
+
+    def testRun(self):
+        timings = runner.Timings('testproject')
+        self.assertEqual(timings.run('echo', runner.run_command, ['echo', 'hello']), (0, 'hello\n'))
+        self.assertFalse(timings.run('fail', lambda: runner.run_command(['sh', '-c', 'echo oops; exit 3'])[0] == 0))
+        self.assertRaises(ValueError, timings.run, 'error', int, 'x')
+        # commands outside a step aren't recorded
+        runner.run_command(['true'])
+        report = timings.report()
+        self.assertEqual([s['name'] for s in report['steps']], ['echo', 'fail', 'error'])
+        echo, fail, error = report['steps']
+        self.assertTrue(echo['ok'])
+        self.assertEqual(echo['returncode'], 0)
+        self.assertEqual(echo['commands'][0]['args'], ['echo', 'hello'])
+        self.assertFalse(fail['ok'])
+        self.assertEqual(fail['returncode'], 3)
+        self.assertEqual(fail['commands'][0]['output'], 'oops\n')
+        self.assertEqual(error['returncode'], None)
+        self.assertTrue('error' in error)
+        self.assertFalse(report['ok'])
+        self.assertTrue('FAILED' in runner.format_report(report))
+
+    def testParallel(self):
+        timings = runner.Timings('testproject')
+        start = time.time()
+        results = timings.run_parallel([lambda: timings.run('a', time.sleep, 0.5) or 'a', \
+            lambda: timings.run('b', time.sleep, 0.5) or 'b'])
+        self.assertEqual(results, ['a', 'b'])
+        self.assertTrue(time.time() - start < 0.9)
+        report = timings.report()
+        self.assertTrue(report['step_seconds'] > report['seconds'])
+        self.assertRaises(ValueError, timings.run_parallel, [lambda: 1, lambda: int('x')])
+
+def _slow_view(environ, start_response):
+    time.sleep(0.1)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['ok']
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def _request(self, app, path='/slow'):
+        result = app({'REQUEST_METHOD': 'GET', 'PATH_INFO': path}, lambda status, headers: None)
+        body = ''.join(result)
+        if hasattr(result, 'close'):
+            result.close()
+        return body
+
+    def testSampled(self):
+        app = profiler.ProfilerMiddleware(_slow_view, self.root_dir, rate=1.0)
+        self.assertEqual(self._request(app), 'ok')
+        files = os.listdir(self.root_dir)
+        self.assertEqual(len(files), 1)
+        header, stacks = profiling.read_profile(os.path.join(self.root_dir, files[0]))
+        self.assertTrue(header.startswith('GET /slow '))
+        self.assertTrue(header.endswith(' sampled'))
+        # time.sleep is not a Python frame
+        self.assertTrue([s for s in stacks if s.split(';')[-1].startswith('_slow_view ')])
+
+    def testThreshold(self):
+        app = profiler.ProfilerMiddleware(_slow_view, self.root_dir, threshold=5000)
+        self._request(app)
+        self.assertEqual(os.listdir(self.root_dir), [])
+        app.threshold = 50
+        self._request(app)
+        files = os.listdir(self.root_dir)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(profiling.read_profile(os.path.join(self.root_dir, files[0]))[0].endswith(' slow'))
+
+    def testRotate(self):
+        app = profiler.ProfilerMiddleware(_slow_view, self.root_dir, rate=1.0, max_files=2)
+        for i in range(4):
+            app.write_profile({'a;b': 1}, {}, 1.0, 'sampled')
+        app.rotate()
+        self.assertEqual(len(os.listdir(self.root_dir)), 2)
+        app.max_bytes = 1
+        app.rotate()
+        self.assertEqual(os.listdir(self.root_dir), [])
+        # requests only scan the directory every ROTATE_EVERY profiles
+        app.max_bytes = profiler.DEFAULT_MAX_BYTES
+        app.sampler.start = lambda ident: None
+        app.sampler.stop = lambda ident: {'a;b': 1}
+        for i in range(profiler.ROTATE_EVERY - 1):
+            app.finish(0, {}, time.time(), True)
+        self.assertEqual(len(os.listdir(self.root_dir)), profiler.ROTATE_EVERY - 1)
+        app.finish(0, {}, time.time(), True)
+        self.assertEqual(len(os.listdir(self.root_dir)), 2)
+
+    def testWrapping(self):
+        class FileWrapper(object):
+            def __init__(self, filelike):
+                self.filelike = filelike
+            def __iter__(self):
+                return iter([self.filelike.read()])
+        def file_view(environ, start_response):
+            start_response('200 OK', [])
+            return environ['wsgi.file_wrapper'](open(__file__, 'r'))
+        environ = {'wsgi.file_wrapper': FileWrapper}
+        app = profiler.ProfilerMiddleware(file_view, self.root_dir, rate=1.0)
+        result = app(environ, lambda status, headers: None)
+        # the server still gets its own file wrapper back
+        self.assertTrue(isinstance(result, FileWrapper))
+        result.filelike.close()
+        # requests only timed for the threshold aren't wrapped
+        app = profiler.ProfilerMiddleware(_slow_view, self.root_dir, threshold=5000)
+        self.assertEqual(app({}, lambda status, headers: None), ['ok'])
+
+    def testAggregate(self):
+        for name, path, stacks in (('1', '/a', 'main;view;query 3\nmain;view 1\n'), ('2', '/b', 'main;view;query 2\n')):
+            with open(os.path.join(self.root_dir, name + profiler.SUFFIX), 'w') as f:
+                f.write('# GET {0} 12.0ms sampled\n{1}'.format(path, stacks))
+        result = profiling.aggregate(self.root_dir)
+        self.assertEqual(result['profiles'], 2)
+        self.assertEqual(result['stacks'], {'main;view;query': 5, 'main;view': 1})
+        self.assertEqual(profiling.get_hotspots(result['stacks'])[0], ('query', 5, 5))
+        self.assertEqual(profiling.aggregate(self.root_dir, '/b')['samples'], 2)
+        output = os.path.join(self.root_dir, 'out.txt')
+        profiling.write_collapsed(result['stacks'], output)
+        self.assertEqual(open(output).read(), 'main;view 1\nmain;view;query 5\n')
+
+    def testCreator(self):
+        prj = FlaskCreator(root_dir=self.root_dir, project_name='testproject', profile_rate=0.05, \
+            profile_threshold=500)
+        prj.create_uwsgi_script()
+        cfg = config.parse_uwsgi(open(os.path.join(self.root_dir, 'conf', 'testproject_uwsgi.ini')).read())
+        self.assertEqual(cfg.get('module'), 'ignition_profiler:application')
+        env = cfg.get_all('env')
+        self.assertTrue('IGNITION_PROFILE_APP=app:app' in env)
+        self.assertTrue('IGNITION_PROFILE_RATE=0.05' in env)
+        self.assertTrue('IGNITION_PROFILE_THRESHOLD=500.0' in env)
+        self.assertTrue(os.path.exists(os.path.join(self.root_dir, 'app', 'testproject', 'ignition_profiler.py')))
+        self.assertTrue(os.path.isdir(profiling.get_profile_dir(self.root_dir, 'testproject')))
+        # a module other than this one (run as __main__ it would be imported twice)
+        from wsgiref.simple_server import demo_app
+        self.assertEqual(profiler.load_app('wsgiref.simple_server:demo_app'), demo_app)
+        self.assertTrue(isinstance(profiler.load_app('collections:OrderedDict()'), collections.OrderedDict))
+
 if __name__=='__main__':
     unittest.main()